@@ -0,0 +1,87 @@
+class Anel:
+    """
+    Visão de um nó sobre o anel lógico do Token Ring.
+
+    Os membros são ordenados uma única vez, quando a época de
+    participação muda, e a tabela de sucessores resultante responde a
+    cada passagem do token com uma consulta em dicionário. A época é
+    incrementada pelo servidor a cada alteração do anel e viaja no
+    token e na lista de vizinhos, o que permite a um nó perceber que
+    sua visão está desatualizada (ex.: perdeu um broadcast de neighbors).
+
+    Visões chegam fora de ordem (neighbors atrasados ou reordenados), por
+    isso só uma visão mais nova substitui a atual. A ordem é dada pelo par
+    (encarnação, época): a encarnação identifica a execução do servidor
+    que numerou as épocas e cresce a cada reinício, de modo que um
+    servidor que volta com épocas menores redefine o anel explicitamente.
+
+    Atributos:
+        encarnacao: Execução do servidor que numerou esta visão (0 = desconhecida)
+        epoca: Época de participação desta visão (0 = nenhuma recebida)
+        membros: Tupla ordenada com os IDs dos membros
+        primeiro: Primeiro membro do anel, ou None se está vazio
+    """
+
+    __slots__ = ("encarnacao", "epoca", "membros", "primeiro", "_sucessores")
+
+    def __init__(self, membros=(), epoca=0, encarnacao=0):
+        """
+        Args:
+            membros: IDs dos membros iniciais
+            epoca: Época inicial
+            encarnacao: Encarnação inicial
+        """
+        self.encarnacao = encarnacao
+        self.epoca = -1
+        self.atualizar(membros, epoca)
+
+    def mais_nova(self, epoca, encarnacao=None):
+        """Indica se uma visão (encarnação, época) é mais nova que a atual."""
+        encarnacao = self.encarnacao if encarnacao is None else encarnacao
+        return (encarnacao, epoca) > (self.encarnacao, self.epoca)
+
+    def atualizar(self, membros, epoca, encarnacao=None, redefinir=False):
+        """
+        Substitui a visão do anel se ela for mais nova que a atual.
+
+        Args:
+            membros: Iterável com os IDs dos membros
+            epoca: Época da nova visão
+            encarnacao: Encarnação da nova visão (padrão: a atual)
+            redefinir: Aceita a visão mesmo que não seja mais nova (cópia
+                autoritativa, ex.: o anel do líder espelhado pelos seguidores)
+
+        Returns:
+            bool: True se a tabela de sucessores foi reconstruída
+        """
+        encarnacao = self.encarnacao if encarnacao is None else encarnacao
+        if (encarnacao, epoca) == (self.encarnacao, self.epoca):
+            return False
+        if not redefinir and not self.mais_nova(epoca, encarnacao):
+            return False
+        self.encarnacao = encarnacao
+        self.epoca = epoca
+        self.membros = tuple(sorted(set(membros)))
+        self.primeiro = self.membros[0] if self.membros else None
+        total = len(self.membros)
+        self._sucessores = {membro: self.membros[(i + 1) % total]
+                            for i, membro in enumerate(self.membros)}
+        return True
+
+    def proximo(self, no_id):
+        """
+        Retorna o sucessor de um nó no anel em tempo constante.
+
+        Args:
+            no_id: ID do nó atual
+
+        Returns:
+            str: ID do sucessor, ou o primeiro membro se o nó não está no anel
+        """
+        return self._sucessores.get(no_id, self.primeiro)
+
+    def __contains__(self, no_id):
+        return no_id in self._sucessores
+
+    def __len__(self):
+        return len(self.membros)
@@ -0,0 +1,215 @@
+import json
+from bisect import bisect_right, insort
+
+# Limite de bytes do histórico enviado em uma única resposta de sincronização
+# (a resposta é fragmentada pelo módulo de transporte)
+TAMANHO_MAXIMO_SYNC = 256 * 1024
+
+
+class ResumoReplica:
+    """
+    Resumo compacto do conteúdo de uma réplica para reconciliação por delta.
+
+    Para cada remetente é mantida a marca d'água contígua: o maior número
+    de sequência tal que todas as mensagens de 1 até ele estão presentes.
+    Mensagens recebidas fora de ordem ficam pendentes até fecharem a lacuna.
+
+    Nós trocam apenas esse resumo ({remetente: marca}) e pedem somente as
+    faixas que estão faltando, de modo que o custo da sincronização depende
+    da divergência e não do tamanho total do histórico.
+    """
+
+    def __init__(self):
+        self._contiguo = {}   # remetente -> marca d'água contígua
+        self._pendentes = {}  # remetente -> seqs acima da marca já presentes
+        self._seqs = {}       # remetente -> lista ordenada de seqs conhecidos
+        self._posicoes = {}   # remetente -> {seq: posição no log}
+
+    def registrar(self, remetente, seq, posicao=None):
+        """
+        Registra a presença de uma mensagem na réplica.
+
+        Args:
+            remetente: ID do nó que originou a mensagem
+            seq: Número de sequência da mensagem no remetente
+            posicao: Posição da mensagem no log local (opcional)
+
+        Returns:
+            bool: True se a mensagem ainda não era conhecida
+        """
+        if remetente is None or not isinstance(seq, int) or seq <= 0:
+            return False
+
+        posicoes = self._posicoes.setdefault(remetente, {})
+        if seq in posicoes:
+            return False
+        posicoes[seq] = posicao
+
+        seqs = self._seqs.setdefault(remetente, [])
+        if not seqs or seq > seqs[-1]:
+            seqs.append(seq)
+        else:
+            insort(seqs, seq)
+
+        marca = self._contiguo.get(remetente, 0)
+        pendentes = self._pendentes.setdefault(remetente, set())
+        pendentes.add(seq)
+        while marca + 1 in pendentes:
+            marca += 1
+            pendentes.remove(marca)
+        self._contiguo[remetente] = marca
+        return True
+
+    def registrar_base(self, digest):
+        """
+        Considera presentes as mensagens até as marcas d'água informadas.
+
+        Usado para as mensagens removidas pela compactação do log: elas
+        continuam contando como recebidas (não são pedidas nem reenviadas
+        pelos outros nós), mas não podem mais ser lidas.
+
+        Args:
+            digest: {remetente: marca d'água} no momento da compactação
+        """
+        for remetente, marca_base in digest.items():
+            marca = max(self._contiguo.get(remetente, 0), marca_base)
+            pendentes = self._pendentes.setdefault(remetente, set())
+            pendentes.difference_update([seq for seq in pendentes if seq <= marca])
+            while marca + 1 in pendentes:
+                marca += 1
+                pendentes.remove(marca)
+            self._contiguo[remetente] = marca
+
+    def base_segmentos(self, segmentos, base=None):
+        """
+        Calcula as marcas d'água cobertas pela remoção de segmentos do log.
+
+        A marca de cada remetente só avança enquanto as mensagens seguintes
+        estão nos segmentos removidos: uma mensagem que continua no log (ou
+        que nunca chegou) interrompe a faixa, e as posteriores a ela seguem
+        podendo ser pedidas.
+
+        Args:
+            segmentos: Números dos segmentos que serão removidos
+            base: Marcas da compactação anterior ({remetente: marca}), que
+                podem ter parado antes de mensagens já removidas
+
+        Returns:
+            dict: {remetente: marca} com as mensagens removidas até aqui
+        """
+        segmentos = set(segmentos)
+        marcas = dict(base or {})
+        for remetente, posicoes in self._posicoes.items():
+            # Posição None: removida em uma compactação anterior
+            removidos = {seq for seq, posicao in posicoes.items()
+                         if posicao is None or posicao[0] in segmentos}
+            marca = marcas.get(remetente, 0)
+            while marca + 1 in removidos:
+                marca += 1
+            if marca:
+                marcas[remetente] = marca
+        return marcas
+
+    def descartar_segmentos(self, segmentos):
+        """
+        Esquece as posições das mensagens de segmentos removidos do log.
+
+        Args:
+            segmentos: Números dos segmentos removidos
+        """
+        segmentos = set(segmentos)
+        for posicoes in self._posicoes.values():
+            for seq, posicao in posicoes.items():
+                if posicao is not None and posicao[0] in segmentos:
+                    posicoes[seq] = None
+
+    def contem(self, remetente, seq):
+        """Indica se a mensagem (remetente, seq) está presente."""
+        return seq in self._posicoes.get(remetente, ())
+
+    def digest(self):
+        """
+        Retorna o resumo compacto da réplica.
+
+        Returns:
+            dict: {remetente: marca d'água contígua}
+        """
+        return dict(self._contiguo)
+
+    def requisicao(self, digest_remoto):
+        """
+        Calcula as faixas que faltam localmente em relação a outro nó.
+
+        Args:
+            digest_remoto: Resumo recebido de outro nó
+
+        Returns:
+            dict: {remetente: seq a partir do qual pedir} (vazio se em dia)
+        """
+        pedidos = {}
+        for remetente, marca_remota in digest_remoto.items():
+            marca_local = self._contiguo.get(remetente, 0)
+            if marca_remota > marca_local:
+                pedidos[remetente] = marca_local
+        return pedidos
+
+    def faltantes(self, digest_remoto):
+        """
+        Calcula as faixas que o outro nó não possui e que existem localmente.
+
+        Args:
+            digest_remoto: Resumo recebido de outro nó
+
+        Returns:
+            dict: {remetente: seq a partir do qual enviar}
+        """
+        envios = {}
+        for remetente, seqs in self._seqs.items():
+            marca_remota = digest_remoto.get(remetente, 0)
+            if seqs and seqs[-1] > marca_remota:
+                envios[remetente] = marca_remota
+        return envios
+
+    def posicoes_apos(self, remetente, desde):
+        """
+        Retorna as posições no log das mensagens de um remetente após um seq.
+
+        Args:
+            remetente: ID do remetente
+            desde: Último seq que o solicitante já possui
+
+        Returns:
+            list: Posições em ordem crescente de seq
+        """
+        seqs = self._seqs.get(remetente, [])
+        posicoes = self._posicoes.get(remetente, {})
+        return [posicoes[seq] for seq in seqs[bisect_right(seqs, desde):]
+                if posicoes[seq] is not None]
+
+
+def coletar_delta(log, resumo, faixas, limite=TAMANHO_MAXIMO_SYNC):
+    """
+    Lê do log as mensagens pedidas, respeitando o limite de bytes por envio.
+
+    O que não couber no limite é pedido novamente na próxima rodada de
+    reconciliação, pois a marca d'água do solicitante continuará atrasada.
+
+    Args:
+        log: LogSegmentado da réplica local
+        resumo: ResumoReplica da réplica local
+        faixas: {remetente: seq a partir do qual enviar}
+        limite: Tamanho máximo aproximado em bytes do histórico enviado
+
+    Returns:
+        list: Mensagens a enviar
+    """
+    mensagens = []
+    tamanho = 0
+    for remetente, desde in faixas.items():
+        for posicao in resumo.posicoes_apos(remetente, desde):
+            msg = log.ler(posicao)
+            tamanho += len(json.dumps(msg))
+            if mensagens and tamanho > limite:
+                return mensagens
+            mensagens.append(msg)
+    return mensagens
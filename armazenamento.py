@@ -0,0 +1,428 @@
+import os
+import json
+import math
+import time
+import hashlib
+import threading
+
+from registro import log
+
+# Configurações padrão dos segmentos do log
+TAMANHO_MAXIMO_SEGMENTO = 1024 * 1024  # Bytes por segmento antes da rotação
+EXTENSAO_SEGMENTO = ".log"
+ARQUIVO_INDICE_IDENTIDADES = "identidades.idx"
+
+
+class LogSegmentado:
+    """
+    Log append-only de mensagens dividido em segmentos.
+
+    Cada registro é uma linha JSON compacta (newline-delimited). Quando o
+    segmento atual ultrapassa o tamanho máximo (ou a janela de tempo, se
+    configurada), um novo segmento é aberto. Gravar uma mensagem custa
+    apenas a escrita da própria linha, independente do tamanho do histórico.
+
+    Posições de registros são tuplas (segmento, offset) e permitem reler
+    um registro específico sem percorrer o log inteiro.
+
+    Um indexador opcional (ver consulta.py) é avisado de cada registro
+    gravado, de cada segmento fechado e de cada reescrita do log.
+    """
+
+    def __init__(self, diretorio, tamanho_segmento=TAMANHO_MAXIMO_SEGMENTO, janela_segmento=None):
+        """
+        Abre (ou cria) o log no diretório informado.
+
+        Args:
+            diretorio: Diretório onde os segmentos são armazenados
+            tamanho_segmento: Tamanho máximo em bytes de cada segmento
+            janela_segmento: Tempo máximo em segundos de cada segmento (opcional)
+        """
+        self.diretorio = diretorio
+        self.tamanho_segmento = tamanho_segmento
+        self.janela_segmento = janela_segmento
+        self._lock = threading.Lock()
+        self.indexador = None
+        os.makedirs(diretorio, exist_ok=True)
+
+        self._segmentos = self._listar_segmentos()
+        if not self._segmentos:
+            self._segmentos = [1]
+        self._abrir_segmento_atual()
+
+    def _listar_segmentos(self):
+        """Retorna os números dos segmentos existentes, em ordem."""
+        numeros = []
+        for nome in os.listdir(self.diretorio):
+            base, ext = os.path.splitext(nome)
+            if ext == EXTENSAO_SEGMENTO and base.isdigit():
+                numeros.append(int(base))
+        return sorted(numeros)
+
+    def caminho_segmento(self, numero):
+        """Retorna o caminho do arquivo de um segmento."""
+        return os.path.join(self.diretorio, f"{numero:08d}{EXTENSAO_SEGMENTO}")
+
+    def _abrir_segmento_atual(self):
+        """
+        Abre o último segmento para escrita.
+
+        Se o processo caiu no meio de uma escrita, a linha incompleta no
+        final do segmento é descartada.
+        """
+        caminho = self.caminho_segmento(self._segmentos[-1])
+        with open(caminho, "ab+") as f:
+            tamanho = f.seek(0, os.SEEK_END)
+            if tamanho:
+                f.seek(max(0, tamanho - 1))
+                if f.read(1) != b"\n":
+                    f.seek(0)
+                    conteudo = f.read()
+                    ultimo = conteudo.rfind(b"\n") + 1
+                    f.truncate(ultimo)
+                    log.aviso("registro_incompleto", "Registro incompleto descartado", caminho=caminho)
+        self._arquivo = open(caminho, "ab")
+        self._tamanho_atual = self._arquivo.seek(0, os.SEEK_END)
+        self._inicio_segmento = time.time()
+
+    def _rotacionar(self):
+        """Fecha o segmento atual e abre o próximo."""
+        self._arquivo.close()
+        self._segmentos.append(self._segmentos[-1] + 1)
+        self._arquivo = open(self.caminho_segmento(self._segmentos[-1]), "ab")
+        self._tamanho_atual = 0
+        self._inicio_segmento = time.time()
+
+    def _precisa_rotacionar(self, tamanho_registro):
+        """Verifica se o próximo registro deve ir para um novo segmento."""
+        if self._tamanho_atual == 0:
+            return False
+        if self._tamanho_atual + tamanho_registro > self.tamanho_segmento:
+            return True
+        if self.janela_segmento is not None:
+            return time.time() - self._inicio_segmento >= self.janela_segmento
+        return False
+
+    def anexar(self, registro):
+        """
+        Acrescenta um registro ao final do log.
+
+        Args:
+            registro: Objeto serializável em JSON
+
+        Returns:
+            tuple: Posição (segmento, offset) do registro gravado
+        """
+        linha = json.dumps(registro, separators=(",", ":"), ensure_ascii=False).encode() + b"\n"
+        fechado = None
+        with self._lock:
+            if self._precisa_rotacionar(len(linha)):
+                fechado = self._segmentos[-1]
+                self._rotacionar()
+            posicao = (self._segmentos[-1], self._tamanho_atual)
+            self._arquivo.write(linha)
+            self._arquivo.flush()
+            self._tamanho_atual += len(linha)
+        if self.indexador is not None:
+            if fechado is not None:
+                self.indexador.fechar_segmento(fechado)
+            self.indexador.registrar(posicao, registro)
+        return posicao
+
+    def ler(self, posicao):
+        """
+        Lê o registro gravado em uma posição específica.
+
+        Args:
+            posicao: Tupla (segmento, offset) retornada por anexar()
+
+        Returns:
+            O registro decodificado
+        """
+        segmento, offset = posicao
+        with open(self.caminho_segmento(segmento), "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def registros(self):
+        """
+        Percorre todos os registros do log em ordem de gravação.
+
+        Yields:
+            Cada registro decodificado
+        """
+        for _, registro in self.registros_com_posicao():
+            yield registro
+
+    def registros_com_posicao(self, inicio=None):
+        """
+        Percorre os registros junto com suas posições no log.
+
+        Args:
+            inicio: Posição (segmento, offset) a partir da qual ler (opcional)
+
+        Yields:
+            tuple: (posicao, registro)
+        """
+        with self._lock:
+            segmentos = list(self._segmentos)
+        for numero in segmentos:
+            if inicio is not None and numero < inicio[0]:
+                continue
+            try:
+                f = open(self.caminho_segmento(numero), "rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                offset = inicio[1] if inicio is not None and numero == inicio[0] else 0
+                f.seek(offset)
+                for linha in f:
+                    posicao = (numero, offset)
+                    offset += len(linha)
+                    if not linha.endswith(b"\n"):
+                        break  # Escrita em andamento
+                    try:
+                        yield posicao, json.loads(linha)
+                    except json.JSONDecodeError as e:
+                        log.aviso("registro_invalido", "Registro inválido", caminho=self.caminho_segmento(numero), erro=str(e))
+
+    def reescrever(self, registros):
+        """
+        Substitui todo o conteúdo do log pelos registros informados.
+
+        Os novos segmentos são gravados com numeração posterior aos atuais
+        e só então os antigos são removidos.
+
+        Args:
+            registros: Iterável com os registros na ordem desejada
+        """
+        with self._lock:
+            antigos = list(self._segmentos)
+            self._arquivo.close()
+            self._segmentos = [antigos[-1] + 1]
+            self._arquivo = open(self.caminho_segmento(self._segmentos[-1]), "ab")
+            self._tamanho_atual = 0
+            self._inicio_segmento = time.time()
+            for registro in registros:
+                linha = json.dumps(registro, separators=(",", ":"), ensure_ascii=False).encode() + b"\n"
+                if self._precisa_rotacionar(len(linha)):
+                    self._rotacionar()
+                self._arquivo.write(linha)
+                self._tamanho_atual += len(linha)
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            for numero in antigos:
+                try:
+                    os.remove(self.caminho_segmento(numero))
+                except FileNotFoundError:
+                    pass
+        if self.indexador is not None:
+            self.indexador.reconstruir()
+
+    def remover_segmentos(self, numeros):
+        """
+        Remove segmentos fechados do log (compactação por retenção).
+
+        O segmento aberto para escrita nunca é removido.
+
+        Args:
+            numeros: Números dos segmentos a remover
+
+        Returns:
+            list: Números efetivamente removidos
+        """
+        with self._lock:
+            removidos = [numero for numero in numeros
+                         if numero in self._segmentos and numero != self._segmentos[-1]]
+            self._segmentos = [numero for numero in self._segmentos if numero not in removidos]
+            for numero in removidos:
+                try:
+                    os.remove(self.caminho_segmento(numero))
+                except FileNotFoundError:
+                    pass
+        if removidos and self.indexador is not None:
+            self.indexador.remover_segmentos(removidos)
+        return removidos
+
+    def segmentos(self):
+        """Retorna os números dos segmentos atuais, em ordem."""
+        with self._lock:
+            return list(self._segmentos)
+
+    def fechar(self):
+        """Fecha o segmento aberto para escrita."""
+        with self._lock:
+            self._arquivo.close()
+
+
+def converter_replica_json(caminho_json, destino):
+    """
+    Converte uma réplica no formato antigo (array JSON) para o log segmentado.
+
+    A conversão é feita uma única vez: após importar as mensagens, o arquivo
+    antigo é renomeado com o sufixo ".migrado". Se o processo cair antes
+    disso, a conversão é repetida no próximo início, mas as mensagens cuja
+    identidade já está no log de destino são ignoradas, de modo que uma
+    importação interrompida não duplica registros.
+
+    Args:
+        caminho_json: Caminho do arquivo replica_*.json antigo
+        destino: LogSegmentado de destino
+
+    Returns:
+        int: Quantidade de mensagens convertidas (sem as já presentes no destino)
+    """
+    if not os.path.exists(caminho_json):
+        return 0
+
+    try:
+        with open(caminho_json, "r") as f:
+            historico = json.load(f)
+    except json.JSONDecodeError as e:
+        log.aviso("conversao", "Réplica antiga inválida, conversão ignorada", erro=str(e))
+        return 0
+
+    if not isinstance(historico, list):
+        historico = []
+    presentes = {identidade_mensagem(msg) for msg in destino.registros()}
+    convertidas = 0
+    for msg in historico:
+        identidade = identidade_mensagem(msg)
+        if identidade is not None:
+            if identidade in presentes:
+                continue
+            presentes.add(identidade)
+        destino.anexar(msg)
+        convertidas += 1
+
+    os.replace(caminho_json, caminho_json + ".migrado")
+    log.info("conversao", "Réplica antiga convertida", mensagens=convertidas,
+             ignoradas=len(historico) - convertidas, origem=caminho_json)
+    return convertidas
+
+
+def identidade_mensagem(msg):
+    """
+    Retorna a identidade estável de uma mensagem.
+
+    Mensagens novas são identificadas pelo remetente e pelo número de
+    sequência do remetente. Mensagens antigas, sem sequência, usam o
+    timestamp como desempate. Como a sequência é contada por canal, a
+    identidade de mensagens de canais além do padrão leva o nome do canal.
+
+    Args:
+        msg: Objeto de mensagem
+
+    Returns:
+        str com a identidade, ou None se a mensagem não pode ser identificada
+    """
+    if not isinstance(msg, dict):
+        return None
+    remetente = msg.get("sender")
+    if remetente is None:
+        return None
+    if "canal" in msg:
+        remetente = f"{msg['canal']}/{remetente}"
+    if "seq" in msg:
+        return f"{remetente}:{msg['seq']}"
+    if "timestamp" in msg:
+        return f"{remetente}@{msg['timestamp']!r}"
+    return None
+
+
+class FiltroBloom:
+    """
+    Filtro de Bloom para testes rápidos de pertinência.
+
+    Responde "com certeza ausente" ou "possivelmente presente", usando
+    poucos bits por elemento.
+    """
+
+    def __init__(self, capacidade=100000, taxa_erro=0.01):
+        """
+        Args:
+            capacidade: Quantidade esperada de elementos
+            taxa_erro: Taxa aceitável de falsos positivos
+        """
+        self.num_bits = max(8, int(-capacidade * math.log(taxa_erro) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacidade * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _posicoes(self, chave):
+        """Calcula as posições dos bits de uma chave por hashing duplo."""
+        digest = hashlib.blake2b(chave.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def adicionar(self, chave):
+        """Adiciona uma chave ao filtro."""
+        for posicao in self._posicoes(chave):
+            self._bits[posicao >> 3] |= 1 << (posicao & 7)
+
+    def __contains__(self, chave):
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._posicoes(chave))
+
+
+class IndiceIdentidades:
+    """
+    Índice persistente das identidades de mensagens já gravadas.
+
+    Permite rejeitar duplicatas em tempo constante, tanto no recebimento
+    direto quanto na sincronização. As identidades ficam em memória em um
+    conjunto hash e são persistidas em um arquivo append-only (uma por
+    linha). Opcionalmente, um filtro de Bloom responde de imediato pelas
+    mensagens novas, que são o caso comum.
+    """
+
+    def __init__(self, caminho, bloom=None):
+        """
+        Carrega (ou cria) o índice.
+
+        Args:
+            caminho: Arquivo onde as identidades são persistidas
+            bloom: FiltroBloom opcional usado como pré-filtro
+        """
+        self.caminho = caminho
+        self.bloom = bloom
+        self._ids = set()
+        if os.path.exists(caminho):
+            with open(caminho, "r") as f:
+                for linha in f:
+                    if linha.endswith("\n"):
+                        self._registrar_memoria(linha[:-1])
+        self._arquivo = open(caminho, "a")
+
+    def _registrar_memoria(self, identidade):
+        self._ids.add(identidade)
+        if self.bloom is not None:
+            self.bloom.adicionar(identidade)
+
+    def __contains__(self, identidade):
+        if self.bloom is not None and identidade not in self.bloom:
+            return False
+        return identidade in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def adicionar(self, identidade):
+        """
+        Registra uma identidade, persistindo-a.
+
+        Args:
+            identidade: Identidade retornada por identidade_mensagem()
+
+        Returns:
+            bool: False se a identidade já estava no índice
+        """
+        if identidade in self:
+            return False
+        self._registrar_memoria(identidade)
+        self._arquivo.write(identidade + "\n")
+        self._arquivo.flush()
+        return True
+
+    def fechar(self):
+        """Fecha o arquivo do índice."""
+        self._arquivo.close()
@@ -0,0 +1,601 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import protocolo
+import transporte
+from armazenamento import LogSegmentado
+from canais import GRUPO_CONTROLE
+from nucleo import criar_socket_multicast
+
+# Benchmarks em loopback: servidor e clientes como processos locais, no
+# grupo multicast real, sem a emulação de rede
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+PORT = 50007
+TEMPO_LIMITE = float(os.environ.get("BENCHMARK_TEMPO_LIMITE", "60"))  # Segundos por cenário
+AMBIENTE_PADRAO = {"EMULACAO_REDE": "desligado", "PYTHONUNBUFFERED": "1", "FORMATO_LOG": "json"}
+# Eventos de posse do token (nível debug) usados só na medida da rotação
+AMBIENTE_ROTACAO = {"NIVEL_LOG": "debug"}
+PREFIXO = "bench"
+PADRAO_ID = re.compile(PREFIXO + r"-(\d+)")
+TIPOS_SINCRONIZACAO = ("digest", "sync_req", "sync")
+
+
+def percentis(valores, pontos=(50, 90, 99)):
+    """
+    Resume uma amostra em percentis (método do vizinho mais próximo).
+
+    Returns:
+        dict: {"p50": ..., "p90": ..., "p99": ..., "max": ..., "amostras": n}
+            (valores None se a amostra é vazia)
+    """
+    ordenados = sorted(valores)
+    resumo = {"amostras": len(ordenados)}
+    for ponto in pontos:
+        if ordenados:
+            indice = min(len(ordenados) - 1, max(0, round(ponto / 100 * len(ordenados)) - 1))
+            resumo[f"p{ponto}"] = ordenados[indice]
+        else:
+            resumo[f"p{ponto}"] = None
+    resumo["max"] = ordenados[-1] if ordenados else None
+    return resumo
+
+
+def porta_livre():
+    """Retorna uma porta TCP livre em 127.0.0.1."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bytes_em_disco(diretorio):
+    """Soma o tamanho de todos os arquivos sob um diretório."""
+    total = 0
+    for raiz, _, arquivos in os.walk(diretorio):
+        for nome in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+
+def versao_atual():
+    """Commit atual do repositório (None fora de um repositório git)."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRETORIO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Processo:
+    """
+    Servidor ou cliente executado como subprocesso, com os eventos de log lidos da saída.
+
+    Cada evento (linha JSON, ver registro.py) é entregue aos observadores
+    registrados com o instante em que foi registrado pelo nó, convertido
+    para o relógio perf_counter do benchmark; os cenários medem os
+    eventos a partir dos logs que os nós já emitem. Linhas que não são
+    JSON (ex.: tracebacks) chegam como {"msg": linha}.
+    """
+
+    def __init__(self, nome, script, diretorio, ambiente):
+        """
+        Args:
+            nome: Identificação nos logs do benchmark
+            script: server.py ou client.py
+            diretorio: Diretório de trabalho (réplica e checkpoints)
+            ambiente: Variáveis de ambiente adicionais
+        """
+        self.nome = nome
+        self.script = os.path.join(DIRETORIO, script)
+        self.diretorio = diretorio
+        self.ambiente = {**os.environ, **AMBIENTE_PADRAO, **ambiente}
+        self.proc = None
+        self._observadores = []
+        self._leitura = None
+
+    async def iniciar(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", self.script, cwd=self.diretorio, env=self.ambiente,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            limit=1024 * 1024)
+        self._leitura = asyncio.get_running_loop().create_task(self._ler())
+
+    async def _ler(self):
+        while True:
+            linha = await self.proc.stdout.readline()
+            if not linha:
+                break
+            agora = time.perf_counter()
+            texto = linha.decode(errors="replace")
+            try:
+                evento = json.loads(texto)
+            except ValueError:
+                evento = None
+            if not isinstance(evento, dict):
+                evento = {"msg": texto.rstrip("\n")}
+            elif isinstance(evento.get("ts"), (int, float)):
+                # A escrita dos logs é em lotes: o instante do evento é o do registro
+                agora = min(agora, evento["ts"] - (time.time() - time.perf_counter()))
+            for observador in list(self._observadores):
+                observador(agora, evento)
+
+    def observar(self, funcao):
+        """Registra uma função chamada como funcao(instante, evento)."""
+        self._observadores.append(funcao)
+
+    async def esperar(self, nome, tempo=TEMPO_LIMITE, **campos):
+        """
+        Espera um evento de log com o nome e os valores de campos dados.
+
+        Returns:
+            float: Instante (perf_counter) do evento
+
+        Raises:
+            asyncio.TimeoutError: Se o evento não aparece no tempo limite
+        """
+        futuro = asyncio.get_running_loop().create_future()
+
+        def verificar(agora, evento):
+            if (evento.get("evento") == nome and not futuro.done()
+                    and all(evento.get(chave) == valor for chave, valor in campos.items())):
+                futuro.set_result(agora)
+
+        self.observar(verificar)
+        try:
+            return await asyncio.wait_for(futuro, tempo)
+        finally:
+            self._observadores.remove(verificar)
+
+    async def encerrar(self):
+        if self.proc is None or self.proc.returncode is not None:
+            return
+        self.proc.terminate()
+        try:
+            await asyncio.wait_for(self.proc.wait(), 5)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+            await self.proc.wait()
+        if self._leitura is not None:
+            await self._leitura
+
+
+class ObservadorGrupo(asyncio.DatagramProtocol):
+    """
+    Ouvinte passivo do grupo multicast: conta os bytes por tipo de mensagem.
+
+    Os fragmentos são remontados como nos nós; cada mensagem completa
+    soma o tamanho do seu payload ao seu tipo.
+    """
+
+    def __init__(self):
+        self.bytes = {}
+        self.mensagens = {}
+        self._remontador = transporte.Remontador()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        payload = self._remontador.receber(data, addr)
+        if payload is None:
+            return
+        try:
+            msg = protocolo.decodificar(payload)
+        except (ValueError, UnicodeDecodeError):
+            return
+        tipo = msg.get("type", "chat") if isinstance(msg, dict) else "?"
+        self.bytes[tipo] = self.bytes.get(tipo, 0) + len(payload)
+        self.mensagens[tipo] = self.mensagens.get(tipo, 0) + 1
+
+    def zerar(self):
+        self.bytes.clear()
+        self.mensagens.clear()
+
+    def fechar(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+async def abrir_observador():
+    """Abre um ObservadorGrupo no grupo do canal padrão."""
+    observador = ObservadorGrupo()
+    loop = asyncio.get_running_loop()
+    await loop.create_datagram_endpoint(lambda: observador,
+                                        sock=criar_socket_multicast(GRUPO_CONTROLE, PORT))
+    return observador
+
+
+class Topologia:
+    """
+    Servidor e clientes de um cenário, em um diretório temporário.
+
+    Usada como gerenciador de contexto assíncrono: ao sair, encerra
+    todos os processos e apaga os diretórios.
+    """
+
+    def __init__(self, clientes, ambiente=None, entrada=False, preparar_servidor=None):
+        """
+        Args:
+            clientes: Quantidade de clientes
+            ambiente: Variáveis de ambiente comuns aos nós
+            entrada: Abre a entrada local (socket TCP) de cada cliente
+            preparar_servidor: Função chamada com o diretório do servidor antes de iniciá-lo
+        """
+        self.raiz = tempfile.mkdtemp(prefix="benchmark_")
+        self.ambiente = dict(ambiente or {})
+        self.portas = [porta_livre() for _ in range(clientes)] if entrada else []
+        self.servidor = Processo("server", "server.py", os.path.join(self.raiz, "server"),
+                                 self.ambiente)
+        self.clientes = []
+        for i in range(clientes):
+            ambiente_cliente = dict(self.ambiente)
+            if entrada:
+                ambiente_cliente["ENTRADA_CLIENTE"] = str(self.portas[i])
+            self.clientes.append(Processo(f"client{i + 1}", "client.py",
+                                          os.path.join(self.raiz, f"client{i + 1}"),
+                                          ambiente_cliente))
+        self.preparar_servidor = preparar_servidor
+
+    @property
+    def nos(self):
+        return [self.servidor] + self.clientes
+
+    async def iniciar_servidor(self):
+        os.makedirs(self.servidor.diretorio, exist_ok=True)
+        if self.preparar_servidor is not None:
+            self.preparar_servidor(self.servidor.diretorio)
+        pronto = asyncio.ensure_future(self.servidor.esperar("replica"))
+        await self.servidor.iniciar()
+        await pronto
+
+    async def iniciar_clientes(self):
+        """Inicia os clientes e espera que todos tenham enviado a mensagem de teste."""
+        prontos = [asyncio.ensure_future(cliente.esperar("enviadas", canal="geral"))
+                   for cliente in self.clientes]
+        for cliente in self.clientes:
+            await cliente.iniciar()
+        await asyncio.gather(*prontos)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excecao):
+        await asyncio.gather(*(no.encerrar() for no in self.nos))
+        shutil.rmtree(self.raiz, ignore_errors=True)
+
+
+async def medir_vazao(clientes, mensagens, tamanho, ambiente):
+    """
+    Vazão de chat, latência de entrega fim a fim e bytes gravados em disco.
+
+    As mensagens são distribuídas entre os clientes pela entrada local,
+    todas de uma vez; a latência de cada entrega vai do envio ao evento
+    "gravada" de cada cliente. A vazão considera o intervalo
+    entre o primeiro envio e a última entrega.
+
+    Returns:
+        dict: Resultados do cenário
+    """
+    async with Topologia(clientes, ambiente, entrada=True) as topologia:
+        await topologia.iniciar_servidor()
+        await topologia.iniciar_clientes()
+        disco_inicial = sum(bytes_em_disco(no.diretorio) for no in topologia.nos)
+
+        enviadas = {}
+        latencias = []
+        pendentes = {i: set(range(clientes)) for i in range(mensagens)}
+        concluido = asyncio.get_running_loop().create_future()
+        ultima = [None]
+
+        def observar_cliente(indice):
+            def observar(agora, evento):
+                if evento.get("evento") != "gravada":
+                    return
+                achado = PADRAO_ID.search(evento.get("conteudo", ""))
+                if achado is None:
+                    return
+                numero = int(achado.group(1))
+                faltam = pendentes.get(numero)
+                if faltam is None or indice not in faltam:
+                    return
+                faltam.discard(indice)
+                latencias.append(agora - enviadas[numero])
+                ultima[0] = agora
+                if not faltam:
+                    del pendentes[numero]
+                    if not pendentes and not concluido.done():
+                        concluido.set_result(agora)
+            return observar
+
+        for indice, cliente in enumerate(topologia.clientes):
+            cliente.observar(observar_cliente(indice))
+
+        conexoes = [await asyncio.open_connection("127.0.0.1", porta) for porta in topologia.portas]
+        enchimento = "x" * max(0, tamanho - len(PREFIXO) - 8)
+        inicio = time.perf_counter()
+        for numero in range(mensagens):
+            _, escrita = conexoes[numero % clientes]
+            enviadas[numero] = time.perf_counter()
+            escrita.write(f"{PREFIXO}-{numero} {enchimento}\n".encode())
+        for _, escrita in conexoes:
+            await escrita.drain()
+
+        expirou = False
+        try:
+            await asyncio.wait_for(concluido, TEMPO_LIMITE)
+        except asyncio.TimeoutError:
+            expirou = True
+        for _, escrita in conexoes:
+            escrita.close()
+        await asyncio.sleep(0.5)  # Gravações em disco ainda na fila
+        disco = sum(bytes_em_disco(no.diretorio) for no in topologia.nos) - disco_inicial
+
+        duracao = (ultima[0] or time.perf_counter()) - inicio
+        entregues = mensagens * clientes - sum(len(faltam) for faltam in pendentes.values())
+        return {
+            "clientes": clientes,
+            "mensagens": mensagens,
+            "tamanho": tamanho,
+            "expirou": expirou,
+            "entregas": entregues,
+            "entregas_esperadas": mensagens * clientes,
+            "segundos": duracao,
+            "mensagens_por_segundo": (mensagens - len(pendentes)) / duracao if duracao > 0 else None,
+            "latencia_segundos": percentis(latencias),
+            "disco_bytes_por_mensagem": disco / (mensagens * len(topologia.nos)),
+        }
+
+
+async def medir_rotacao(tamanhos, voltas, ambiente):
+    """
+    Tempo de rotação do token em função do tamanho do anel.
+
+    Com mais de um cliente o token circula só entre os clientes; a
+    rotação é o intervalo entre duas posses seguidas do primeiro
+    cliente. Com um único cliente o token volta ao servidor, que espera
+    antes de repassá-lo, e a medida inclui essa espera.
+
+    Returns:
+        list: Um resultado por tamanho de anel
+    """
+    resultados = []
+    for clientes in tamanhos:
+        async with Topologia(clientes, {**AMBIENTE_ROTACAO, **ambiente}) as topologia:
+            await topologia.iniciar_servidor()
+            await topologia.iniciar_clientes()
+            rotacoes = []
+            posse_anterior = [None]
+            completas = asyncio.get_running_loop().create_future()
+
+            def observar(agora, evento):
+                if evento.get("evento") != "token_recebido" or evento.get("canal") != "geral":
+                    return
+                if posse_anterior[0] is not None:
+                    rotacoes.append(agora - posse_anterior[0])
+                    if len(rotacoes) >= voltas and not completas.done():
+                        completas.set_result(None)
+                posse_anterior[0] = agora
+
+            topologia.clientes[0].observar(observar)
+            expirou = False
+            try:
+                await asyncio.wait_for(completas, TEMPO_LIMITE)
+            except asyncio.TimeoutError:
+                expirou = True
+            resumo = percentis(rotacoes)
+            resultados.append({"clientes": clientes, "expirou": expirou,
+                               "rotacao_segundos": resumo,
+                               "por_salto_segundos": (resumo["p50"] / clientes
+                                                      if resumo["p50"] is not None else None)})
+        print(f"[LOG] Rotação com {clientes} clientes: {resultados[-1]['rotacao_segundos']}")
+    return resultados
+
+
+def preencher_historico(quantidade, tamanho):
+    """Retorna a função que grava um histórico sintético na réplica do servidor."""
+    def preparar(diretorio):
+        log = LogSegmentado(os.path.join(diretorio, "replica_server"))
+        agora = time.time()
+        enchimento = "x" * max(0, tamanho - len(PREFIXO) - 8)
+        for seq in range(1, quantidade + 1):
+            log.anexar({"type": "chat", "sender": f"{PREFIXO}-historico", "seq": seq,
+                        "content": f"{PREFIXO}-{seq} {enchimento}", "timestamp": agora,
+                        "hlc": [int(agora * 1000), seq]})
+        log.fechar()
+    return preparar
+
+
+async def medir_sincronizacao(historicos, tamanho, ambiente, observador):
+    """
+    Custo para um cliente novo obter um histórico já existente no servidor.
+
+    Mede a anti-entropia (resumos a cada 0,5 s, bytes multicast de
+    digest/sync_req/sync contados pelo observador) e o bootstrap por TCP
+    (PORTA_BOOTSTRAP; só o tempo, pois os bytes não passam pelo grupo).
+
+    Returns:
+        list: Um resultado por tamanho de histórico e caminho
+    """
+    resultados = []
+    for quantidade in historicos:
+        for via in ("anti-entropia", "bootstrap"):
+            ambiente_cenario = {**ambiente, "INTERVALO_RECONCILIACAO": "0.5"}
+            if via == "bootstrap":
+                ambiente_cenario["PORTA_BOOTSTRAP"] = str(porta_livre())
+            async with Topologia(1, ambiente_cenario,
+                                 preparar_servidor=preencher_historico(quantidade, tamanho)) as topologia:
+                await topologia.iniciar_servidor()
+                recebidas = [0]
+                concluido = asyncio.get_running_loop().create_future()
+
+                def observar(agora, evento):
+                    if (evento.get("evento") == "gravada"
+                            and str(evento.get("id")).startswith(f"{PREFIXO}-historico:")):
+                        recebidas[0] += 1
+                        if recebidas[0] >= quantidade and not concluido.done():
+                            concluido.set_result(agora)
+
+                cliente = topologia.clientes[0]
+                cliente.observar(observar)
+                observador.zerar()
+                inicio = time.perf_counter()
+                await cliente.iniciar()
+                expirou = False
+                try:
+                    fim = await asyncio.wait_for(concluido, TEMPO_LIMITE)
+                except asyncio.TimeoutError:
+                    expirou = True
+                    fim = time.perf_counter()
+                bytes_grupo = {tipo: observador.bytes.get(tipo, 0) for tipo in TIPOS_SINCRONIZACAO}
+                resultados.append({"historico": quantidade, "via": via, "expirou": expirou,
+                                   "recebidas": recebidas[0], "segundos": fim - inicio,
+                                   "bytes_multicast": bytes_grupo,
+                                   "bytes_por_mensagem": (sum(bytes_grupo.values()) / quantidade
+                                                          if via == "anti-entropia" else None)})
+            print(f"[LOG] Sincronização de {quantidade} mensagens por {via}: "
+                  f"{resultados[-1]['segundos']:.3f}s")
+    return resultados
+
+
+# Métricas comparadas com --comparar: (caminho no JSON, maior é melhor)
+METRICAS_COMPARADAS = [
+    (("vazao", "mensagens_por_segundo"), True),
+    (("vazao", "latencia_segundos", "p50"), False),
+    (("vazao", "latencia_segundos", "p99"), False),
+    (("vazao", "disco_bytes_por_mensagem"), False),
+]
+
+
+def _valor(resultado, caminho):
+    for chave in caminho:
+        if not isinstance(resultado, dict) or chave not in resultado:
+            return None
+        resultado = resultado[chave]
+    return resultado
+
+
+def metricas_comparaveis(resultado):
+    """
+    Lista as métricas de um resultado que podem ser comparadas entre versões.
+
+    Returns:
+        dict: Nome da métrica -> (valor, maior é melhor)
+    """
+    metricas = {}
+    for caminho, maior_melhor in METRICAS_COMPARADAS:
+        valor = _valor(resultado, caminho)
+        if valor is not None:
+            metricas[".".join(caminho)] = (valor, maior_melhor)
+    for item in resultado.get("rotacao", []):
+        valor = item["rotacao_segundos"]["p50"]
+        if valor is not None:
+            metricas[f"rotacao.{item['clientes']}.p50"] = (valor, False)
+    for item in resultado.get("sincronizacao", []):
+        metricas[f"sincronizacao.{item['via']}.{item['historico']}.segundos"] = (item["segundos"], False)
+        if item["bytes_por_mensagem"] is not None:
+            metricas[f"sincronizacao.{item['via']}.{item['historico']}.bytes_por_mensagem"] = (
+                item["bytes_por_mensagem"], False)
+    return metricas
+
+
+def comparar(atual, anterior, tolerancia):
+    """
+    Compara dois resultados e lista as regressões acima da tolerância.
+
+    Args:
+        atual, anterior: Resultados do benchmark (dicionários do JSON)
+        tolerancia: Piora relativa aceita (0.2 = 20%)
+
+    Returns:
+        list: (métrica, valor anterior, valor atual) das regressões
+    """
+    regressoes = []
+    antes = metricas_comparaveis(anterior)
+    for nome, (valor, maior_melhor) in metricas_comparaveis(atual).items():
+        if nome not in antes or not antes[nome][0]:
+            continue
+        referencia = antes[nome][0]
+        variacao = (valor - referencia) / referencia
+        if (maior_melhor and variacao < -tolerancia) or (not maior_melhor and variacao > tolerancia):
+            regressoes.append((nome, referencia, valor))
+    return regressoes
+
+
+def _lista(texto):
+    return [int(item) for item in texto.split(",") if item.strip()]
+
+
+async def executar(args):
+    """Executa os cenários escolhidos e monta o resultado."""
+    ambiente = dict(item.split("=", 1) for item in args.env)
+    ambiente["MODO_ORDENACAO"] = args.modo
+    resultado = {"versao": versao_atual(), "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "parametros": {"modo": args.modo, "ambiente": ambiente}}
+    observador = await abrir_observador()
+    try:
+        if args.mensagens:
+            resultado["vazao"] = await medir_vazao(args.clientes, args.mensagens, args.tamanho, ambiente)
+            print(f"[LOG] Vazão: {resultado['vazao']['mensagens_por_segundo']} mensagens/s; "
+                  f"latência: {resultado['vazao']['latencia_segundos']}")
+        if args.aneis and args.modo == "token":
+            resultado["rotacao"] = await medir_rotacao(_lista(args.aneis), args.voltas, ambiente)
+        if args.historicos:
+            resultado["sincronizacao"] = await medir_sincronizacao(_lista(args.historicos),
+                                                                   args.tamanho, ambiente, observador)
+    finally:
+        observador.fechar()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks do chat em loopback (servidor e clientes locais, sem emulação de rede).")
+    parser.add_argument("--clientes", type=int, default=3, help="Clientes no cenário de vazão")
+    parser.add_argument("--mensagens", type=int, default=500,
+                        help="Mensagens no cenário de vazão (0 = não executa)")
+    parser.add_argument("--tamanho", type=int, default=100, help="Tamanho do texto de cada mensagem")
+    parser.add_argument("--aneis", default="2,4,8", help="Tamanhos de anel da rotação do token")
+    parser.add_argument("--voltas", type=int, default=10, help="Rotações medidas por tamanho de anel")
+    parser.add_argument("--historicos", default="100,1000",
+                        help="Tamanhos de histórico da sincronização")
+    parser.add_argument("--modo", default="token", choices=("token", "sequenciador"))
+    parser.add_argument("--env", action="append", default=[], metavar="CHAVE=VALOR",
+                        help="Variável de ambiente repassada aos nós (repetível)")
+    parser.add_argument("--saida", default="benchmark.json", help="Arquivo JSON com os resultados")
+    parser.add_argument("--comparar", metavar="ARQUIVO",
+                        help="Resultado anterior; sai com erro se houver regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Piora relativa aceita na comparação (padrão: 0.2)")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(executar(args))
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"[LOG] Resultados gravados em {args.saida}.")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+        regressoes = comparar(resultado, anterior, args.tolerancia)
+        for nome, antes, depois in regressoes:
+            print(f"[ERRO] Regressão em {nome}: {antes:.6g} -> {depois:.6g}")
+        if regressoes:
+            sys.exit(1)
+        print(f"[LOG] Sem regressões em relação a {args.comparar}.")
+
+
+if __name__ == "__main__":
+    main()
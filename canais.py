@@ -0,0 +1,139 @@
+import os
+import hashlib
+
+from antientropia import ResumoReplica
+from estado import EstadoNo
+from fila import FilaSaida
+from fluxo import ControleFluxo, DetectorCongestionamento
+from nack import BufferRetransmissao, ReparoNack
+from sequenciador import MODO_ORDENACAO, MODOS_ORDENACAO, EntregaOrdenada, Sequenciador
+from vigia import VigiaToken
+
+CANAL_PADRAO = "geral"
+GRUPO_CONTROLE = "224.1.1.1"  # Grupo do canal padrão; também recebe os joins
+PREFIXO_GRUPOS = "239.192"  # Faixa de escopo organizacional para os demais canais
+
+
+def grupo_do_canal(nome):
+    """
+    Mapeia o nome de um canal para o seu grupo multicast.
+
+    O mapeamento é determinístico, de modo que servidor e clientes
+    chegam ao mesmo grupo sem precisar trocá-lo pela rede.
+
+    Args:
+        nome: Nome do canal
+
+    Returns:
+        str: Endereço do grupo multicast
+    """
+    if nome == CANAL_PADRAO:
+        return GRUPO_CONTROLE
+    resumo = hashlib.blake2b(nome.encode(), digest_size=2).digest()
+    return f"{PREFIXO_GRUPOS}.{resumo[0]}.{resumo[1]}"
+
+
+def rotulo_canal(canal):
+    """Valor do campo "canal" das mensagens de um canal (None no canal padrão)."""
+    return None if canal.nome == CANAL_PADRAO else canal.nome
+
+
+def canal_da_mensagem(msg):
+    """Retorna o canal de uma mensagem gravada (ausente = canal padrão)."""
+    return msg.get("canal", CANAL_PADRAO)
+
+
+def caminho_checkpoint(caminho_base, nome):
+    """
+    Retorna o arquivo de checkpoint de um canal.
+
+    O canal padrão usa o próprio caminho base, mantendo o nome original
+    do arquivo; os demais recebem o nome do canal como sufixo.
+    """
+    if nome == CANAL_PADRAO:
+        return caminho_base
+    raiz, extensao = os.path.splitext(caminho_base)
+    return f"{raiz}_{nome}{extensao}"
+
+
+def ler_canais(especificacao=None):
+    """
+    Interpreta a lista de canais da variável de ambiente CANAIS.
+
+    Cada item é um nome de canal, opcionalmente seguido do modo de
+    ordenação (usado só no servidor), por exemplo "geral,avisos:sequenciador".
+
+    Args:
+        especificacao: Texto da configuração (padrão: CANAIS ou "geral")
+
+    Returns:
+        dict: Nome do canal -> modo de ordenação, na ordem da configuração
+
+    Raises:
+        ValueError: Se um modo é desconhecido
+    """
+    if especificacao is None:
+        especificacao = os.environ.get("CANAIS", CANAL_PADRAO)
+    canais = {}
+    for item in especificacao.split(","):
+        nome, _, modo = item.strip().partition(":")
+        if not nome:
+            continue
+        modo = modo or MODO_ORDENACAO
+        if modo not in MODOS_ORDENACAO:
+            raise ValueError(f"Modo de ordenação inválido para o canal {nome!r}: {modo!r}")
+        canais[nome] = modo
+    return canais or {CANAL_PADRAO: MODO_ORDENACAO}
+
+
+class Canal:
+    """
+    Estado de um canal (sala) em um nó.
+
+    Cada canal tem o seu grupo multicast, o seu núcleo de rede e o seu
+    próprio anel (ou sequenciador), de modo que um nó só recebe o
+    tráfego dos canais que assina. A réplica em disco é compartilhada;
+    as mensagens de canais diferentes do padrão levam o campo "canal".
+
+    Atributos:
+        nome: Nome do canal
+        grupo: Grupo multicast do canal
+        modo: Modo de ordenação (token ou sequenciador)
+        estado: EstadoNo com token, anel e sequência do nó neste canal
+        resumo: Marcas d'água das mensagens do canal (anti-entropia)
+        nucleo: NucleoDatagramas associado ao grupo do canal
+        vigia, sequenciador, retransmissao, fluxo: Usados pelo servidor
+        fila, entrega, reparo, congestionamento: Usados pelos clientes
+    """
+
+    def __init__(self, nome, no_id, token=False, modo=MODO_ORDENACAO):
+        """
+        Args:
+            nome: Nome do canal
+            no_id: ID do nó local
+            token: Se o nó inicia com o token deste canal
+            modo: Modo de ordenação do canal
+        """
+        self.nome = nome
+        self.grupo = grupo_do_canal(nome)
+        self.modo = modo
+        self.estado = EstadoNo(no_id, token=token)
+        self.resumo = ResumoReplica()
+        self.nucleo = None
+        self.vigia = VigiaToken()
+        self.sequenciador = Sequenciador()
+        self.fila = FilaSaida()
+        self.entrega = EntregaOrdenada()
+        self.retransmissao = BufferRetransmissao()
+        self.reparo = ReparoNack()
+        self.fluxo = ControleFluxo()
+        self.congestionamento = DetectorCongestionamento()
+        self.timer_lacuna = None
+        self.timer_nack = None
+        self.repassando = False
+        self.contido_ate = 0.0  # Fim da pausa de envio pedida pelo servidor (relógio do laço)
+        self.drenando = False
+        self.epoca_pedida = (0, 0)  # (encarnação, época) do último join pedido
+
+    def __repr__(self):
+        return f"Canal({self.nome!r}, grupo={self.grupo}, modo={self.modo})"
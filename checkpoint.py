@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import threading
+
+from metricas import ESPERA_LOCK, ESCRITA_DISCO
+from registro import log
+
+# Configuração padrão (pode ser ajustada pelas variáveis de ambiente)
+JANELA_COALESCENCIA = float(os.environ.get("CHECKPOINT_JANELA", "0.05"))  # Segundos
+POLITICA_FSYNC = os.environ.get("CHECKPOINT_FSYNC", "intervalo")  # sempre | intervalo | nunca
+INTERVALO_FSYNC = float(os.environ.get("CHECKPOINT_INTERVALO_FSYNC", "1.0"))  # Segundos
+POLITICAS_FSYNC = ("sempre", "intervalo", "nunca")
+
+
+class GravadorCheckpoint:
+    """
+    Grava checkpoints de forma agrupada e segura contra quedas.
+
+    Chamadas a salvar() apenas registram o estado mais recente e retornam
+    imediatamente. Uma thread dedicada espera uma curta janela de
+    coalescência e grava somente o último estado recebido, de modo que
+    várias atualizações seguidas custam uma única escrita.
+
+    A escrita é feita em um arquivo temporário, sempre descarregado com
+    fsync, seguido de os.replace(), que é atômico: após uma queda o
+    checkpoint contém um estado completo, o novo ou o anterior. Nunca um
+    arquivo pela metade. A política decide só quando o diretório é
+    sincronizado, ou seja, quanto a renomeação pode ser perdida: no
+    máximo a janela de coalescência (mais o intervalo de fsync, na
+    política "intervalo") de atraso.
+
+    Políticas de fsync do diretório:
+        sempre: a cada escrita
+        intervalo: no máximo uma vez a cada INTERVALO_FSYNC segundos
+        nunca: deixa a descarga para o sistema operacional
+    """
+
+    def __init__(self, caminho, janela=JANELA_COALESCENCIA, fsync=POLITICA_FSYNC,
+                 intervalo_fsync=INTERVALO_FSYNC):
+        """
+        Args:
+            caminho: Arquivo de checkpoint
+            janela: Tempo em segundos para agrupar atualizações
+            fsync: Política de fsync do diretório ("sempre", "intervalo" ou "nunca")
+            intervalo_fsync: Intervalo mínimo entre fsyncs na política "intervalo"
+        """
+        if fsync not in POLITICAS_FSYNC:
+            raise ValueError(f"Política de fsync inválida: {fsync!r}")
+        self.caminho = caminho
+        self.janela = janela
+        self.fsync = fsync
+        self.intervalo_fsync = intervalo_fsync
+        self.escritas = 0
+        self.escritas_evitadas = 0
+        self._ultimo = None
+        self._pendente = False
+        self._gravando = False
+        self._ultimo_fsync = 0.0
+        self._encerrar = False
+        self._condicao = threading.Condition()
+        self._thread = threading.Thread(target=self._executar, daemon=True,
+                                        name=f"checkpoint-{os.path.basename(caminho)}")
+        self._thread.start()
+
+    def salvar(self, estado):
+        """
+        Registra um novo estado para gravação (não bloqueia).
+
+        Args:
+            estado: dict serializável em JSON
+        """
+        inicio = time.perf_counter()
+        with self._condicao:
+            ESPERA_LOCK.observar(time.perf_counter() - inicio, lock="checkpoint")
+            if self._pendente:
+                self.escritas_evitadas += 1
+            self._ultimo = estado
+            self._pendente = True
+            self._condicao.notify()
+
+    def carregar(self):
+        """
+        Retorna o estado mais recente, mesmo que ainda não gravado.
+
+        Returns:
+            dict com o estado
+
+        Raises:
+            FileNotFoundError, json.JSONDecodeError: Se não há checkpoint
+                em memória e o arquivo não existe ou está corrompido
+        """
+        with self._condicao:
+            if self._ultimo is not None:
+                return dict(self._ultimo)
+        with open(self.caminho, "r") as f:
+            estado = json.load(f)
+        with self._condicao:
+            if self._ultimo is None:
+                self._ultimo = estado
+        return dict(estado)
+
+    def descarregar(self):
+        """Grava imediatamente o estado pendente e espera a conclusão."""
+        with self._condicao:
+            while self._gravando:
+                self._condicao.wait()
+            if self._pendente:
+                self._gravar_pendente()
+
+    def fechar(self):
+        """Descarrega o estado pendente e encerra a thread de escrita."""
+        self.descarregar()
+        with self._condicao:
+            self._encerrar = True
+            self._condicao.notify()
+        self._thread.join()
+
+    def _executar(self):
+        """Laço da thread de escrita."""
+        with self._condicao:
+            while True:
+                while not self._pendente and not self._encerrar:
+                    self._condicao.wait()
+                if self._encerrar:
+                    return
+                # Janela de coalescência: novas chamadas a salvar() apenas
+                # substituem o estado pendente
+                limite = time.monotonic() + self.janela
+                restante = self.janela
+                while restante > 0 and not self._encerrar:
+                    self._condicao.wait(restante)
+                    restante = limite - time.monotonic()
+                while self._gravando:
+                    self._condicao.wait()
+                if self._pendente:
+                    self._gravar_pendente()
+
+    def _gravar_pendente(self):
+        """Grava o último estado (chamado com a condição adquirida)."""
+        estado = self._ultimo
+        self._pendente = False
+        self._gravando = True
+        self._condicao.release()
+        try:
+            with ESCRITA_DISCO.medir(operacao="checkpoint"):
+                self._gravar(estado)
+        except OSError as e:
+            log.erro("checkpoint", "Falha ao gravar checkpoint", caminho=self.caminho, erro=str(e))
+        finally:
+            self._condicao.acquire()
+            self._gravando = False
+            self._condicao.notify_all()
+
+    def _gravar(self, estado):
+        """Escreve o estado no arquivo temporário e o renomeia atomicamente."""
+        temporario = self.caminho + ".tmp"
+        agora = time.monotonic()
+        sincronizar = self.fsync == "sempre" or (
+            self.fsync == "intervalo" and agora - self._ultimo_fsync >= self.intervalo_fsync)
+
+        # Os dados vão para o disco antes da renomeação: sem isso, uma queda
+        # pode deixar o nome novo apontando para um arquivo vazio
+        with open(temporario, "w") as f:
+            json.dump(estado, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+
+        if sincronizar:
+            self._ultimo_fsync = agora
+            self._sincronizar_diretorio()
+        self.escritas += 1
+        if self.escritas % 100 == 0:
+            log.info("checkpoint_escritas", "Escritas de checkpoint",
+                     arquivo=os.path.basename(self.caminho), escritas=self.escritas,
+                     evitadas=self.escritas_evitadas)
+
+    def _sincronizar_diretorio(self):
+        """Garante que a renomeação sobreviva a uma queda (quando suportado)."""
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.caminho)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
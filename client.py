@@ -1,34 +1,55 @@
 import os
-import json
-import threading
-import socket
+import sys
 import time
-import random
 import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from antientropia import ResumoReplica, coletar_delta
+from armazenamento import (ARQUIVO_INDICE_IDENTIDADES, FiltroBloom, IndiceIdentidades,
+                           LogSegmentado, converter_replica_json, identidade_mensagem)
+from canais import (CANAL_PADRAO, GRUPO_CONTROLE, Canal, caminho_checkpoint,
+                    canal_da_mensagem, ler_canais, rotulo_canal)
+from checkpoint import GravadorCheckpoint
+from consulta import PORTA_CONSULTA, IndiceHistorico, iniciar_servidor_consulta
+from fila import LOTE_MAXIMO_BYTES, TOKEN_ORCAMENTO_BYTES, TOKEN_TEMPO_MAXIMO
+from hlc import RelogioHibrido, carimbo_valido
+from metricas import (CHECKPOINTS, DUPLICATAS, ESCRITA_DISCO, MENSAGENS_GRAVADAS, POSSE_TOKEN,
+                      LockMedido, iniciar_metricas)
+from nack import sequencias
+from nucleo import NucleoDatagramas, criar_socket_multicast
+from protocolo import FORMATO_JSON, FORMATOS_SUPORTADOS
+from rastreamento import (amostrar, campos_salto, carimbar, continuar_rastro_token, iniciar_rastro,
+                          salto_amostrado)
+from registro import id_mensagem, log, trecho
+from sequenciador import ESPERA_LACUNA, MODO_SEQUENCIADOR, MODO_TOKEN
+from snapshot import baixar_bootstrap
 
 # Configurações de rede
 PORT = 50007
-MULTICAST_GROUP = "224.1.1.1"
-SERVER_ADDR = (MULTICAST_GROUP, PORT)
+CONTROLE_ADDR = (GRUPO_CONTROLE, PORT)  # Destino dos joins
 CLIENT_UUID = uuid.uuid4().hex[:8]  # ID único para este cliente
+CANAIS_ASSINADOS = list(ler_canais())  # Canais assinados; o primeiro é o padrão da entrada local
+# Entrada local de mensagens: "stdin", uma porta TCP em 127.0.0.1 ou vazio (desligada)
+ENTRADA_CLIENTE = os.environ.get("ENTRADA_CLIENTE", "")
 
 # Caminhos para arquivos de persistência
-REPLICA_FILE = os.path.join(os.getcwd(), f"replica_{CLIENT_UUID}.json")
+REPLICA_DIR = os.path.join(os.getcwd(), f"replica_{CLIENT_UUID}")
+REPLICA_FILE = os.path.join(os.getcwd(), f"replica_{CLIENT_UUID}.json")  # Formato antigo
 CHECKPOINT_FILE = os.path.join(os.getcwd(), f"checkpoint_{CLIENT_UUID}.json")
 
 # Controle de concorrência e estado
-checkpoint_lock = threading.Lock()
-replica_lock = threading.Lock()
+replica_lock = LockMedido("replica")  # Protege a réplica (espera medida)
 teste_enviado = False  # Controle para envio único de mensagem de teste
-pode_enviar_mensagem = False  # Controle para exclusão mútua (token ring)
-
-# Configuração do socket para comunicação multicast
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sock.bind(("", PORT))
-sock.setsockopt(socket.IPPROTO_IP,
-                socket.IP_ADD_MEMBERSHIP,
-                socket.inet_aton(MULTICAST_GROUP) + socket.inet_aton("0.0.0.0"))
+bootstrap_iniciado = False  # O bootstrap pelo canal lateral do servidor é feito uma vez
+canais = {}  # Canais assinados (nome -> Canal): anel, token, fila e núcleo de cada um
+replica = None  # Log segmentado com as mensagens do cliente (todos os canais)
+historico = None  # Índices de consulta ao histórico (por tempo, remetente, posição e ordem causal)
+relogio = RelogioHibrido()  # Carimbos HLC das mensagens enviadas
+indice = None  # Índice persistente de identidades para rejeitar duplicatas
+disco = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"disco-{CLIENT_UUID}")  # Comum aos canais
 
 
 def inicializar_arquivos():
@@ -36,316 +57,807 @@ def inicializar_arquivos():
     Cria os arquivos de réplica e checkpoint do cliente se não existirem.
     
     Este método garante a persistência dos dados e possibilita a recuperação
-    em caso de falhas ou reinício do cliente.
+    em caso de falhas ou reinício do cliente. Uma réplica no formato antigo
+    (array JSON) é convertida para o log segmentado. Cada canal assinado
+    tem o seu próprio checkpoint.
     """
-    if not os.path.exists(REPLICA_FILE):
-        with open(REPLICA_FILE, "w") as f:
-            json.dump([], f, indent=4)
-        print(f"[LOG] {CLIENT_UUID}: Arquivo de réplica criado.")
+    global replica, indice, historico
+    for nome in CANAIS_ASSINADOS:
+        canais[nome] = Canal(nome, CLIENT_UUID, modo=MODO_TOKEN)
+    replica = LogSegmentado(REPLICA_DIR)
+    historico = IndiceHistorico(replica)
+    indice = IndiceIdentidades(os.path.join(REPLICA_DIR, ARQUIVO_INDICE_IDENTIDADES), FiltroBloom())
+    converter_replica_json(REPLICA_FILE, replica)
+    reconstruir_resumo()
+    for canal in canais.values():
+        canal.reparo.base(canal.resumo.digest())
+    log.info("replica", "Réplica aberta", diretorio=REPLICA_DIR)
     
-    if not os.path.exists(CHECKPOINT_FILE):
-        with checkpoint_lock, open(CHECKPOINT_FILE, "w") as f:
-            json.dump({
-                "last_message": "", 
-                "token": False,  # Inicia sem o token
-                "neighbors": []
-            }, f, indent=4)
-        print(f"[LOG] {CLIENT_UUID}: Arquivo de checkpoint criado.")
+    for canal in canais.values():
+        caminho = caminho_checkpoint(CHECKPOINT_FILE, canal.nome)
+        canal.estado.gravador = GravadorCheckpoint(caminho)
+        if not os.path.exists(caminho):
+            salvar_checkpoint(canal, "")  # Inicia sem o token
+            canal.estado.gravador.descarregar()
+            log.info("checkpoint_criado", "Arquivo de checkpoint criado", caminho=caminho)
 
 
-def salvar_checkpoint(last_msg, token, neighbors):
-    """
-    Salva o estado atual no checkpoint do cliente.
-    
-    Implementa tolerância a falhas salvando o estado atual do cliente,
-    permitindo recuperação em caso de queda.
-    
-    Args:
-        last_msg: String com a última mensagem processada
-        token: Boolean indicando se o cliente possui o token
-        neighbors: Lista de IDs dos vizinhos no anel lógico
-    """
-    estado = {"last_message": last_msg, "token": token, "neighbors": neighbors}
-    with checkpoint_lock, open(CHECKPOINT_FILE, "w") as f:
-        json.dump(estado, f, indent=4)
-    print(f"[LOG] {CLIENT_UUID}: Checkpoint atualizado: token={token}, vizinhos={len(neighbors)}")
+def canal_padrao():
+    """Retorna o primeiro canal assinado, usado quando nenhum é indicado."""
+    return canais[CANAIS_ASSINADOS[0]]
 
 
-def carregar_checkpoint():
+def salvar_checkpoint(canal, last_msg=None):
     """
-    Carrega o estado salvo no checkpoint, tratando possíveis erros.
+    Salva um snapshot do estado em memória no checkpoint do canal.
     
-    Parte da estratégia de tolerância a falhas, permite recuperar
-    o último estado conhecido do cliente.
+    Implementa tolerância a falhas salvando o estado atual do cliente,
+    permitindo recuperação em caso de queda. O estado autoritativo é o
+    objeto `canal.estado`; o arquivo é só uma cópia, gravada em segundo
+    plano (agrupada e atômica) pelo GravadorCheckpoint.
     
-    Returns:
-        dict: Estado do cliente (token, vizinhos, última mensagem)
+    Args:
+        canal: Canal cujo estado é salvo
+        last_msg: String com a última mensagem processada (opcional)
     """
-    with checkpoint_lock:
-        try:
-            with open(CHECKPOINT_FILE, "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"[LOG] {CLIENT_UUID}: Erro ao carregar checkpoint: {e}")
-            # Cria um checkpoint padrão caso não exista ou esteja corrompido
-            salvar_checkpoint("", False, [])
-            return {"last_message": "", "token": False, "neighbors": []}
+    canal.estado.persistir(last_msg)
+    CHECKPOINTS.incrementar(canal=canal.nome)
+    log.debug("checkpoint", "Checkpoint atualizado", canal=canal.nome, token=canal.estado.token,
+              vizinhos=len(canal.estado.vizinhos))
 
 
-def sincronizar_replicas():
+def reconstruir_resumo():
     """
-    Ordena as mensagens na réplica local para garantir consistência.
+    Reconstrói o resumo de cada canal (marcas d'água e posições) a partir do log.
     
-    Implementação do princípio de consistência eventual, garantindo
-    que as mensagens estejam em ordem cronológica.
+    Necessário na inicialização e sempre que o log é reescrito, pois as
+    posições das mensagens mudam. Também completa o índice de identidades
+    caso o processo tenha caído entre a gravação no log e no índice.
     """
-    try:
-        with replica_lock:
-            with open(REPLICA_FILE, "r") as f:
-                historico = json.load(f)
-            
-            # Ordena mensagens por timestamp (se disponível)
-            if historico and isinstance(historico[0], dict) and "timestamp" in historico[0]:
-                historico = sorted(historico, key=lambda x: x.get("timestamp", 0))
-            
-            with open(REPLICA_FILE, "w") as f:
-                json.dump(historico, f, indent=4)
-    except Exception as e:
-        print(f"[LOG] {CLIENT_UUID}: Erro ao sincronizar réplica: {e}")
+    novos = {nome: ResumoReplica() for nome in canais}
+    for posicao, msg in replica.registros_com_posicao():
+        resumo = novos.get(canal_da_mensagem(msg))
+        if resumo is not None:
+            resumo.registrar(msg.get("sender"), msg.get("seq"), posicao)
+        identidade = identidade_mensagem(msg)
+        if identidade is not None:
+            indice.adicionar(identidade)
+    for nome, resumo in novos.items():
+        canais[nome].resumo = resumo
 
 
-def gravar_mensagem(msg_obj):
+def gravar_mensagem(canal, msg_obj):
     """
     Grava uma mensagem na réplica local do cliente.
     
     Implementa o mecanismo de replicação, mantendo cópia local
-    de todas as mensagens do chat.
+    de todas as mensagens do chat. Mensagens recebidas mais de uma vez
+    (ao vivo, retransmitidas pelo servidor ou via sincronização) são
+    rejeitadas em tempo constante pelo índice de identidades.
     
     Args:
+        canal: Canal em que a mensagem foi recebida
         msg_obj: Objeto de mensagem a ser armazenado
+    
+    Returns:
+        bool: True se a mensagem era nova e foi gravada
     """
     with replica_lock:
-        try:
-            with open(REPLICA_FILE, "r") as f:
-                historico = json.load(f)
-        except Exception as e:
-            print(f"[LOG] {CLIENT_UUID}: Erro ao ler histórico: {e}")
-            historico = []
-        
-        # Adiciona timestamp para ordenação posterior
+        # Adiciona timestamp (ordenação de mensagens sem carimbo HLC)
         if isinstance(msg_obj, dict) and "timestamp" not in msg_obj:
             msg_obj["timestamp"] = time.time()
-            
-        historico.append(msg_obj)
-        with open(REPLICA_FILE, "w") as f:
-            json.dump(historico, f, indent=4)
-        print(f"[LOG] {CLIENT_UUID}: Mensagem gravada: {msg_obj}")
+        if carimbo_valido(msg_obj.get("hlc")):
+            relogio.receber(msg_obj["hlc"])
+        if canal.nome != CANAL_PADRAO:
+            msg_obj["canal"] = canal.nome
+        
+        identidade = identidade_mensagem(msg_obj)
+        if identidade is not None and identidade in indice:
+            DUPLICATAS.incrementar()
+            return False
+        
+        rastro = {}
+        if carimbar(msg_obj, "gravada", CLIENT_UUID):
+            rastro["rastro"] = list(msg_obj["rastro"])
+        with ESCRITA_DISCO.medir(operacao="mensagem"):
+            posicao = replica.anexar(msg_obj)
+        # O índice só é gravado depois do log (ver reconstruir_resumo)
+        if identidade is not None:
+            indice.adicionar(identidade)
+        MENSAGENS_GRAVADAS.incrementar(canal=canal.nome)
+        canal.resumo.registrar(msg_obj.get("sender"), msg_obj.get("seq"), posicao)
+        log.info("gravada", "Mensagem gravada", id=id_mensagem(msg_obj), canal=canal.nome,
+                 posicao=posicao, conteudo=trecho(msg_obj.get("content")), **rastro)
+        return True
 
 
-def enviar_join():
+def enviar_join(canal=None):
     """
-    Envia mensagem de join para o servidor para ingressar no anel lógico.
+    Envia mensagem de join para o servidor para ingressar nos anéis lógicos.
     
     Esta função implementa o processo de entrada no sistema distribuído,
-    solicitando inclusão no anel lógico do Token Ring.
+    solicitando inclusão no anel lógico do Token Ring de cada canal
+    assinado (ou só de `canal`). O join vai para o grupo de controle e
+    anuncia os formatos de serialização que o cliente entende.
+    
+    Args:
+        canal: Canal específico a (re)ingressar (padrão: todos os assinados)
     """
-    join_msg = {"type": "join", "sender": CLIENT_UUID}
-    # Delay artificial para simular latência de rede
-    time.sleep(random.uniform(0.1, 0.5))  
-    sock.sendto(json.dumps(join_msg).encode(), SERVER_ADDR)
-    print(f"[LOG] {CLIENT_UUID}: Join enviado. Aguardando token...")
+    nomes = [canal.nome] if canal is not None else CANAIS_ASSINADOS
+    join_msg = {"type": "join", "sender": CLIENT_UUID, "formatos": FORMATOS_SUPORTADOS,
+                "canais": nomes}
+    canal_padrao().nucleo.enviar(join_msg, CONTROLE_ADDR)
+    log.info("join", "Join enviado. Aguardando token...", canais=nomes)
 
 
-def calcular_proximo_vizinho(neighbors):
+def calcular_proximo_vizinho(canal):
     """
-    Calcula o próximo nó no anel lógico usando a ordem alfabética.
+    Calcula o próximo nó no anel lógico do canal usando a ordem alfabética.
     
-    Implementação crucial do algoritmo Token Ring, determina para 
-    qual nó o token deve ser passado.
+    Implementação crucial do algoritmo Token Ring, determina para
+    qual nó o token deve ser passado. A ordenação é feita só quando a
+    época do anel muda; aqui a consulta é uma busca na tabela de sucessores.
     
-    Args:
-        neighbors: Lista de IDs dos vizinhos
-        
     Returns:
         str: ID do próximo nó no anel
     """
-    if CLIENT_UUID not in neighbors:
-        neighbors.append(CLIENT_UUID)
-    vizinhos = sorted(neighbors)
-    idx = vizinhos.index(CLIENT_UUID)
-    return vizinhos[(idx + 1) % len(vizinhos)]
+    return canal.estado.anel.proximo(CLIENT_UUID)
 
 
-def enviar_mensagem_automatica():
+def verificar_epoca(canal, epoca, encarnacao=None):
     """
-    Envia uma mensagem automática quando o cliente possui o token.
+    Detecta uma visão desatualizada do anel a partir da época do token.
+    
+    Se o token traz uma visão (encarnação, época) mais nova que a local,
+    algum broadcast de neighbors foi perdido ou o servidor reiniciou (as
+    épocas recomeçam em uma encarnação nova); o cliente pede a lista
+    atual ao servidor (um join de um membro já conhecido), uma única vez
+    por visão.
     
-    Demonstra o funcionamento da exclusão mútua via Token Ring,
-    enviando mensagem apenas quando possui o token.
+    Args:
+        canal: Canal em que o token foi recebido
+        epoca: Época carregada pelo token (None em mensagens antigas)
+        encarnacao: Encarnação carregada pelo token (None: a atual)
+    """
+    anel = canal.estado.anel
+    if epoca is None or not anel.mais_nova(epoca, encarnacao):
+        return
+    visao = (anel.encarnacao if encarnacao is None else encarnacao, epoca)
+    if visao <= canal.epoca_pedida:
+        return
+    canal.epoca_pedida = visao
+    log.info("anel_desatualizado", "Visão do anel desatualizada; pedindo atualização",
+             canal=canal.nome, epoca=anel.epoca, epoca_token=epoca, encarnacao=anel.encarnacao,
+             encarnacao_token=visao[0])
+    enviar_join(canal)
+
+
+def enfileirar_mensagem(conteudo, nome_canal=None):
     """
-    global teste_enviado, pode_enviar_mensagem
+    Agenda o envio de uma mensagem de chat.
+    
+    API usada pela entrada local (stdin ou socket) e pela mensagem de
+    teste: a mensagem é enviada na próxima vez que o cliente detiver o
+    token do canal ou, no modo sequenciador, imediatamente.
+    
+    Args:
+        conteudo: Texto da mensagem
+        nome_canal: Canal de destino (padrão: o primeiro assinado)
     
-    if not pode_enviar_mensagem:
-        print(f"[LOG] {CLIENT_UUID}: Tentativa de envio sem ter o token!")
+    Returns:
+        bool: False se o canal não é assinado por este cliente
+    """
+    canal = canais.get(nome_canal) if nome_canal else canal_padrao()
+    if canal is None:
+        log.aviso("canal_desconhecido", "Canal não assinado; mensagem descartada", canal=nome_canal)
+        return False
+    canal.fila.enfileirar(conteudo)
+    if canal.modo == MODO_SEQUENCIADOR:
+        agendar_drenagem(canal)
+    return True
+
+
+def agendar_drenagem(canal):
+    """Inicia o envio da fila sem token, se ainda não está em andamento."""
+    if canal.drenando or not canal.fila or canal.nucleo is None:
         return
+    canal.drenando = True
+    canal.nucleo.tarefa(drenar_sem_token(canal))
+
+
+async def drenar_sem_token(canal):
+    """Envia a fila no modo sequenciador (a ordem é definida pelo servidor)."""
+    try:
+        await drenar_fila(canal)
+    finally:
+        canal.drenando = False
+
+
+def montar_chat(canal, conteudo, enfileirada=None):
+    """
+    Cria a mensagem de chat com a próxima sequência do cliente no canal.
+    
+    Mensagens rastreadas (ver RASTREAMENTO) levam o rastro com as etapas
+    de entrada na fila e de envio; as demais etapas são acrescentadas
+    pelo servidor e por quem grava a mensagem.
+    """
+    agora = time.time()
+    msg = {
+        "type": "chat",
+        "content": conteudo,
+        "sender": CLIENT_UUID,
+        "seq": canal.estado.proxima_sequencia(),
+        "timestamp": agora,
+        "hlc": relogio.agora()
+    }
+    if enfileirada is not None and amostrar():
+        msg["rastro"] = iniciar_rastro(CLIENT_UUID, enfileirada, agora)
+    return msg
+
+
+async def enviar_mensagem_automatica(canal):
+    """
+    Enfileira uma mensagem automática de teste na primeira posse de um token.
+    
+    Demonstra o funcionamento da exclusão mútua via Token Ring: a
+    mensagem só sai da fila enquanto o cliente possui o token.
+    """
+    global teste_enviado
     
     if not teste_enviado:
-        print(f"[LOG] {CLIENT_UUID}: Iniciando acesso à seção crítica.")
-        # Delay artificial para simular latência e processamento
-        time.sleep(random.uniform(0.1, 1.0))  
-        
-        mensagem = f"Teste de mensagem de {CLIENT_UUID}"
-        msg_obj = {
-            "type": "chat", 
-            "content": mensagem, 
-            "sender": CLIENT_UUID,
-            "timestamp": time.time()
-        }
-        sock.sendto(json.dumps(msg_obj).encode(), SERVER_ADDR)
-        gravar_mensagem(msg_obj)
-        print(f"[LOG] {CLIENT_UUID}: Mensagem automática de teste enviada.")
+        enfileirar_mensagem(f"Teste de mensagem de {CLIENT_UUID}", canal.nome)
         teste_enviado = True
-        print(f"[LOG] {CLIENT_UUID}: Seção crítica finalizada.")
-    else:
-        print(f"[LOG] {CLIENT_UUID}: Teste já enviado, ignorando envio.")
 
 
-def passar_token():
+async def drenar_fila(canal):
+    """
+    Envia as mensagens da fila do canal enquanto o cliente possui o token.
+    
+    As mensagens saem em lotes de até LOTE_MAXIMO_BYTES (uma mensagem
+    sozinha vai como chat comum, várias como uma mensagem "lote"). A
+    posse do token é limitada a TOKEN_TEMPO_MAXIMO segundos e
+    TOKEN_ORCAMENTO_BYTES bytes; o restante espera a próxima volta. Um
+    pedido de contenção do servidor também encerra o envio (no modo
+    sequenciador, apenas o pausa).
+    
+    No modo sequenciador não há token: a fila é esvaziada de uma vez e
+    as mensagens só entram na réplica local quando voltam do servidor
+    com o gseq, na ordem global.
+    """
+    estado = canal.estado
+    fila = canal.fila
+    nucleo = canal.nucleo
+    sequenciado = canal.modo == MODO_SEQUENCIADOR
+    if not sequenciado and not estado.token:
+        log.aviso("sem_token", "Tentativa de envio sem ter o token", canal=canal.nome)
+        return
+    if not fila:
+        return
+    
+    if not sequenciado:
+        log.debug("secao_critica", "Iniciando acesso à seção crítica", canal=canal.nome)
+    limite = nucleo.loop.time() + TOKEN_TEMPO_MAXIMO
+    orcamento = TOKEN_ORCAMENTO_BYTES
+    enviadas = 0
+    while fila and (sequenciado or (estado.token and orcamento > 0
+                                    and nucleo.loop.time() < limite)):
+        pausa = canal.contido_ate - nucleo.loop.time()
+        if pausa > 0:
+            if not sequenciado:
+                # Contido pelo servidor: o restante espera a próxima volta do token
+                break
+            await asyncio.sleep(pausa)
+            continue
+        limite_lote = LOTE_MAXIMO_BYTES if sequenciado else min(LOTE_MAXIMO_BYTES, orcamento)
+        itens, tamanho = fila.retirar_lote(limite_lote)
+        orcamento -= tamanho
+        mensagens = [montar_chat(canal, conteudo, instante) for conteudo, instante in itens]
+        agora = nucleo.loop.time()
+        for msg in mensagens:
+            # As próprias mensagens contam como recebidas: sem NACK a si mesmo
+            canal.reparo.receber(CLIENT_UUID, msg["seq"], agora)
+        if len(mensagens) == 1:
+            nucleo.enviar(mensagens[0])
+        else:
+            nucleo.enviar({"type": "lote", "sender": CLIENT_UUID, "mensagens": mensagens})
+        enviadas += len(mensagens)
+        if sequenciado:
+            # Sem token, o orçamento só espaça as rajadas para não
+            # transbordar o buffer de recepção do servidor
+            if orcamento <= 0:
+                orcamento = TOKEN_ORCAMENTO_BYTES
+                await asyncio.sleep(TOKEN_TEMPO_MAXIMO)
+            else:
+                await asyncio.sleep(0)
+        else:
+            await nucleo.em_disco(gravar_historico, canal, mensagens)
+    log.info("enviadas", "Mensagens enviadas", canal=canal.nome, enviadas=enviadas, fila=len(fila))
+    if not sequenciado:
+        log.debug("secao_finalizada", "Seção crítica finalizada", canal=canal.nome)
+
+
+async def passar_token(canal, geracao, recebido=None):
     """
-    Implementa a passagem do token para o próximo nó no anel lógico.
+    Implementa a passagem do token para o próximo nó no anel lógico do canal.
     
     Esta função é parte central do algoritmo Token Ring, garantindo
-    a exclusão mútua distribuída no sistema.
+    a exclusão mútua distribuída no sistema. Um token cuja geração foi
+    superada durante a posse (o servidor o regenerou) não é repassado.
+    
+    Args:
+        canal: Canal cujo token é passado
+        geracao: Geração do token em posse do cliente
+        recebido: Token recebido, cujo rastro continua no token enviado
     """
-    global pode_enviar_mensagem
-    checkpoint = carregar_checkpoint()
-    neighbors = checkpoint["neighbors"]
+    estado = canal.estado
+    if geracao < estado.geracao:
+        estado.token = False
+        log.debug("token_superado", "Token superado, não será repassado", canal=canal.nome,
+                  geracao=geracao)
+        return
     
     # Se tiver vizinhos além de si mesmo
-    if len(neighbors) > 1:
-        proximo = calcular_proximo_vizinho(neighbors)
-        token_msg = {"type": "token", "next": proximo, "sender": CLIENT_UUID}
+    if len(estado.anel) > 1:
+        proximo = calcular_proximo_vizinho(canal)
+        token_msg = {"type": "token", "next": proximo, "sender": CLIENT_UUID,
+                     "epoca": estado.anel.epoca, "encarnacao": estado.anel.encarnacao,
+                     "geracao": geracao}
+        token_msg.update(continuar_rastro_token(recebido, proximo == estado.anel.primeiro))
         
         # Marca que o cliente não possui mais o token e atualiza checkpoint
-        salvar_checkpoint(checkpoint["last_message"], False, neighbors)
-        # Delay artificial para estabilidade da rede
-        time.sleep(random.uniform(0.1, 0.3))  
-        
-        sock.sendto(json.dumps(token_msg).encode(), SERVER_ADDR)
-        print(f"[LOG] {CLIENT_UUID}: Token enviado para {proximo}.")
-        pode_enviar_mensagem = False
+        estado.token = False
+        estado.detentor_token = proximo
+        salvar_checkpoint(canal)
+        canal.nucleo.enviar(token_msg)
+        log.debug("token_enviado", "Token enviado", canal=canal.nome, destino=proximo, geracao=geracao)
     else:
         # Se for o único cliente, retorna o token ao servidor
-        token_msg = {"type": "token", "next": "server", "sender": CLIENT_UUID}
-        salvar_checkpoint(checkpoint["last_message"], False, neighbors)
-        sock.sendto(json.dumps(token_msg).encode(), SERVER_ADDR)
-        print(f"[LOG] {CLIENT_UUID}: Token retornado para o servidor.")
-        pode_enviar_mensagem = False
-
-
-def receber_mensagens():
-    """
-    Processa continuamente as mensagens recebidas do servidor.
-    
-    Esta função implementa o loop principal de processamento de mensagens,
-    tratando diferentes tipos (token, neighbors, chat, sync).
-    """
-    global pode_enviar_mensagem
-    
-    while True:
-        try:
-            data, _ = sock.recvfrom(4096)
-            # Delay artificial para simular variação de latência
-            time.sleep(random.uniform(0.05, 0.2))  
-            
-            msg = json.loads(data.decode())
-            msg_type = msg.get("type", "chat")
-            
-            if msg_type == "neighbors":
-                # Atualização da lista de vizinhos (anel lógico)
-                neighbors = msg.get("neighbors", [])
-                if CLIENT_UUID not in neighbors:
-                    neighbors.append(CLIENT_UUID)
-                
-                checkpoint = carregar_checkpoint()
-                old_token = checkpoint["token"]
-                
-                salvar_checkpoint(checkpoint["last_message"], old_token, neighbors)
-                print(f"[LOG] {CLIENT_UUID}: Neighbors atualizados: {neighbors}")
-                
-            elif msg_type == "token":
-                # Recebimento do token - exclusão mútua distribuída
-                if msg.get("next") == CLIENT_UUID:
-                    print(f"[LOG] {CLIENT_UUID}: Token recebido.")
-                    checkpoint = carregar_checkpoint()
-                    salvar_checkpoint(checkpoint["last_message"], True, checkpoint["neighbors"])
-                    
-                    # Agora pode enviar mensagens (seção crítica)
-                    pode_enviar_mensagem = True
-                    
-                    # Executa a seção crítica (envio de mensagem)
-                    enviar_mensagem_automatica()
-                    
-                    # Libera a seção crítica e passa o token adiante
-                    passar_token()
-
-            elif msg_type == "chat":
-                # Mensagem de chat - adiciona ao histórico local
-                content = msg.get("content", "")
-                sender = msg.get("sender", "unknown")
-                print(f"[LOG] {CLIENT_UUID}: Mensagem recebida de {sender}: '{content}'")
-                gravar_mensagem(msg)
-                
-            elif msg_type == "sync":
-                # Sincronização periódica (consistência eventual)
-                history = msg.get("history", [])
-                if history:
-                    print(f"[LOG] {CLIENT_UUID}: Recebendo sincronização com {len(history)} mensagens.")
-                    with replica_lock:
-                        with open(REPLICA_FILE, "r") as f:
-                            local_history = json.load(f)
-                        
-                        # Combina históricos eliminando duplicações
-                        combined = local_history.copy()
-                        for msg in history:
-                            if msg not in combined:
-                                combined.append(msg)
-                        
-                        with open(REPLICA_FILE, "w") as f:
-                            json.dump(combined, f, indent=4)
-                    
-                    print(f"[LOG] {CLIENT_UUID}: Réplica sincronizada.")
-                    sincronizar_replicas()
-
-        except json.JSONDecodeError as e:
-            print(f"[LOG] {CLIENT_UUID}: Erro ao decodificar mensagem: {e}")
+        token_msg = {"type": "token", "next": "server", "sender": CLIENT_UUID,
+                     "epoca": estado.anel.epoca, "encarnacao": estado.anel.encarnacao,
+                     "geracao": geracao}
+        token_msg.update(continuar_rastro_token(recebido, False))
+        estado.token = False
+        estado.detentor_token = "server"
+        salvar_checkpoint(canal)
+        canal.nucleo.enviar(token_msg)
+        log.debug("token_enviado", "Token retornado para o servidor", canal=canal.nome,
+                  destino="server", geracao=geracao)
+
+
+async def tratar_neighbors(canal, msg, addr):
+    """
+    Atualização da lista de vizinhos (anel lógico), do formato negociado e do modo de ordenação.
+    
+    Formato, modo e bootstrap só valem junto com a visão que os trouxe:
+    um neighbors atrasado ou reordenado é descartado por inteiro.
+    """
+    neighbors = msg.get("neighbors", [])
+    encarnacao = msg.get("encarnacao", 0)
+    if not canal.estado.anel.mais_nova(msg.get("epoca", 0), encarnacao):
+        # Visão antiga (neighbors atrasado ou reordenado) ou repetida
+        return
+    canal.nucleo.formato = msg.get("formato", FORMATO_JSON)
+    modo = msg.get("modo", MODO_TOKEN)
+    if modo != canal.modo:
+        canal.modo = modo
+        log.info("modo", "Modo de ordenação", canal=canal.nome, modo=modo)
+    if canal.modo == MODO_SEQUENCIADOR:
+        await enviar_mensagem_automatica(canal)
+        agendar_drenagem(canal)
+    if "bootstrap" in msg:
+        iniciar_bootstrap(addr[0], msg["bootstrap"])
+    if CLIENT_UUID not in neighbors:
+        # Ainda não registrado ou removido do anel pelo servidor (token
+        # perdido comigo): pede o ingresso novamente, uma vez por visão
+        # (as épocas recomeçam quando o servidor reinicia)
+        visao = (encarnacao, msg.get("epoca", 0))
+        if visao > canal.epoca_pedida:
+            canal.epoca_pedida = visao
+            enviar_join(canal)
+        neighbors.append(CLIENT_UUID)
+    
+    # A tabela de sucessores só é reconstruída quando a visão é mais nova
+    if canal.estado.atualizar_anel(neighbors, msg.get("epoca", 0), encarnacao):
+        salvar_checkpoint(canal)
+        log.info("vizinhos", "Vizinhos atualizados", canal=canal.nome, epoca=canal.estado.anel.epoca,
+                 membros=list(canal.estado.anel.membros))
+
+
+def iniciar_bootstrap(host, porta):
+    """Dispara (uma única vez) o bootstrap pelo canal lateral anunciado pelo servidor."""
+    global bootstrap_iniciado
+    if bootstrap_iniciado:
+        return
+    bootstrap_iniciado = True
+    canal_padrao().nucleo.tarefa(executar_bootstrap(host, porta))
+
+
+def gravar_bootstrap(lote):
+    """
+    Grava um lote do bootstrap nos canais assinados (thread de disco).
+    
+    Os registros "base" trazem as marcas d'água da compactação do
+    servidor: as mensagens até elas passam a contar como recebidas.
+    """
+    novas = 0
+    for msg in lote:
+        canal = canais.get(canal_da_mensagem(msg))
+        if canal is None:
             continue
-        except Exception as e:
-            print(f"[LOG] {CLIENT_UUID}: Erro ao processar mensagem: {e}")
+        if msg.get("type") == "base":
+            with replica_lock:
+                canal.resumo.registrar_base(msg.get("base", {}))
+        elif gravar_mensagem(canal, msg):
+            novas += 1
+    return novas
 
 
-if __name__ == "__main__":
-    print(f"[LOG] Cliente iniciado com ID: {CLIENT_UUID}")
-    inicializar_arquivos()
+async def executar_bootstrap(host, porta):
+    """
+    Baixa o último snapshot e a cauda do log do servidor.
     
-    # Inicia sem o token (aguarda receber do servidor)
-    salvar_checkpoint("", False, [])
+    O pedido leva as marcas d'água locais de cada canal, para que só
+    venha o que falta. Um nó novo obtém assim o histórico inteiro por
+    TCP, sem depender de rodadas de sincronização por datagramas; o que
+    chegar depois é coberto pela anti-entropia normal.
+    """
+    nucleo = canal_padrao().nucleo
     
-    # Solicita ingresso no anel lógico
-    enviar_join()
+    def ler_marcas():
+        with replica_lock:
+            return {nome: canal.resumo.digest() for nome, canal in canais.items()}
     
-    # Thread para processamento contínuo de mensagens
-    threading.Thread(target=receber_mensagens, daemon=True).start()
+    pedido = {"sender": CLIENT_UUID, "canais": await nucleo.em_disco(ler_marcas)}
+    novas = 0
     
-    # Thread para sincronização periódica (consistência eventual)
-    def sincronizar_periodicamente():
-        """Thread dedicada à sincronização periódica da réplica local."""
+    async def gravar(lote):
+        nonlocal novas
+        novas += await nucleo.em_disco(gravar_bootstrap, lote)
+    
+    inicio = time.monotonic()
+    try:
+        recebidas = await baixar_bootstrap(host, porta, pedido, gravar)
+    except (OSError, ValueError) as e:
+        log.erro("bootstrap", "Falha no bootstrap", host=host, porta=porta, erro=str(e))
+        return
+    log.info("bootstrap", "Bootstrap concluído", recebidas=recebidas, novas=novas,
+             segundos=round(time.monotonic() - inicio, 3))
+
+
+async def tratar_token(canal, msg, addr):
+    """
+    Recebimento do token - exclusão mútua distribuída.
+    
+    Todas as passagens são observadas para acompanhar a geração do
+    token: tokens de gerações anteriores (duplicatas deixadas por uma
+    regeneração) são descartados, e um token mais novo destinado a
+    outro nó encerra a posse de um token antigo.
+    """
+    estado = canal.estado
+    geracao = msg.get("geracao", 0)
+    if geracao < estado.geracao:
+        if msg.get("next") == CLIENT_UUID:
+            log.debug("token_obsoleto", "Token obsoleto descartado", canal=canal.nome,
+                      geracao=geracao, atual=estado.geracao)
+        return
+    if geracao > estado.geracao:
+        estado.geracao = geracao
+        if msg.get("next") != CLIENT_UUID:
+            estado.token = False
+    if msg.get("next") != CLIENT_UUID:
+        return
+    if estado.token:
+        # Cópia do token que já está em posse deste cliente
+        return
+    log.debug("token_recebido", "Token recebido", canal=canal.nome, geracao=geracao)
+    if salto_amostrado(msg, CLIENT_UUID == canal.estado.anel.primeiro):
+        log.info("token_salto", "Salto do token", canal=canal.nome, **campos_salto(msg))
+    verificar_epoca(canal, msg.get("epoca"), msg.get("encarnacao"))
+    
+    # Agora pode enviar mensagens (seção crítica)
+    with POSSE_TOKEN.medir(canal=canal.nome):
+        estado.token = True
+        estado.detentor_token = CLIENT_UUID
+        salvar_checkpoint(canal)
+        
+        # Executa a seção crítica (envio das mensagens enfileiradas)
+        await enviar_mensagem_automatica(canal)
+        await drenar_fila(canal)
+        
+        # Libera a seção crítica e passa o token adiante
+        await passar_token(canal, geracao, msg)
+
+
+def armar_timer_lacuna(canal):
+    """Agenda a liberação da lacuna atual da sequência global, se necessário."""
+    if canal.timer_lacuna is None and canal.entrega.pendentes:
+        canal.timer_lacuna = canal.nucleo.agendar(ESPERA_LACUNA, liberar_lacuna, canal)
+
+
+def liberar_lacuna(canal):
+    """Entrega as mensagens em espera após uma lacuna que não se fechou."""
+    canal.timer_lacuna = None
+    faltante = canal.entrega.proxima
+    prontas = canal.entrega.liberar_lacuna()
+    if prontas:
+        log.aviso("lacuna_liberada", "Lacuna liberada após a espera", canal=canal.nome,
+                  gseq=faltante, espera=ESPERA_LACUNA, entregues=len(prontas))
+        canal.nucleo.tarefa(canal.nucleo.em_disco(gravar_historico, canal, prontas))
+    armar_timer_lacuna(canal)
+
+
+def observar_recebidas(canal, mensagens, detectar=True):
+    """
+    Detecta lacunas nas sequências das mensagens recebidas e agenda os NACKs.
+    
+    Args:
+        canal: Canal em que as mensagens foram recebidas
+        mensagens: Mensagens de chat recebidas
+        detectar: Se False, as mensagens só fecham lacunas já conhecidas
+            (mensagens de sincronização)
+    """
+    agora = canal.nucleo.loop.time()
+    perdidas = 0
+    for msg in mensagens:
+        for origem, seq in sequencias(msg):
+            if detectar:
+                perdidas += canal.reparo.receber(origem, seq, agora)
+            else:
+                canal.reparo.descartar(origem, seq)
+    if perdidas:
+        log.info("perdas", "Mensagens perdidas; NACK agendado", canal=canal.nome, perdidas=perdidas)
+        if canal.congestionamento.registrar(perdidas, agora):
+            # Perdas demais em pouco tempo: pede ao servidor que reduza o repasse
+            canal.nucleo.enviar({"type": "congestionamento", "sender": CLIENT_UUID,
+                                 "perdas": perdidas})
+            log.aviso("congestionamento", "Congestionamento sinalizado", canal=canal.nome)
+    armar_timer_nack(canal)
+
+
+def armar_timer_nack(canal):
+    """Agenda o envio do próximo NACK pendente, antecipando o timer se preciso."""
+    prazo = canal.reparo.proximo_prazo()
+    if prazo is None:
+        return
+    timer = canal.timer_nack
+    if timer is not None:
+        if timer.when() <= prazo:
+            return
+        timer.cancel()
+    atraso = max(0.0, prazo - canal.nucleo.loop.time())
+    canal.timer_nack = canal.nucleo.agendar(atraso, enviar_nack, canal)
+
+
+def enviar_nack(canal):
+    """Pede ao servidor a retransmissão das mensagens perdidas cujo prazo venceu."""
+    canal.timer_nack = None
+    faltantes = canal.reparo.vencidos(canal.nucleo.loop.time())
+    if faltantes:
+        canal.nucleo.enviar({"type": "nack", "sender": CLIENT_UUID, "faltantes": faltantes})
+        log.info("nack", "NACK enviado", canal=canal.nome, faltantes=faltantes)
+    armar_timer_nack(canal)
+
+
+def tratar_contencao(canal, msg, addr):
+    """Pedido de contenção do servidor: pausa os envios do cliente no canal."""
+    if msg.get("destino") != CLIENT_UUID:
+        return
+    espera = msg.get("espera", 0)
+    canal.contido_ate = max(canal.contido_ate, canal.nucleo.loop.time() + espera)
+    log.info("contido", "Envios contidos pelo servidor", canal=canal.nome, espera=espera)
+
+
+def tratar_nack(canal, msg, addr):
+    """NACK de outro cliente: suprime os NACKs próprios pelas mesmas mensagens."""
+    if msg.get("sender") != CLIENT_UUID:
+        canal.reparo.observar_nack(msg.get("faltantes", {}), canal.nucleo.loop.time())
+
+
+async def entregar_sequenciadas(canal, mensagens):
+    """
+    Entrega mensagens do modo sequenciador na ordem do gseq.
+    
+    Mensagens adiantadas esperam as anteriores no buffer de entrega;
+    se a espera passa de ESPERA_LACUNA segundos, a lacuna é liberada.
+    """
+    prontas = []
+    for item in mensagens:
+        prontas.extend(canal.entrega.receber(item["gseq"], item))
+    armar_timer_lacuna(canal)
+    if prontas:
+        await canal.nucleo.em_disco(gravar_historico, canal, prontas)
+
+
+async def tratar_chat(canal, msg, addr):
+    """Mensagem de chat - adiciona ao histórico local."""
+    if "gseq" in msg:
+        observar_recebidas(canal, [msg])
+        await entregar_sequenciadas(canal, [msg])
+        return
+    if canal.modo == MODO_SEQUENCIADOR:
+        # Original de outro cliente: aguarda a cópia sequenciada pelo servidor
+        return
+    observar_recebidas(canal, [msg])
+    if await canal.nucleo.em_disco(gravar_mensagem, canal, msg):
+        log.debug("recebida", "Mensagem recebida", canal=canal.nome, id=id_mensagem(msg))
+
+
+def preparar_reconciliacao(canal, digest_remoto, base):
+    """
+    Compara o resumo do servidor com o local (thread de disco).
+    
+    As mensagens até a base da compactação do servidor já não existem no
+    log dele: contam como recebidas, senão seriam pedidas para sempre.
+    """
+    with replica_lock:
+        canal.resumo.registrar_base(base)
+        pedidos = canal.resumo.requisicao(digest_remoto)
+        envios = coletar_delta(replica, canal.resumo, canal.resumo.faltantes(digest_remoto))
+    return pedidos, envios
+
+
+async def tratar_digest(canal, msg, addr):
+    """Resumo da réplica do servidor (anti-entropia por delta)."""
+    base = msg.get("base", {})
+    pedidos, envios = await canal.nucleo.em_disco(preparar_reconciliacao, canal,
+                                                  msg.get("resumo", {}), base)
+    canal.reparo.base(base)
+    
+    if pedidos:
+        # Pede apenas as faixas que faltam localmente
+        req_msg = {"type": "sync_req", "sender": CLIENT_UUID, "desde": pedidos}
+        canal.nucleo.enviar(req_msg)
+        log.info("sync_pedido", "Pedindo sincronização", canal=canal.nome, remetentes=len(pedidos))
+    if envios:
+        # Envia ao servidor as mensagens que ele ainda não possui
+        sync_msg = {"type": "sync", "sender": CLIENT_UUID, "destino": "server", "history": envios}
+        canal.nucleo.enviar(sync_msg)
+        log.info("sync_enviado", "Mensagens enviadas ao servidor", canal=canal.nome,
+                 mensagens=len(envios))
+
+
+async def tratar_lote(canal, msg, addr):
+    """
+    Lote de mensagens de chat enviado por quem detinha o token (ou
+    sequenciado pelo servidor); também recebe as retransmissões pedidas
+    por NACK ("reparo").
+    """
+    mensagens = msg.get("mensagens", [])
+    if mensagens and "gseq" in mensagens[0]:
+        observar_recebidas(canal, mensagens)
+        await entregar_sequenciadas(canal, mensagens)
+        return
+    if canal.modo == MODO_SEQUENCIADOR:
+        return
+    observar_recebidas(canal, mensagens)
+    novas = await canal.nucleo.em_disco(gravar_historico, canal, mensagens)
+    if novas:
+        log.debug("lote", "Lote recebido", canal=canal.nome, origem=msg.get("sender"), novas=novas)
+
+
+def gravar_historico(canal, history):
+    """Grava as mensagens novas de um lote de sincronização (thread de disco)."""
+    return sum(1 for item in history if gravar_mensagem(canal, item))
+
+
+async def tratar_sync(canal, msg, addr):
+    """Sincronização por delta (consistência eventual)."""
+    history = msg.get("history", [])
+    if not history or msg.get("sender") == CLIENT_UUID or msg.get("destino") == "server":
+        return
+    log.info("sync_recebido", "Recebendo sincronização", canal=canal.nome, mensagens=len(history))
+    observar_recebidas(canal, history, detectar=False)
+    # Acrescenta ao log apenas as mensagens que ainda não existem
+    novas = await canal.nucleo.em_disco(gravar_historico, canal, history)
+    log.info("sincronizada", "Réplica sincronizada", canal=canal.nome, novas=novas)
+
+
+async def receber_mensagens():
+    """
+    Inicia o processamento assíncrono das mensagens recebidas do servidor.
+    
+    Cada canal assinado tem um núcleo de datagramas no seu grupo
+    multicast, de modo que o cliente só recebe o tráfego desses canais.
+    Cada tipo de mensagem (token, neighbors, chat, lote, reparo, nack,
+    contencao, digest, sync) é despachado para o seu handler com o canal
+    correspondente.
+    """
+    for canal in canais.values():
+        nucleo = NucleoDatagramas(f"{CLIENT_UUID}/{canal.nome}", (canal.grupo, PORT),
+                                  disco=disco, canal=rotulo_canal(canal))
+        canal.nucleo = nucleo
+        nucleo.registrar("neighbors", partial(tratar_neighbors, canal))
+        nucleo.registrar("token", partial(tratar_token, canal))
+        nucleo.registrar("chat", partial(tratar_chat, canal))
+        nucleo.registrar("lote", partial(tratar_lote, canal))
+        nucleo.registrar("reparo", partial(tratar_lote, canal))
+        nucleo.registrar("nack", partial(tratar_nack, canal))
+        nucleo.registrar("contencao", partial(tratar_contencao, canal))
+        nucleo.registrar("digest", partial(tratar_digest, canal))
+        nucleo.registrar("sync", partial(tratar_sync, canal))
+        
+        # Configuração do socket para comunicação multicast
+        await nucleo.iniciar(criar_socket_multicast(canal.grupo, PORT))
+        log.info("canal_assinado", "Canal assinado", canal=canal.nome, grupo=canal.grupo, porta=PORT)
+
+
+def interpretar_linha(linha):
+    """
+    Enfileira uma linha da entrada local.
+    
+    Linhas no formato "#canal texto" vão para o canal indicado; as
+    demais, para o primeiro canal assinado.
+    """
+    if linha.startswith("#"):
+        nome, _, conteudo = linha[1:].partition(" ")
+        if conteudo:
+            enfileirar_mensagem(conteudo, nome)
+        return
+    enfileirar_mensagem(linha)
+
+
+def ler_entrada_padrao(loop):
+    """Enfileira cada linha lida da entrada padrão (thread dedicada)."""
+    for linha in sys.stdin:
+        linha = linha.rstrip("\n")
+        if linha:
+            loop.call_soon_threadsafe(interpretar_linha, linha)
+
+
+async def tratar_conexao_local(reader, writer):
+    """Enfileira cada linha recebida por uma conexão do socket local."""
+    try:
         while True:
-            time.sleep(30)  # A cada 30 segundos
-            sincronizar_replicas()
+            linha = await reader.readline()
+            if not linha:
+                break
+            conteudo = linha.decode(errors="replace").rstrip("\r\n")
+            if conteudo:
+                interpretar_linha(conteudo)
+    finally:
+        writer.close()
+
+
+async def iniciar_entrada_local():
+    """
+    Abre a entrada local de mensagens configurada em ENTRADA_CLIENTE.
     
-    threading.Thread(target=sincronizar_periodicamente, daemon=True).start()
+    "stdin" lê uma mensagem por linha da entrada padrão; um número abre
+    um servidor TCP em 127.0.0.1 naquela porta com o mesmo protocolo.
+    """
+    if not ENTRADA_CLIENTE:
+        return
+    if ENTRADA_CLIENTE == "stdin":
+        threading.Thread(target=ler_entrada_padrao, args=(asyncio.get_running_loop(),),
+                         daemon=True, name="entrada-stdin").start()
+        log.info("entrada", "Lendo mensagens da entrada padrão")
+    else:
+        porta = int(ENTRADA_CLIENTE)
+        await asyncio.start_server(tratar_conexao_local, "127.0.0.1", porta)
+        log.info("entrada", "Aceitando mensagens locais", host="127.0.0.1", porta=porta)
+
+
+async def main():
+    """Inicializa o cliente e mantém o laço de eventos em execução."""
+    log.no = CLIENT_UUID
+    log.info("iniciado", "Cliente iniciado")
+    inicializar_arquivos()
+    
+    # Inicia sem o token (aguarda receber do servidor)
+    for canal in canais.values():
+        salvar_checkpoint(canal, "")
     
-    # Main thread mantém o cliente em execução
-    while True:
-        time.sleep(1)
+    await receber_mensagens()
+    await iniciar_entrada_local()
+    if PORTA_CONSULTA:
+        await iniciar_servidor_consulta(historico, canal_padrao().nucleo.em_disco,
+                                        int(PORTA_CONSULTA))
+    await iniciar_metricas(canal_padrao().nucleo)
+    
+    # Solicita ingresso nos anéis lógicos dos canais assinados
+    enviar_join()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,209 @@
+import os
+import zlib
+
+# Servidores do cluster (IDs separados por vírgula); vazio = servidor único
+SERVIDORES = [nome.strip() for nome in os.environ.get("SERVIDORES", "").split(",") if nome.strip()]
+GRUPO_CLUSTER = os.environ.get("GRUPO_CLUSTER", "224.1.1.2")  # Batimentos e envio do log
+# Tempo sem batimentos após o qual um servidor é considerado fora do ar (segundos)
+PRAZO_LIDER = float(os.environ.get("PRAZO_LIDER", "1.5"))
+INTERVALO_BATIMENTO = PRAZO_LIDER / 3
+MAXIMO_ENTRADAS_ENVIO = 100  # Entradas do log por mensagem "replicar"
+
+
+class Cluster:
+    """
+    Eleição do líder entre as instâncias do servidor.
+
+    Cada servidor envia batimentos periódicos com o seu mandato, o líder
+    que reconhece e o tamanho da sua réplica. O líder atual é mantido
+    enquanto envia batimentos; quando ele some por mais de PRAZO_LIDER
+    segundos, assume o servidor vivo com a réplica mais completa (empate
+    decidido pelo menor ID), em um mandato maior. Mensagens de mandatos
+    anteriores são ignoradas, e dois líderes do mesmo mandato resolvem o
+    conflito em favor do menor ID. O failover leva no máximo
+    PRAZO_LIDER + INTERVALO_BATIMENTO segundos.
+
+    Atributos:
+        no_id: ID deste servidor
+        membros: IDs de todos os servidores configurados
+        prazo: Tempo sem batimentos para considerar um servidor fora do ar
+        mandato: Maior mandato conhecido
+        lider: Líder reconhecido no mandato atual (None durante a eleição)
+    """
+
+    def __init__(self, no_id, membros=(), prazo=PRAZO_LIDER, agora=0.0):
+        """
+        Args:
+            no_id: ID deste servidor
+            membros: IDs dos servidores do cluster (vazio = servidor único)
+            prazo: Tempo sem batimentos para considerar um servidor fora do ar
+            agora: Instante de início (relógio do laço)
+        """
+        self.no_id = no_id
+        self.membros = tuple(sorted(set(membros) | {no_id}))
+        self.prazo = prazo
+        self.mandato = 0
+        self.lider = None
+        self._vistos = {}  # servidor -> (instante do último batimento, tamanho da réplica)
+        self._inicio = agora
+
+    @property
+    def ativo(self):
+        """Indica se há outros servidores configurados."""
+        return len(self.membros) > 1
+
+    @property
+    def lidero(self):
+        """Indica se este servidor é o líder."""
+        return self.lider == self.no_id
+
+    def observar(self, no_id, mandato, lider, tamanho, agora):
+        """
+        Registra o batimento (ou a mensagem de replicação) de outro servidor.
+
+        Args:
+            no_id: Servidor que enviou a mensagem
+            mandato: Mandato conhecido pelo remetente
+            lider: Líder reconhecido pelo remetente (ou None)
+            tamanho: Tamanho da réplica do remetente (None se desconhecido)
+            agora: Instante da observação
+
+        Returns:
+            bool: True se o líder reconhecido mudou
+        """
+        anterior = self._vistos.get(no_id, (None, 0))[1]
+        self._vistos[no_id] = (agora, anterior if tamanho is None else tamanho)
+        if lider is None or mandato < self.mandato:
+            return False
+        if mandato == self.mandato and self.lider is not None and self.lider <= lider:
+            return False
+        mudou = lider != self.lider
+        self.mandato = mandato
+        self.lider = lider
+        return mudou
+
+    def vivos(self, agora):
+        """Retorna os servidores com batimento recente (inclui este), em ordem."""
+        return [membro for membro in self.membros
+                if membro == self.no_id or (membro in self._vistos
+                                            and agora - self._vistos[membro][0] <= self.prazo)]
+
+    def eleger(self, agora, tamanho_local):
+        """
+        Verifica se este servidor deve assumir a liderança.
+
+        Durante o primeiro prazo após o início o servidor apenas escuta
+        os batimentos, para não disputar com um líder já estabelecido.
+
+        Args:
+            agora: Instante da verificação
+            tamanho_local: Tamanho da réplica deste servidor
+
+        Returns:
+            bool: True se este servidor acabou de se tornar líder
+        """
+        if not self.ativo:
+            if self.lidero:
+                return False
+            self.mandato += 1
+            self.lider = self.no_id
+            return True
+        if agora - self._inicio < self.prazo:
+            return False
+        vivos = self.vivos(agora)
+        if self.lider is not None and self.lider in vivos:
+            return False
+
+        def prioridade(membro):
+            tamanho = tamanho_local if membro == self.no_id else self._vistos[membro][1]
+            return (-tamanho, membro)
+
+        if min(vivos, key=prioridade) != self.no_id:
+            return False
+        self.mandato += 1
+        self.lider = self.no_id
+        return True
+
+    def responsavel(self, chave, agora):
+        """
+        Escolhe o servidor que atende os pedidos de sincronização de um nó.
+
+        Os pedidos são repartidos entre os servidores vivos por hash do
+        ID do solicitante, tirando a carga das sincronizações do líder.
+
+        Args:
+            chave: ID do nó solicitante
+            agora: Instante da verificação
+
+        Returns:
+            str: ID do servidor responsável
+        """
+        vivos = self.vivos(agora)
+        return vivos[zlib.crc32(str(chave).encode()) % len(vivos)]
+
+
+class RecepcaoLog:
+    """
+    Acompanha a numeração das entradas do log recebidas do líder.
+
+    O líder numera em sequência as entradas que envia em cada mandato.
+    Uma lacuna na numeração (datagrama perdido) ou um mandato novo obriga
+    o seguidor a pedir uma reconciliação completa; enquanto ela não chega,
+    os blocos recebidos continuam sendo aplicados e são anotados para
+    que a numeração seja retomada a partir do ponto da reconciliação.
+
+    Atributos:
+        esperado: Próximo número esperado (None enquanto não sincronizado)
+    """
+
+    def __init__(self):
+        self.esperado = None
+        self._blocos = {}  # início -> fim dos blocos recebidos fora de sincronia
+
+    def reiniciar(self):
+        """Descarta a numeração atual (líder ou mandato novo)."""
+        self.esperado = None
+        self._blocos.clear()
+
+    def receber(self, inicio, quantidade):
+        """
+        Registra um bloco de entradas recebido do líder.
+
+        Args:
+            inicio: Número da primeira entrada do bloco
+            quantidade: Quantidade de entradas
+
+        Returns:
+            bool: True se o bloco revelou uma lacuna (é preciso reconciliar)
+        """
+        fim = inicio + quantidade
+        if self.esperado is None:
+            self._blocos[inicio] = max(fim, self._blocos.get(inicio, fim))
+            return False
+        if inicio > self.esperado:
+            self.esperado = None
+            self._blocos[inicio] = fim
+            return True
+        self.esperado = max(self.esperado, fim)
+        return False
+
+    def sincronizado(self, indice):
+        """
+        Retoma a numeração após uma reconciliação com o líder.
+
+        Args:
+            indice: Número da próxima entrada que o líder enviaria no
+                momento em que calculou a reconciliação
+
+        Returns:
+            bool: True se ainda resta uma lacuna entre os blocos anotados
+        """
+        esperado = indice
+        for inicio in sorted(self._blocos):
+            if inicio > esperado:
+                self.reiniciar()
+                return True
+            esperado = max(esperado, self._blocos[inicio])
+        self._blocos.clear()
+        self.esperado = esperado
+        return False
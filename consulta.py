@@ -0,0 +1,483 @@
+import os
+import json
+import socket
+import asyncio
+import threading
+from bisect import bisect_left, bisect_right
+
+from hlc import OrdemCausal, chave_causal
+from registro import log
+
+INTERVALO_INDICE = 64  # Registros entre duas entradas do índice esparso de um segmento
+EXTENSAO_INDICE = ".idx"
+LIMITE_PAGINA = 100  # Máximo de mensagens devolvidas por consulta
+HOST_CONSULTA = "127.0.0.1"
+# Porta do protocolo local de consultas (vazio = desligado)
+PORTA_CONSULTA = os.environ.get("PORTA_CONSULTA", "")
+
+
+def _timestamp(registro):
+    valor = registro.get("timestamp", 0) if isinstance(registro, dict) else 0
+    return valor if isinstance(valor, (int, float)) else 0
+
+
+class IndiceSegmento:
+    """
+    Índices de consulta de um segmento do log.
+
+    O índice esparso guarda, a cada INTERVALO_INDICE registros, o offset
+    do registro e o maior timestamp visto antes dele no segmento. Como
+    esse máximo acumulado nunca diminui, a busca por tempo usa bisect
+    mesmo com mensagens gravadas fora de ordem. O índice de remetentes
+    guarda o offset de cada mensagem de cada remetente, e as chaves
+    causais (HLC) do segmento são persistidas já ordenadas, formando uma
+    run pronta para a fusão da ordem causal na inicialização.
+
+    Atributos:
+        numero: Número do segmento
+        contagem: Quantidade de registros no segmento
+        tamanho: Bytes do segmento cobertos pelo índice (segmentos fechados)
+        ts_maximo: Maior timestamp do segmento (None se vazio)
+    """
+
+    def __init__(self, numero):
+        self.numero = numero
+        self.contagem = 0
+        self.tamanho = None
+        self.ts_maximo = None
+        self.offsets = []     # Offset de cada entrada do índice esparso
+        self.marcas = []      # Maior timestamp anterior a cada entrada
+        self.remetentes = {}  # remetente -> offsets das suas mensagens
+        self.chaves = []      # [físico, lógico, remetente, offset] de cada mensagem
+
+    def registrar(self, offset, registro):
+        """Acrescenta um registro gravado no final do segmento."""
+        if self.contagem % INTERVALO_INDICE == 0:
+            self.offsets.append(offset)
+            self.marcas.append(self.ts_maximo or 0)
+        timestamp = _timestamp(registro)
+        if self.ts_maximo is None or timestamp > self.ts_maximo:
+            self.ts_maximo = timestamp
+        remetente = registro.get("sender") if isinstance(registro, dict) else None
+        if remetente is not None:
+            self.remetentes.setdefault(remetente, []).append(offset)
+        self.chaves.append([*chave_causal(registro), offset])
+        self.contagem += 1
+
+    def run_causal(self):
+        """Retorna as entradas (chave, posição) do segmento em ordem causal."""
+        return sorted(((fisico, logico, remetente), (self.numero, offset))
+                      for fisico, logico, remetente, offset in self.chaves)
+
+    def inicio_desde(self, timestamp):
+        """Offset a partir do qual podem existir registros com timestamp >= o informado."""
+        entrada = max(bisect_left(self.marcas, timestamp) - 1, 0)
+        return self.offsets[entrada] if self.offsets else 0
+
+    def entrada_do_ordinal(self, ordinal):
+        """Retorna (ordinal, offset) da entrada esparsa mais próxima antes de um registro."""
+        entrada = max(ordinal // INTERVALO_INDICE, 0)
+        return entrada * INTERVALO_INDICE, self.offsets[entrada]
+
+    def para_dict(self):
+        self.chaves.sort()
+        return {"numero": self.numero, "contagem": self.contagem, "tamanho": self.tamanho,
+                "ts_maximo": self.ts_maximo, "offsets": self.offsets, "marcas": self.marcas,
+                "remetentes": self.remetentes, "chaves": self.chaves}
+
+    @classmethod
+    def de_dict(cls, dados):
+        indice = cls(dados["numero"])
+        indice.contagem = dados["contagem"]
+        indice.tamanho = dados["tamanho"]
+        indice.ts_maximo = dados["ts_maximo"]
+        indice.offsets = dados["offsets"]
+        indice.marcas = dados["marcas"]
+        indice.remetentes = dados["remetentes"]
+        indice.chaves = dados["chaves"]
+        return indice
+
+
+class IndiceHistorico:
+    """
+    API de consulta ao histórico de um LogSegmentado.
+
+    Mantém um IndiceSegmento por segmento: os dos segmentos fechados são
+    persistidos ao lado do log (arquivo NNNNNNNN.idx) e apenas recarregados
+    na inicialização; o do segmento atual é reconstruído lendo só esse
+    segmento e depois atualizado a cada gravação. As consultas leem do
+    disco apenas os trechos apontados pelos índices.
+
+    Todas as consultas são paginadas: devolvem no máximo `limite`
+    mensagens e um cursor (posição no log) para pedir a página seguinte,
+    ou None quando não há mais resultados. A consulta em ordem causal
+    usa a OrdemCausal (hlc.py) e tem como cursor o índice na ordem.
+    """
+
+    def __init__(self, log):
+        """
+        Carrega (ou constrói) os índices e passa a acompanhar as gravações do log.
+
+        Args:
+            log: LogSegmentado a indexar
+        """
+        self.log = log
+        self._lock = threading.Lock()
+        self._indices = {}
+        self.ordem = OrdemCausal()
+        self.reconstruir(reaproveitar=True)
+        log.indexador = self
+
+    def _caminho(self, numero):
+        return os.path.join(self.log.diretorio, f"{numero:08d}{EXTENSAO_INDICE}")
+
+    def _construir(self, numero):
+        """Lê um segmento inteiro e monta o seu índice."""
+        indice = IndiceSegmento(numero)
+        for (_, offset), registro in self._ler_segmento(numero, 0):
+            indice.registrar(offset, registro)
+        return indice
+
+    def _carregar(self, numero):
+        """Carrega o índice persistido de um segmento fechado, se ainda válido."""
+        try:
+            with open(self._caminho(numero), encoding="utf-8") as f:
+                indice = IndiceSegmento.de_dict(json.load(f))
+            if indice.tamanho == os.path.getsize(self.log.caminho_segmento(numero)):
+                return indice
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _salvar(self, indice):
+        """Persiste o índice de um segmento fechado (gravação atômica)."""
+        indice.tamanho = os.path.getsize(self.log.caminho_segmento(indice.numero))
+        caminho = self._caminho(indice.numero)
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(indice.para_dict(), f, separators=(",", ":"))
+        os.replace(caminho + ".tmp", caminho)
+
+    def reconstruir(self, reaproveitar=False):
+        """
+        Refaz os índices de todos os segmentos (após reescrever o log).
+
+        Args:
+            reaproveitar: Se True, usa os índices persistidos que ainda
+                correspondem aos segmentos fechados
+        """
+        segmentos = self.log.segmentos()
+        indices = {}
+        for numero in segmentos[:-1]:
+            indice = self._carregar(numero) if reaproveitar else None
+            if indice is None:
+                indice = self._construir(numero)
+                self._salvar(indice)
+            indices[numero] = indice
+        indices[segmentos[-1]] = self._construir(segmentos[-1])
+
+        for nome in os.listdir(self.log.diretorio):
+            base, ext = os.path.splitext(nome)
+            if ext == EXTENSAO_INDICE and base.isdigit() and int(base) not in indices:
+                os.remove(os.path.join(self.log.diretorio, nome))
+        with self._lock:
+            self._indices = indices
+            self.ordem.carregar(indice.run_causal() for indice in indices.values())
+
+    def registrar(self, posicao, registro):
+        """Atualiza o índice com um registro recém-gravado (chamado pelo log)."""
+        numero, offset = posicao
+        with self._lock:
+            indice = self._indices.get(numero)
+            if indice is None:
+                indice = self._indices[numero] = IndiceSegmento(numero)
+            indice.registrar(offset, registro)
+            self.ordem.inserir(chave_causal(registro), posicao)
+
+    def fechar_segmento(self, numero):
+        """Persiste o índice de um segmento que deixou de receber gravações."""
+        with self._lock:
+            indice = self._indices.get(numero)
+        if indice is not None:
+            self._salvar(indice)
+
+    def remover_segmentos(self, numeros):
+        """Descarta os índices de segmentos removidos do log (chamado pelo log)."""
+        with self._lock:
+            for numero in numeros:
+                self._indices.pop(numero, None)
+            self.ordem.carregar(indice.run_causal() for indice in self._indices.values())
+        for numero in numeros:
+            try:
+                os.remove(self._caminho(numero))
+            except FileNotFoundError:
+                pass
+
+    def resumo_segmentos(self):
+        """
+        Retorna um resumo de cada segmento, do mais antigo ao mais novo
+        (o último é o segmento aberto para escrita).
+
+        Returns:
+            list: (número, quantidade de registros, bytes, maior timestamp)
+        """
+        with self._lock:
+            indices = [self._indices[numero] for numero in sorted(self._indices)]
+        return [(indice.numero, indice.contagem,
+                 indice.tamanho if indice.tamanho is not None
+                 else os.path.getsize(self.log.caminho_segmento(indice.numero)),
+                 indice.ts_maximo) for indice in indices]
+
+    def _ler_segmento(self, numero, offset, fim=None):
+        """
+        Percorre os registros de um segmento a partir de um offset.
+
+        Yields:
+            tuple: ((segmento, offset), registro)
+        """
+        try:
+            f = open(self.log.caminho_segmento(numero), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            for linha in f:
+                if (fim is not None and offset >= fim) or not linha.endswith(b"\n"):
+                    break
+                posicao = (numero, offset)
+                offset += len(linha)
+                try:
+                    yield posicao, json.loads(linha)
+                except json.JSONDecodeError:
+                    continue
+
+    def _segmentos(self, desde=None):
+        with self._lock:
+            return [self._indices[numero] for numero in sorted(self._indices)
+                    if desde is None or numero >= desde]
+
+    def desde(self, timestamp, limite=LIMITE_PAGINA, cursor=None):
+        """
+        Mensagens com timestamp maior ou igual ao informado, na ordem do log.
+
+        Segmentos cujo maior timestamp é anterior ao pedido são pulados e,
+        nos demais, a leitura começa na entrada esparsa indicada por bisect.
+
+        Args:
+            timestamp: Instante inicial (segundos desde a época Unix)
+            limite: Máximo de mensagens na página
+            cursor: Cursor devolvido pela página anterior (opcional)
+
+        Returns:
+            tuple: (mensagens, cursor da próxima página ou None)
+        """
+        mensagens = []
+        for indice in self._segmentos(cursor[0] if cursor else None):
+            if indice.ts_maximo is None or indice.ts_maximo < timestamp:
+                continue
+            inicio = indice.inicio_desde(timestamp)
+            if cursor and indice.numero == cursor[0]:
+                inicio = max(inicio, cursor[1])
+            for posicao, registro in self._ler_segmento(indice.numero, inicio):
+                if _timestamp(registro) < timestamp:
+                    continue
+                if len(mensagens) == limite:
+                    return mensagens, posicao
+                mensagens.append(registro)
+        return mensagens, None
+
+    def por_remetente(self, remetente, limite=LIMITE_PAGINA, cursor=None):
+        """
+        Mensagens de um remetente, na ordem do log.
+
+        Args:
+            remetente: ID do nó que enviou as mensagens
+            limite: Máximo de mensagens na página
+            cursor: Cursor devolvido pela página anterior (opcional)
+
+        Returns:
+            tuple: (mensagens, cursor da próxima página ou None)
+        """
+        mensagens = []
+        for indice in self._segmentos(cursor[0] if cursor else None):
+            offsets = indice.remetentes.get(remetente, [])
+            if cursor and indice.numero == cursor[0]:
+                offsets = offsets[bisect_left(offsets, cursor[1]):]
+            if not offsets:
+                continue
+            with open(self.log.caminho_segmento(indice.numero), "rb") as f:
+                for offset in offsets:
+                    if len(mensagens) == limite:
+                        return mensagens, (indice.numero, offset)
+                    f.seek(offset)
+                    mensagens.append(json.loads(f.readline()))
+        return mensagens, None
+
+    def _ordinal(self, indice, offset):
+        """Quantidade de registros do segmento antes de um offset."""
+        if not indice.offsets:
+            return 0
+        entrada = max(bisect_right(indice.offsets, offset) - 1, 0)
+        lidos = sum(1 for _ in self._ler_segmento(indice.numero, indice.offsets[entrada], offset))
+        return entrada * INTERVALO_INDICE + lidos
+
+    def ultimas(self, quantidade=LIMITE_PAGINA, antes=None):
+        """
+        As últimas mensagens do log (ou as últimas antes de um cursor).
+
+        Os segmentos são percorridos de trás para frente pelas contagens
+        dos índices; só o trecho final necessário é lido do disco.
+
+        Args:
+            quantidade: Quantidade de mensagens
+            antes: Cursor devolvido pela página anterior, para buscar as
+                mensagens mais antigas que ela (opcional)
+
+        Returns:
+            tuple: (mensagens em ordem de gravação, cursor da página
+                anterior ou None se chegou ao início do log)
+        """
+        trechos = []  # (índice, ordinal inicial, offset final ou None)
+        faltam = quantidade
+        for indice in reversed(self._segmentos()):
+            if faltam <= 0:
+                break
+            if antes is not None and indice.numero > antes[0]:
+                continue
+            fim = antes[1] if antes is not None and indice.numero == antes[0] else None
+            disponiveis = indice.contagem if fim is None else self._ordinal(indice, fim)
+            if disponiveis == 0:
+                continue
+            inicio = max(disponiveis - faltam, 0)
+            faltam -= disponiveis - inicio
+            trechos.append((indice, inicio, fim))
+
+        mensagens = []
+        cursor = None
+        for indice, inicio, fim in reversed(trechos):
+            ordinal, offset = indice.entrada_do_ordinal(inicio)
+            for posicao, registro in self._ler_segmento(indice.numero, offset, fim):
+                if ordinal >= inicio:
+                    if cursor is None:
+                        cursor = posicao
+                    mensagens.append(registro)
+                ordinal += 1
+        if faltam > 0:
+            cursor = None  # Início do log alcançado
+        return mensagens, cursor
+
+    def ordenadas(self, inicio=0, limite=LIMITE_PAGINA):
+        """
+        Mensagens em ordem causal (carimbo HLC, depois remetente).
+
+        A ordem é a mesma em todos os nós que possuem as mesmas mensagens,
+        independente da ordem de chegada e dos relógios de parede.
+
+        Args:
+            inicio: Índice na ordem causal (cursor da página anterior)
+            limite: Máximo de mensagens na página
+
+        Returns:
+            tuple: (mensagens, cursor da próxima página ou None)
+        """
+        with self._lock:
+            posicoes = self.ordem.fatia(inicio, limite)
+            total = len(self.ordem)
+        mensagens = [self.log.ler(posicao) for posicao in posicoes]
+        proximo = inicio + len(posicoes)
+        return mensagens, (proximo if proximo < total else None)
+
+    def consultar(self, pedido):
+        """
+        Executa uma consulta descrita por um dicionário (protocolo local).
+
+        Operações: {"op": "desde", "timestamp": T}, {"op": "ultimas",
+        "quantidade": N, "antes": cursor}, {"op": "remetente",
+        "remetente": S} e {"op": "ordem"}; "limite" e "cursor" são opcionais.
+        "limite" e "quantidade" são inteiros positivos, reduzidos a no máximo
+        LIMITE_PAGINA.
+
+        Returns:
+            dict: {"mensagens": [...], "cursor": cursor ou None}
+
+        Raises:
+            ValueError: Se a operação ou os parâmetros são inválidos
+        """
+        operacao = pedido.get("op")
+        limite = _tamanho_pagina(pedido.get("limite", LIMITE_PAGINA), "limite")
+        if operacao == "ordem":
+            mensagens, proximo = self.ordenadas(int(pedido.get("cursor") or 0), limite)
+            return {"mensagens": mensagens, "cursor": proximo}
+        cursor = _cursor(pedido.get("cursor"))
+        if operacao == "desde":
+            mensagens, cursor = self.desde(float(pedido["timestamp"]), limite, cursor)
+        elif operacao == "ultimas":
+            quantidade = _tamanho_pagina(pedido.get("quantidade", limite), "quantidade")
+            mensagens, cursor = self.ultimas(quantidade, _cursor(pedido.get("antes")))
+        elif operacao == "remetente":
+            mensagens, cursor = self.por_remetente(str(pedido["remetente"]), limite, cursor)
+        else:
+            raise ValueError(f"Operação de consulta desconhecida: {operacao!r}")
+        return {"mensagens": mensagens, "cursor": list(cursor) if cursor else None}
+
+
+def _tamanho_pagina(valor, campo):
+    """Valida o tamanho de página pedido (1..LIMITE_PAGINA; acima disso, reduzido)."""
+    if not isinstance(valor, int) or isinstance(valor, bool) or valor < 1:
+        raise ValueError(f"{campo} deve ser um inteiro positivo: {valor!r}")
+    return min(valor, LIMITE_PAGINA)
+
+
+def _cursor(valor):
+    """Converte o cursor recebido em JSON ([segmento, offset]) para tupla."""
+    if valor is None:
+        return None
+    segmento, offset = valor
+    return int(segmento), int(offset)
+
+
+async def iniciar_servidor_consulta(historico, executar, porta, host=HOST_CONSULTA):
+    """
+    Abre o protocolo local de consultas: um pedido JSON por linha, uma
+    resposta JSON por linha, na mesma conexão.
+
+    Args:
+        historico: IndiceHistorico consultado
+        executar: Corrotina que executa uma função na thread de disco
+            (por exemplo, NucleoDatagramas.em_disco)
+        porta: Porta TCP
+        host: Endereço de escuta (padrão: apenas a máquina local)
+    """
+    async def tratar_conexao(reader, writer):
+        try:
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    break
+                try:
+                    resposta = await executar(historico.consultar, json.loads(linha))
+                except (ValueError, KeyError, TypeError) as e:
+                    resposta = {"erro": str(e)}
+                writer.write(json.dumps(resposta, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    await asyncio.start_server(tratar_conexao, host, porta)
+    log.info("consulta_servidor", "Consultas ao histórico", host=host, porta=porta)
+
+
+def consultar_no(pedido, porta, host=HOST_CONSULTA, timeout=5.0):
+    """
+    Envia uma consulta ao protocolo local de um nó (uso em ferramentas).
+
+    Args:
+        pedido: Dicionário da consulta (ver IndiceHistorico.consultar)
+        porta: Porta de consultas do nó
+
+    Returns:
+        dict: Resposta do nó
+    """
+    with socket.create_connection((host, porta), timeout=timeout) as conexao:
+        conexao.sendall(json.dumps(pedido).encode() + b"\n")
+        with conexao.makefile("rb") as resposta:
+            return json.loads(resposta.readline())
@@ -0,0 +1,169 @@
+import os
+import heapq
+import random
+import itertools
+
+from registro import log
+
+
+class PerfilRede:
+    """
+    Parâmetros de uma condição de rede emulada.
+
+    Atributos:
+        atraso: Atraso fixo em segundos
+        jitter: Variação máxima (uniforme) somada ao atraso, em segundos
+        perda: Probabilidade de descartar o datagrama
+        reordenacao: Probabilidade de segurar o datagrama por mais tempo,
+            para que os seguintes o ultrapassem
+    """
+
+    __slots__ = ("atraso", "jitter", "perda", "reordenacao")
+
+    def __init__(self, atraso=0.0, jitter=0.0, perda=0.0, reordenacao=0.0):
+        self.atraso = atraso
+        self.jitter = jitter
+        self.perda = perda
+        self.reordenacao = reordenacao
+
+    def __repr__(self):
+        return (f"PerfilRede(atraso={self.atraso}, jitter={self.jitter}, "
+                f"perda={self.perda}, reordenacao={self.reordenacao})")
+
+
+# Perfis pré-definidos: (envio, recebimento). None desliga a emulação.
+PERFIS = {
+    "desligado": None,
+    "lan": (PerfilRede(0.0005, 0.001), PerfilRede(0.0005, 0.001)),
+    "wan": (PerfilRede(0.04, 0.02, perda=0.01, reordenacao=0.01), PerfilRede(0.04, 0.02)),
+    "instavel": (PerfilRede(0.05, 0.2, perda=0.05, reordenacao=0.05), PerfilRede(0.02, 0.05, perda=0.02)),
+    # Aproxima os delays artificiais originalmente escritos nos handlers
+    "legado": (PerfilRede(0.1, 0.9), PerfilRede(0.05, 0.15)),
+}
+
+
+class EmuladorRede:
+    """
+    Emula latência, jitter, perda e reordenação sem bloquear o laço.
+
+    Cada datagrama atrasado entra em um heap de timers ordenado pelo
+    instante de entrega; um único timer do laço de eventos fica armado
+    para o próximo vencimento e, ao disparar, entrega todos os itens
+    vencidos. Quando a emulação está desligada o núcleo de rede nem
+    chega a criar um emulador, de modo que o custo em produção é zero.
+    """
+
+    def __init__(self, loop, envio=None, recebimento=None, semente=None):
+        """
+        Args:
+            loop: Laço de eventos asyncio
+            envio: PerfilRede aplicado aos datagramas enviados (opcional)
+            recebimento: PerfilRede aplicado aos datagramas recebidos (opcional)
+            semente: Semente do gerador aleatório, para execuções reprodutíveis
+        """
+        self.loop = loop
+        self.envio = envio
+        self.recebimento = recebimento
+        self._aleatorio = random.Random(semente)
+        self._heap = []
+        self._contador = itertools.count()
+        self._timer = None
+        self._proximo = None
+        self.descartados = 0
+        self.reordenados = 0
+
+    def enviar(self, funcao, *args):
+        """Aplica o perfil de envio e agenda a chamada de envio."""
+        self._aplicar(self.envio, funcao, args)
+
+    def receber(self, funcao, *args):
+        """Aplica o perfil de recebimento e agenda a entrega ao núcleo."""
+        self._aplicar(self.recebimento, funcao, args)
+
+    def _aplicar(self, perfil, funcao, args):
+        if perfil is None:
+            funcao(*args)
+            return
+        if perfil.perda and self._aleatorio.random() < perfil.perda:
+            self.descartados += 1
+            return
+        atraso = perfil.atraso + self._aleatorio.uniform(0, perfil.jitter)
+        if perfil.reordenacao and self._aleatorio.random() < perfil.reordenacao:
+            atraso += perfil.atraso + perfil.jitter
+            self.reordenados += 1
+        if atraso <= 0:
+            funcao(*args)
+            return
+        self._agendar(self.loop.time() + atraso, funcao, args)
+
+    def _agendar(self, instante, funcao, args):
+        heapq.heappush(self._heap, (instante, next(self._contador), funcao, args))
+        if self._proximo is None or instante < self._proximo:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._proximo = instante
+            self._timer = self.loop.call_at(instante, self._disparar)
+
+    def _disparar(self):
+        """Entrega todos os itens vencidos e rearma o timer."""
+        self._timer = None
+        self._proximo = None
+        agora = self.loop.time()
+        while self._heap and self._heap[0][0] <= agora:
+            _, _, funcao, args = heapq.heappop(self._heap)
+            try:
+                funcao(*args)
+            except Exception as e:
+                log.erro("emulacao", "Emulação de rede: falha na entrega", erro=str(e))
+        if self._heap:
+            self._proximo = self._heap[0][0]
+            self._timer = self.loop.call_at(self._proximo, self._disparar)
+
+
+def carregar_perfil(especificacao):
+    """
+    Interpreta a configuração de emulação.
+
+    Aceita o nome de um perfil de PERFIS ou uma lista de parâmetros
+    aplicados aos dois sentidos, por exemplo "atraso=0.05,jitter=0.1,perda=0.01".
+
+    Args:
+        especificacao: Texto da configuração
+
+    Returns:
+        tuple (envio, recebimento) ou None se a emulação está desligada
+
+    Raises:
+        ValueError: Se a especificação é inválida
+    """
+    especificacao = (especificacao or "desligado").strip()
+    if especificacao in PERFIS:
+        return PERFIS[especificacao]
+    parametros = {}
+    for item in especificacao.split(","):
+        chave, _, valor = item.partition("=")
+        if chave.strip() not in PerfilRede.__slots__:
+            raise ValueError(f"Parâmetro de emulação desconhecido: {chave!r}")
+        parametros[chave.strip()] = float(valor)
+    perfil = PerfilRede(**parametros)
+    return perfil, perfil
+
+
+def criar_emulador(loop, especificacao=None):
+    """
+    Cria o emulador configurado pela variável de ambiente EMULACAO_REDE.
+
+    Args:
+        loop: Laço de eventos asyncio
+        especificacao: Configuração explícita (padrão: EMULACAO_REDE)
+
+    Returns:
+        EmuladorRede, ou None quando a emulação está desligada
+    """
+    if especificacao is None:
+        especificacao = os.environ.get("EMULACAO_REDE", "desligado")
+    perfis = carregar_perfil(especificacao)
+    if perfis is None:
+        return None
+    log.info("emulacao", "Emulação de rede ativa", perfil=especificacao)
+    return EmuladorRede(loop, *perfis)
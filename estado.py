@@ -0,0 +1,114 @@
+from anel import Anel
+
+
+class EstadoNo:
+    """
+    Estado autoritativo de um nó (servidor ou cliente), mantido em memória.
+
+    Os handlers leem e alteram os atributos diretamente; o arquivo de
+    checkpoint é apenas um snapshot persistido deste objeto, gravado em
+    segundo plano por persistir(). Nenhuma decisão do protocolo depende
+    de ler o disco.
+
+    Atributos:
+        no_id: ID do nó
+        ultima_mensagem: Descrição do último evento processado
+        token: Indica se este nó possui o token
+        vizinhos: Conjunto de IDs dos nós no anel lógico
+        anel: Tabela de sucessores e época de participação (ver anel.py)
+        detentor_token: Último nó para o qual o token foi entregue
+        geracao: Maior geração de token conhecida (tokens anteriores são descartados)
+        formatos: Formatos de serialização anunciados por cada vizinho
+        sequencia: Último número de sequência usado nas mensagens do nó
+    """
+
+    __slots__ = ("no_id", "ultima_mensagem", "token", "vizinhos", "anel", "detentor_token",
+                 "geracao", "formatos", "sequencia", "gravador")
+
+    def __init__(self, no_id, token=False, gravador=None):
+        """
+        Args:
+            no_id: ID do nó
+            token: Se o nó inicia com o token
+            gravador: GravadorCheckpoint usado para persistir snapshots (opcional)
+        """
+        self.no_id = no_id
+        self.ultima_mensagem = ""
+        self.token = token
+        self.vizinhos = set()
+        self.anel = Anel()
+        self.detentor_token = no_id if token else None
+        self.geracao = 0
+        self.formatos = {}
+        self.sequencia = 0
+        self.gravador = gravador
+
+    def snapshot(self):
+        """
+        Retorna o estado no formato do arquivo de checkpoint.
+
+        Returns:
+            dict serializável em JSON
+        """
+        return {
+            "last_message": self.ultima_mensagem,
+            "token": self.token,
+            "neighbors": sorted(self.vizinhos),
+            "epoca": self.anel.epoca,
+            "encarnacao": self.anel.encarnacao,
+            "geracao": self.geracao,
+            "sequencia": self.sequencia,
+        }
+
+    def restaurar(self, snapshot):
+        """
+        Carrega os campos de um snapshot salvo anteriormente.
+
+        Args:
+            snapshot: dict lido do arquivo de checkpoint
+        """
+        self.ultima_mensagem = snapshot.get("last_message", "")
+        self.token = snapshot.get("token", self.token)
+        self.sequencia = snapshot.get("sequencia", 0)
+        self.geracao = snapshot.get("geracao", 0)
+        self.atualizar_anel(snapshot.get("neighbors", []), snapshot.get("epoca", 0),
+                            snapshot.get("encarnacao", 0))
+
+    def atualizar_anel(self, membros, epoca, encarnacao=None, redefinir=False):
+        """
+        Substitui os vizinhos e a tabela de sucessores se a visão é mais nova.
+
+        Visões antigas ou repetidas (mesma encarnação e época) não alteram
+        nem os vizinhos nem o anel.
+
+        Args:
+            membros: IDs dos membros do anel
+            epoca: Época de participação correspondente
+            encarnacao: Encarnação do servidor que numerou a época (padrão: a atual)
+            redefinir: Aceita a visão mesmo que não seja mais nova (ver Anel.atualizar)
+
+        Returns:
+            bool: True se a visão do anel mudou
+        """
+        membros = set(membros)
+        if not self.anel.atualizar(membros, epoca, encarnacao, redefinir):
+            return False
+        self.vizinhos = membros
+        return True
+
+    def proxima_sequencia(self):
+        """Incrementa e retorna o número de sequência das mensagens do nó."""
+        self.sequencia += 1
+        return self.sequencia
+
+    def persistir(self, ultima_mensagem=None):
+        """
+        Agenda a gravação de um snapshot do estado (não bloqueia).
+
+        Args:
+            ultima_mensagem: Descrição do evento a registrar (opcional)
+        """
+        if ultima_mensagem is not None:
+            self.ultima_mensagem = ultima_mensagem
+        if self.gravador is not None:
+            self.gravador.salvar(self.snapshot())
@@ -0,0 +1,75 @@
+import os
+import time
+from collections import deque
+
+# Configuração padrão (pode ser ajustada pelas variáveis de ambiente)
+LOTE_MAXIMO_BYTES = int(os.environ.get("LOTE_MAXIMO_BYTES", "1200"))  # Cabe em um datagrama
+TOKEN_ORCAMENTO_BYTES = int(os.environ.get("TOKEN_ORCAMENTO_BYTES", str(64 * 1024)))
+TOKEN_TEMPO_MAXIMO = float(os.environ.get("TOKEN_TEMPO_MAXIMO", "0.05"))  # Segundos
+CUSTO_MENSAGEM = 64  # Estimativa dos campos fixos de uma mensagem de chat, em bytes
+
+
+class FilaSaida:
+    """
+    Fila de mensagens de chat aguardando o token para serem enviadas.
+
+    Qualquer parte do cliente (API, stdin, socket local) apenas enfileira
+    o texto; quem detém o token retira lotes limitados por tamanho e os
+    envia de uma vez, de modo que a vazão depende do tamanho do lote e
+    não do período de rotação do token.
+
+    Atributos:
+        bytes_pendentes: Tamanho estimado das mensagens na fila
+        enviadas: Total de mensagens já retiradas
+        lotes: Total de lotes já retirados
+    """
+
+    def __init__(self):
+        self._itens = deque()
+        self.bytes_pendentes = 0
+        self.enviadas = 0
+        self.lotes = 0
+
+    def enfileirar(self, conteudo, instante=None):
+        """
+        Adiciona uma mensagem ao fim da fila.
+
+        Args:
+            conteudo: Texto da mensagem
+            instante: Momento da entrada na fila (padrão: time.time())
+        """
+        tamanho = len(conteudo.encode()) + CUSTO_MENSAGEM
+        self._itens.append((conteudo, tamanho, time.time() if instante is None else instante))
+        self.bytes_pendentes += tamanho
+
+    def retirar_lote(self, limite_bytes=LOTE_MAXIMO_BYTES):
+        """
+        Retira da frente da fila as mensagens que cabem no limite.
+
+        Sempre retira ao menos uma mensagem, mesmo que maior que o
+        limite (o transporte fragmenta payloads grandes).
+
+        Args:
+            limite_bytes: Tamanho máximo estimado do lote
+
+        Returns:
+            tuple (lista de pares (texto, instante de entrada na fila),
+            tamanho estimado do lote)
+        """
+        itens = []
+        total = 0
+        while self._itens:
+            conteudo, tamanho, instante = self._itens[0]
+            if itens and total + tamanho > limite_bytes:
+                break
+            self._itens.popleft()
+            itens.append((conteudo, instante))
+            total += tamanho
+        self.bytes_pendentes -= total
+        if itens:
+            self.enviadas += len(itens)
+            self.lotes += 1
+        return itens, total
+
+    def __len__(self):
+        return len(self._itens)
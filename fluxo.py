@@ -0,0 +1,275 @@
+import os
+from collections import deque
+
+# Limites de vazão do repasse do servidor (bytes por segundo; 0 = sem limite)
+TAXA_REMETENTE = int(os.environ.get("TAXA_REMETENTE", str(64 * 1024)))
+RAJADA_REMETENTE = int(os.environ.get("RAJADA_REMETENTE", str(256 * 1024)))
+TAXA_GLOBAL = int(os.environ.get("TAXA_GLOBAL", str(1024 * 1024)))
+RAJADA_GLOBAL = int(os.environ.get("RAJADA_GLOBAL", str(1024 * 1024)))
+# Fila de repasse de cada canal e o que descartar quando ela enche
+CAPACIDADE_REPASSE = int(os.environ.get("CAPACIDADE_REPASSE", "1000"))  # Mensagens
+DESCARTE_ANTIGAS = "antigas"  # Descarta o repasse mais antigo da fila
+DESCARTE_NOVAS = "novas"  # Recusa o repasse que chegou
+POLITICAS_DESCARTE = (DESCARTE_ANTIGAS, DESCARTE_NOVAS)
+POLITICA_DESCARTE = os.environ.get("POLITICA_DESCARTE", DESCARTE_ANTIGAS)
+# Reação aos sinais de congestionamento dos receptores (aumento aditivo, redução multiplicativa)
+FATOR_MINIMO = 0.1  # Fração mínima da TAXA_GLOBAL durante o congestionamento
+RECUPERACAO_FATOR = 0.1  # Fração da TAXA_GLOBAL recuperada por segundo sem sinais
+CONTENCAO_MAXIMA = 2.0  # Maior pausa pedida a um remetente (segundos)
+# Receptores: perdas por janela a partir das quais o congestionamento é sinalizado
+LIMIAR_CONGESTIONAMENTO = int(os.environ.get("LIMIAR_CONGESTIONAMENTO", "8"))
+JANELA_CONGESTIONAMENTO = 1.0  # Segundos
+
+
+class BaldeTokens:
+    """
+    Limitador de vazão por balde de fichas (token bucket).
+
+    O balde acumula `taxa` fichas (bytes) por segundo até a capacidade
+    `rajada`; cada envio consome o seu tamanho em fichas. Rajadas curtas
+    passam sem espera e a vazão média fica limitada à taxa.
+    """
+
+    def __init__(self, taxa, rajada, agora=0.0):
+        """
+        Args:
+            taxa: Fichas por segundo (0 = sem limite)
+            rajada: Capacidade do balde
+            agora: Instante inicial (relógio do laço)
+        """
+        self.taxa = taxa
+        self.rajada = max(rajada, 1)
+        self.fichas = float(self.rajada)
+        self._atualizado = agora
+
+    def _repor(self, agora):
+        if agora > self._atualizado:
+            self.fichas = min(self.rajada, self.fichas + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+
+    def consumir(self, quantidade, agora):
+        """
+        Consome fichas se houver saldo.
+
+        Returns:
+            bool: False se o envio excede a taxa (nada é consumido)
+        """
+        if not self.taxa:
+            return True
+        self._repor(agora)
+        # Um envio maior que a rajada passa com o balde cheio, senão nunca passaria
+        quantidade = min(quantidade, self.rajada)
+        if self.fichas < quantidade:
+            return False
+        self.fichas -= quantidade
+        return True
+
+    def espera(self, quantidade, agora):
+        """Retorna quantos segundos faltam para haver fichas para o envio."""
+        if not self.taxa:
+            return 0.0
+        self._repor(agora)
+        falta = min(quantidade, self.rajada) - self.fichas
+        return max(0.0, falta / self.taxa)
+
+
+class ControleFluxo:
+    """
+    Controle de fluxo do repasse de um canal no servidor.
+
+    Cada mensagem recebida passa pelo balde do seu remetente: quem excede
+    a sua taxa tem o repasse descartado e recebe um pedido de contenção.
+    As admitidas entram em uma fila limitada, esvaziada no ritmo do balde
+    global; quando a fila enche, a política de descarte escolhe o que
+    sai. As mensagens já estão gravadas e no buffer de retransmissão, de
+    modo que um repasse descartado é recuperado pelos receptores por
+    NACK ou anti-entropia, sem perder dados.
+
+    Os receptores sinalizam congestionamento quando detectam muitas
+    perdas; cada sinal reduz pela metade a vazão do balde global (até
+    FATOR_MINIMO), que volta a crescer aos poucos sem sinais.
+
+    Atributos:
+        fator: Fração atual da TAXA_GLOBAL em uso
+        reparar: Houve repasse descartado desde o último resumo enviado
+        repassadas, descartadas, contidas: Contadores do canal
+    """
+
+    def __init__(self, taxa_remetente=TAXA_REMETENTE, rajada_remetente=RAJADA_REMETENTE,
+                 taxa_global=TAXA_GLOBAL, rajada_global=RAJADA_GLOBAL,
+                 capacidade=CAPACIDADE_REPASSE, politica=POLITICA_DESCARTE):
+        """
+        Args:
+            taxa_remetente, rajada_remetente: Balde de cada remetente (bytes)
+            taxa_global, rajada_global: Balde do repasse do canal (bytes)
+            capacidade: Tamanho máximo da fila de repasse
+            politica: DESCARTE_ANTIGAS ou DESCARTE_NOVAS
+
+        Raises:
+            ValueError: Se a política é desconhecida
+        """
+        if politica not in POLITICAS_DESCARTE:
+            raise ValueError(f"Política de descarte inválida: {politica!r}")
+        self.taxa_remetente = taxa_remetente
+        self.rajada_remetente = rajada_remetente
+        self.taxa_global = taxa_global
+        self.capacidade = capacidade
+        self.politica = politica
+        self.global_ = BaldeTokens(taxa_global, rajada_global)
+        self.fator = 1.0
+        self._remetentes = {}  # remetente -> BaldeTokens
+        self._contidos = {}  # remetente -> fim da pausa pedida
+        self._fila = deque()  # (payload ou mensagem, tamanho)
+        self._recuperado_em = None  # Último ajuste do fator após um sinal
+        self._cortado_em = None  # Última redução do fator
+        self.reparar = False
+        self.repassadas = 0
+        self.descartadas = 0
+        self.contidas = 0
+
+    def admitir(self, remetente, tamanho, agora):
+        """
+        Verifica o balde de um remetente.
+
+        Returns:
+            bool: False se o remetente excedeu a sua taxa
+        """
+        if not self.taxa_remetente:
+            return True
+        balde = self._remetentes.get(remetente)
+        if balde is None:
+            balde = self._remetentes[remetente] = BaldeTokens(
+                self.taxa_remetente, self.rajada_remetente, agora)
+        if balde.consumir(tamanho, agora):
+            return True
+        self.contidas += 1
+        return False
+
+    def contencao(self, remetente, tamanho, agora):
+        """
+        Calcula a pausa a pedir a um remetente contido ou com a fila meio cheia.
+
+        Um remetente ainda em pausa não recebe um novo pedido.
+
+        Returns:
+            float: Segundos de pausa, ou None se não há o que pedir
+        """
+        if agora < self._contidos.get(remetente, 0.0):
+            return None
+        balde = self._remetentes.get(remetente)
+        espera = balde.espera(tamanho, agora) if balde else 0.0
+        if self.ocupacao >= 0.5:
+            espera = max(espera, self.global_.espera(self.global_.rajada, agora))
+        espera = min(CONTENCAO_MAXIMA, espera)
+        if espera <= 0:
+            return None
+        self._contidos[remetente] = agora + espera
+        return espera
+
+    def enfileirar(self, item, tamanho):
+        """
+        Coloca um repasse na fila, aplicando a política de descarte.
+
+        Returns:
+            bool: False se algum repasse foi descartado
+        """
+        if len(self._fila) < self.capacidade:
+            self._fila.append((item, tamanho))
+            return True
+        self.descartadas += 1
+        self.reparar = True
+        if self.politica == DESCARTE_ANTIGAS:
+            self._fila.popleft()
+            self._fila.append((item, tamanho))
+        return False
+
+    def proximo(self, agora):
+        """
+        Retira o próximo repasse se o balde global permitir.
+
+        Returns:
+            tuple: (item ou None, segundos a esperar antes de tentar de novo)
+        """
+        if not self._fila:
+            return None, 0.0
+        self._recuperar(agora)
+        item, tamanho = self._fila[0]
+        if not self.global_.consumir(tamanho, agora):
+            return None, self.global_.espera(tamanho, agora)
+        self._fila.popleft()
+        self.repassadas += 1
+        return item, 0.0
+
+    def sinalizar_congestionamento(self, agora):
+        """
+        Reduz a vazão global após um sinal de congestionamento de um receptor.
+
+        Vários receptores sinalizam a mesma perda; a vazão é reduzida no
+        máximo uma vez por JANELA_CONGESTIONAMENTO.
+
+        Returns:
+            bool: True se a vazão foi reduzida
+        """
+        if self._cortado_em is not None and agora - self._cortado_em < JANELA_CONGESTIONAMENTO:
+            return False
+        self._recuperar(agora)
+        self._recuperado_em = self._cortado_em = agora
+        self.fator = max(FATOR_MINIMO, self.fator / 2)
+        self.global_.taxa = self.taxa_global * self.fator
+        return True
+
+    def _recuperar(self, agora):
+        """Aumenta a vazão global aos poucos enquanto não há sinais."""
+        if self.fator >= 1.0 or self._recuperado_em is None:
+            return
+        decorrido = agora - self._recuperado_em
+        self._recuperado_em = agora
+        self.fator = min(1.0, self.fator + decorrido * RECUPERACAO_FATOR)
+        self.global_.taxa = self.taxa_global * self.fator
+
+    @property
+    def ocupacao(self):
+        """Fração ocupada da fila de repasse."""
+        return len(self._fila) / self.capacidade if self.capacidade else 0.0
+
+    def __len__(self):
+        return len(self._fila)
+
+    def resumo(self):
+        """Retorna os contadores do canal para os logs."""
+        return {"fila": len(self._fila), "fator": round(self.fator, 2), "repassadas": self.repassadas,
+                "descartadas": self.descartadas, "contidas": self.contidas}
+
+
+class DetectorCongestionamento:
+    """
+    Decide quando um receptor sinaliza congestionamento ao servidor.
+
+    Conta as mensagens perdidas (lacunas detectadas) em janelas de
+    JANELA_CONGESTIONAMENTO segundos; se uma janela passa do limiar, o
+    receptor sinaliza, no máximo uma vez por janela.
+    """
+
+    def __init__(self, limiar=LIMIAR_CONGESTIONAMENTO, janela=JANELA_CONGESTIONAMENTO):
+        self.limiar = limiar
+        self.janela = janela
+        self._inicio = None
+        self._perdas = 0
+        self._sinalizado = False
+
+    def registrar(self, perdas, agora):
+        """
+        Conta perdas detectadas.
+
+        Returns:
+            bool: True se o congestionamento deve ser sinalizado agora
+        """
+        if self._inicio is None or agora - self._inicio >= self.janela:
+            self._inicio = agora
+            self._perdas = 0
+            self._sinalizado = False
+        self._perdas += perdas
+        if self.limiar and self._perdas >= self.limiar and not self._sinalizado:
+            self._sinalizado = True
+            return True
+        return False
@@ -0,0 +1,171 @@
+import time
+import heapq
+import threading
+from bisect import bisect_left
+
+# Maior adiantamento aceito de um carimbo remoto em relação ao relógio local (ms)
+DERIVA_MAXIMA = 60 * 1000
+TAMANHO_RUN = 256  # Entradas fora de ordem acumuladas antes de uma fusão
+
+
+class RelogioHibrido:
+    """
+    Relógio lógico híbrido (HLC) de um nó.
+
+    Cada carimbo é um par [físico, lógico]: o componente físico acompanha
+    o maior tempo de parede conhecido (em milissegundos) e o lógico
+    desempata eventos no mesmo milissegundo. Ao receber uma mensagem, o
+    relógio avança para além do carimbo recebido; assim uma resposta é
+    sempre ordenada depois da mensagem que a causou, mesmo que o relógio
+    de parede do remetente esteja adiantado em relação ao do receptor.
+
+    Pode ser usado pelo laço de eventos (envio) e pela thread de disco
+    (gravação de mensagens recebidas) ao mesmo tempo.
+    """
+
+    def __init__(self, relogio=time.time):
+        """
+        Args:
+            relogio: Função que retorna o tempo de parede em segundos
+        """
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self.fisico = 0
+        self.logico = 0
+
+    def _agora_ms(self):
+        return int(self._relogio() * 1000)
+
+    def agora(self):
+        """
+        Gera o carimbo de um evento local (envio de mensagem).
+
+        Returns:
+            list: [físico, lógico]
+        """
+        fisico = self._agora_ms()
+        with self._lock:
+            if fisico > self.fisico:
+                self.fisico, self.logico = fisico, 0
+            else:
+                self.logico += 1
+            return [self.fisico, self.logico]
+
+    def receber(self, carimbo):
+        """
+        Avança o relógio ao receber uma mensagem carimbada.
+
+        Carimbos adiantados mais que DERIVA_MAXIMA em relação ao relógio
+        local são ignorados, para que um nó com o relógio errado não
+        arraste os demais.
+
+        Args:
+            carimbo: [físico, lógico] da mensagem recebida
+
+        Returns:
+            bool: False se o carimbo foi ignorado
+        """
+        fisico_msg, logico_msg = carimbo
+        agora = self._agora_ms()
+        if fisico_msg - agora > DERIVA_MAXIMA:
+            return False
+        with self._lock:
+            fisico = max(self.fisico, fisico_msg, agora)
+            if fisico == self.fisico and fisico == fisico_msg:
+                logico = max(self.logico, logico_msg) + 1
+            elif fisico == self.fisico:
+                logico = self.logico + 1
+            elif fisico == fisico_msg:
+                logico = logico_msg + 1
+            else:
+                logico = 0
+            self.fisico, self.logico = fisico, logico
+        return True
+
+
+def carimbo_valido(carimbo):
+    """Indica se um valor é um carimbo HLC [físico, lógico]."""
+    return (isinstance(carimbo, (list, tuple)) and len(carimbo) == 2
+            and all(isinstance(parte, int) for parte in carimbo))
+
+
+def chave_causal(msg):
+    """
+    Chave de ordenação de uma mensagem: (físico, lógico, remetente).
+
+    Mensagens sem carimbo HLC (gravadas por versões anteriores) usam o
+    timestamp de parede como componente físico.
+    """
+    remetente = str(msg.get("sender", ""))
+    carimbo = msg.get("hlc")
+    if carimbo_valido(carimbo):
+        return (carimbo[0], carimbo[1], remetente)
+    timestamp = msg.get("timestamp", 0)
+    if not isinstance(timestamp, (int, float)):
+        timestamp = 0
+    return (int(timestamp * 1000), 0, remetente)
+
+
+class OrdemCausal:
+    """
+    Ordem das mensagens da réplica pela chave causal, mantida incrementalmente.
+
+    O log continua append-only (as posições não mudam); esta estrutura
+    guarda as posições em ordem de chave. Uma entrada que chega em ordem
+    é simplesmente acrescentada; as fora de ordem formam uma pequena run
+    que, ao atingir TAMANHO_RUN entradas (ou antes de uma leitura), é
+    ordenada e fundida apenas com o trecho final afetado da ordem
+    principal. Na inicialização, as runs já ordenadas de cada segmento
+    são fundidas com heapq.merge.
+    """
+
+    def __init__(self):
+        self._principal = []  # (chave, posição), ordenada
+        self._pendentes = []  # Run de entradas fora de ordem
+
+    def carregar(self, runs):
+        """
+        Substitui o conteúdo pela fusão de runs já ordenadas.
+
+        Args:
+            runs: Iterável de listas ordenadas de (chave, posição)
+        """
+        self._principal = list(heapq.merge(*runs))
+        self._pendentes = []
+
+    def inserir(self, chave, posicao):
+        """Registra a posição de uma mensagem gravada no log."""
+        entrada = (chave, posicao)
+        if not self._pendentes and (not self._principal or entrada >= self._principal[-1]):
+            self._principal.append(entrada)
+            return
+        self._pendentes.append(entrada)
+        if len(self._pendentes) >= TAMANHO_RUN:
+            self._fundir()
+
+    def _fundir(self):
+        """Funde a run pendente com o trecho final da ordem principal."""
+        if not self._pendentes:
+            return
+        self._pendentes.sort()
+        corte = bisect_left(self._principal, self._pendentes[0])
+        cauda = self._principal[corte:]
+        self._principal[corte:] = heapq.merge(cauda, self._pendentes)
+        self._pendentes = []
+
+    def fatia(self, inicio, quantidade):
+        """
+        Retorna as posições de um trecho da ordem causal.
+
+        Args:
+            inicio: Índice da primeira mensagem na ordem
+            quantidade: Quantidade de mensagens
+
+        Returns:
+            list: Posições no log, em ordem causal
+        """
+        self._fundir()
+        return [posicao for _, posicao in self._principal[inicio:inicio + quantidade]]
+
+    def __len__(self):
+        return len(self._principal) + len(self._pendentes)
@@ -1,27 +1,36 @@
-import socket
+import os
+import re
+import sys
+import json
+import time
+import heapq
+import queue
+import shutil
+import argparse
 import threading
 import subprocess
-import time
-import json
-import random
-import re
-from queue import Queue
-from collections import deque
-from datetime import datetime
-import os
+from datetime import datetime, timezone
+
+from rastreamento import Rastros, mensagens_da_replica, relatorio
+from registro import PREFIXOS_TEXTO
 
 # Configurações de multicast
 MULTICAST_GROUP = "224.1.1.1"
 PORT = 50007
 
-# Configuração do buffer de logs
-log_buffer = deque(maxlen=1000)
-last_output_time = time.time()
-log_lock = threading.Lock()
+# Agregação dos logs
+JANELA_ORDENACAO = 0.5  # Segundos que uma linha espera por linhas mais antigas de outros nós
+INTERVALO_MINIMO_QUADRO = 0.05  # Segundos entre quadros com pouco tráfego
+INTERVALO_MAXIMO_QUADRO = 1.0  # Segundos entre quadros com muito tráfego
+LINHAS_POR_QUADRO = 40  # Linhas exibidas por quadro (mínimo); o excedente é resumido por serviço
+# Linha de "docker-compose logs --no-color --timestamps": "servico  | 2024-01-01T00:00:00.000000000Z texto"
+PADRAO_COMPOSE = re.compile(r"^(\S+)\s+\|\s?(?:(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?)Z?\s)?(.*)$")
+CORES = ("\033[34m", "\033[35m", "\033[36m", "\033[33m", "\033[94m", "\033[95m", "\033[96m")
 
 # Configuração para filtrar mensagens repetitivas
 LOG_COOLDOWN = 0.5  # tempo mínimo entre logs similares (em segundos)
 recent_logs = {}  # armazenar logs recentes por tipo para evitar duplicação
+cores_servicos = {}  # Cor de cada serviço descoberto no fluxo
 
 
 def derrubar_servicos():
@@ -44,199 +53,453 @@ def iniciar_docker_compose():
         print(f"[ERRO] Falha ao iniciar os serviços: {e}")
 
 
+def servicos_ativos():
+    """
+    Descobre os contêineres em execução do projeto Docker Compose.
+    
+    Returns:
+        Lista com os IDs dos contêineres (vazia se nenhum está rodando)
+    """
+    try:
+        saida = subprocess.run(["docker-compose", "ps", "-q"], capture_output=True, text=True,
+                               check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    return saida.split()
+
+
 def limpar_terminal():
     """Limpa o terminal para uma melhor visualização."""
     os.system('cls' if os.name == 'nt' else 'clear')
 
 
-def formatar_log(servico, mensagem):
+def instante_docker(texto):
+    """Converte um timestamp RFC 3339 do docker (UTC, até nanossegundos) em segundos desde a época."""
+    data, _, fracao = texto.partition(".")
+    instante = datetime.strptime(data, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    return instante + (float("0." + fracao) if fracao else 0.0)
+
+
+def interpretar_linha(servico, linha, instante=None):
     """
-    Formata uma mensagem de log para exibição organizada.
+    Converte uma linha de log de um nó em um evento com o seu instante original.
+    
+    O instante é o campo "ts" dos eventos JSON (momento do registro no
+    nó); sem ele, vale o timestamp do docker ou o momento da leitura.
     
     Args:
-        servico: Nome do serviço (container) que gerou o log
-        mensagem: Conteúdo da mensagem de log
-        
+        servico: Serviço (contêiner ou arquivo) que gerou a linha
+        linha: Texto da linha
+        instante: Timestamp da linha informado pelo docker, se houver
+    
     Returns:
-        String formatada com timestamp e cores
+        Evento (dict) com os campos "ts" e "servico"; linhas que não são
+        JSON vão no campo "msg"
     """
-    timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-    
-    # Extrai o ID do cliente do formato "[LOG] XXXX: mensagem"
-    id_match = re.search(r'\[LOG\] ([a-zA-Z0-9]+):', mensagem)
-    client_id = id_match.group(1) if id_match else ""
+    try:
+        evento = json.loads(linha)
+    except ValueError:
+        evento = None
+    if not isinstance(evento, dict):
+        evento = {"msg": linha}
+    if not isinstance(evento.get("ts"), (int, float)):
+        evento["ts"] = instante if instante is not None else time.time()
+    evento["servico"] = servico
+    return evento
+
+
+def descrever_evento(evento):
+    """
+    Converte um evento dos nós (ver registro.py) para o formato de texto.
     
-    # Formata com cores ANSI (verde para servidor, azul para clientes)
-    prefix = f"\033[32m[{timestamp}] {servico:<12}\033[0m" if 'server' in servico else f"\033[34m[{timestamp}] {servico:<12}\033[0m"
+    Returns:
+        String "[LOG] no: descrição campo=valor" (linhas de texto voltam inalteradas)
+    """
+    if "evento" not in evento:
+        return evento.get("msg", "")
+    campos = "".join(f" {chave}={valor}" for chave, valor in evento.items()
+                     if chave not in ("ts", "nivel", "no", "evento", "msg", "servico"))
+    prefixo = PREFIXOS_TEXTO.get(evento.get("nivel"), "[LOG]")
+    return f"{prefixo} {evento.get('no', '')}: {evento.get('msg') or evento['evento']}{campos}"
+
+
+def formatar_log(evento):
+    """
+    Formata um evento para exibição organizada.
     
-    # Formata objetos JSON de forma mais compacta
-    if 'Checkpoint' in mensagem and '{' in mensagem:
-        try:
-            json_start = mensagem.find('{')
-            if json_start >= 0:
-                before = mensagem[:json_start].strip()
-                json_obj = json.loads(mensagem[json_start:])
-                json_formatted = json.dumps(json_obj, sort_keys=True)
-                mensagem = f"{before} {json_formatted}"
-        except:
-            pass  # Se falhar, mantém a mensagem original
+    Args:
+        evento: Evento lido de um nó (ver interpretar_linha)
     
-    return f"{prefix}: {mensagem}"
+    Returns:
+        String com o instante original do evento e cores (verde para o
+        servidor, uma cor por serviço para os demais)
+    """
+    servico = evento["servico"]
+    timestamp = datetime.fromtimestamp(evento["ts"]).strftime("%H:%M:%S.%f")[:-3]
+    if servico not in cores_servicos:
+        cores_servicos[servico] = ("\033[32m" if "server" in servico
+                                   else CORES[len(cores_servicos) % len(CORES)])
+    prefix = f"{cores_servicos[servico]}[{timestamp}] {servico:<12}\033[0m"
+    return f"{prefix}: {descrever_evento(evento)}"
 
 
-def deve_exibir_log(servico, mensagem):
+def deve_exibir_log(evento):
     """
     Determina se um log deve ser exibido, evitando mensagens duplicadas.
     
-    Args:
-        servico: Nome do serviço que gerou o log
-        mensagem: Conteúdo da mensagem
-        
     Returns:
         Boolean indicando se o log deve ser exibido
     """
-    global recent_logs
-    
     # Evita mensagens repetidas de join
-    if "Join enviado" in mensagem:
-        key = f"{servico}_join"
-        if key in recent_logs and time.time() - recent_logs[key] < LOG_COOLDOWN:
+    if evento.get("msg", "").startswith("Join enviado"):
+        key = f"{evento['servico']}_join"
+        if key in recent_logs and evento["ts"] - recent_logs[key] < LOG_COOLDOWN:
             return False
-        recent_logs[key] = time.time()
-        return True
+        recent_logs[key] = evento["ts"]
     
     # Exibe todas as outras mensagens
     return True
 
 
-def processar_buffer_logs():
+class Intercalador:
     """
-    Processa o buffer de logs periodicamente para exibição organizada.
-    Garante um intervalo mínimo entre mensagens para melhor leitura.
+    Intercala os eventos de vários nós pela ordem dos seus instantes originais.
+    
+    Os eventos chegam na ordem em que as fontes os entregam (buffers do
+    docker e dos nós), não na ordem em que aconteceram. Cada evento
+    espera `janela` segundos em um heap por eventos mais antigos de
+    outros nós; um evento que chega depois de a sua janela ter passado
+    sai na hora e é contado em `atrasados`.
     """
-    global last_output_time
     
-    while True:
-        time.sleep(0.1)
-        with log_lock:
-            # Permite um tempo entre as exibições de logs
-            current_time = time.time()
-            if log_buffer and current_time - last_output_time >= 0.2:  # 200ms entre logs
-                mensagem = log_buffer.popleft()
-                print(mensagem)
-                last_output_time = current_time
+    def __init__(self, janela=JANELA_ORDENACAO):
+        self.janela = janela
+        self.atrasados = 0
+        self._heap = []
+        self._ordem = 0  # Desempate estável entre eventos do mesmo instante
+        self._emitido_ate = float("-inf")
+    
+    def adicionar(self, evento):
+        if evento["ts"] < self._emitido_ate:
+            self.atrasados += 1
+        self._ordem += 1
+        heapq.heappush(self._heap, (evento["ts"], self._ordem, evento))
+    
+    def prontos(self, agora):
+        """Retira, em ordem, os eventos cuja janela já passou."""
+        return self._retirar(agora - self.janela)
+    
+    def todos(self):
+        """Retira todos os eventos pendentes (fim da leitura)."""
+        return self._retirar(float("inf"))
+    
+    def _retirar(self, limite):
+        saida = []
+        while self._heap and self._heap[0][0] <= limite:
+            saida.append(heapq.heappop(self._heap)[2])
+        if saida:
+            self._emitido_ate = max(self._emitido_ate, saida[-1]["ts"])
+        return saida
+    
+    def __len__(self):
+        return len(self._heap)
 
 
-def filtrar_e_formatar_linha(servico, linha):
+def ler_compose(fila, parar):
     """
-    Filtra e formata uma linha de log.
+    Lê o fluxo multiplexado de "docker-compose logs -f" de todos os serviços.
+    
+    Os serviços são descobertos pelo próprio fluxo (cada linha traz o
+    nome do contêiner), de modo que réplicas a mais ou a menos no
+    docker-compose.yml aparecem sem configuração. Se o fluxo termina com
+    serviços ainda rodando (contêineres recriados), ele é reaberto a
+    partir da última linha lida.
     
     Args:
-        servico: Nome do serviço que gerou o log
-        linha: Linha de log bruta
-        
-    Returns:
-        String formatada ou None se a linha deve ser ignorada
+        fila: Fila que recebe os eventos lidos (None marca o fim)
+        parar: threading.Event que encerra a leitura
     """
-    linha = linha.strip()
-    if not linha:
-        return None
-        
-    # Ignora linhas sem informações úteis
-    if linha.startswith('[') and ']' in linha and len(linha) < 10:
-        return None
-        
-    # Verifica se deve exibir este log
-    if deve_exibir_log(servico, linha):
-        return formatar_log(servico, linha)
+    desde = None
+    while not parar.is_set():
+        comando = ["docker-compose", "logs", "-f", "--no-color", "--timestamps"]
+        if desde:
+            comando += ["--since", desde]
+        try:
+            proc = subprocess.Popen(comando, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    text=True, errors="replace")
+        except OSError as e:
+            fila.put({"ts": time.time(), "servico": "main", "nivel": "erro",
+                      "msg": f"[ERRO] Falha ao acompanhar os logs: {e}"})
+            break
+        for linha in proc.stdout:
+            achado = PADRAO_COMPOSE.match(linha.rstrip("\n"))
+            if achado is None:
+                continue
+            servico, carimbo, texto = achado.groups()
+            instante = None
+            if carimbo:
+                instante = instante_docker(carimbo)
+                desde = carimbo + "Z"
+            if texto.strip():
+                fila.put(interpretar_linha(servico, texto, instante))
+            if parar.is_set():
+                break
+        proc.terminate()
+        proc.wait()
+        if parar.is_set() or not servicos_ativos():
+            break
+        time.sleep(1)
+    fila.put(None)
+
+
+def ler_arquivos(fila, caminhos):
+    """
+    Lê logs gravados em arquivos (um por nó, ex.: a saída redirecionada de cada processo).
     
-    return None
+    O serviço de cada linha é o nome do arquivo sem a extensão.
+    """
+    for caminho in caminhos:
+        servico = os.path.splitext(os.path.basename(caminho))[0]
+        with open(caminho, "r", encoding="utf-8", errors="replace") as f:
+            for linha in f:
+                if linha.strip():
+                    fila.put(interpretar_linha(servico, linha.rstrip("\n")))
+    fila.put(None)
 
 
-def acompanhar_logs(servico):
+def ajustar_intervalo(intervalo, eventos, limite):
     """
-    Acompanha os logs de um serviço Docker e os coloca no buffer para processamento.
+    Adapta o intervalo entre quadros à taxa de eventos.
     
-    Args:
-        servico: Nome do serviço Docker a ser monitorado
+    Com pouco tráfego os quadros são frequentes e as linhas aparecem
+    logo; com muito tráfego eles se espaçam até INTERVALO_MAXIMO_QUADRO,
+    e cada quadro leva mais linhas em uma única escrita no terminal.
     """
-    try:
-        proc = subprocess.Popen(
-            ["docker", "logs", "-f", servico],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        while True:
-            linha = proc.stdout.readline()
-            if not linha:
-                break
-                
-            linha_formatada = filtrar_e_formatar_linha(servico, linha)
-            if linha_formatada:
-                with log_lock:
-                    log_buffer.append(linha_formatada)
-                    
-        proc.wait()
-    except Exception as e:
-        with log_lock:
-            log_buffer.append(f"\033[31m[ERRO] Falha ao acompanhar logs de {servico}: {e}\033[0m")
+    if eventos > limite:
+        intervalo *= 1.5
+    elif eventos < limite // 4:
+        intervalo /= 1.5
+    return min(INTERVALO_MAXIMO_QUADRO, max(INTERVALO_MINIMO_QUADRO, intervalo))
 
 
-def acompanhar_todos_logs():
+def montar_quadro(eventos, limite=LINHAS_POR_QUADRO):
     """
-    Cria threads para acompanhar os logs do servidor e de todos os clientes.
-    Organiza a exibição dos logs de forma legível e cronológica.
+    Monta o texto de um quadro da exibição.
+    
+    Acima do limite, as linhas mais antigas do quadro são resumidas em
+    uma linha com a contagem por serviço, em vez de sumirem sem aviso.
+    Avisos e erros são sempre exibidos.
+    
+    Returns:
+        Texto do quadro (vazio se não há linhas)
+    """
+    eventos = [evento for evento in eventos if deve_exibir_log(evento)]
+    linhas = []
+    if len(eventos) > limite:
+        importantes = {id(evento) for evento in eventos if evento.get("nivel") in ("aviso", "erro")}
+        recentes = {id(evento) for evento in eventos[-max(1, limite - len(importantes)):]}
+        exibidos = importantes | recentes
+        omitidos = {}
+        for evento in eventos:
+            if id(evento) not in exibidos:
+                omitidos[evento["servico"]] = omitidos.get(evento["servico"], 0) + 1
+        resumo = ", ".join(f"{servico}: {total}" for servico, total in sorted(omitidos.items()))
+        linhas.append(f"\033[33m... {sum(omitidos.values())} linhas resumidas neste quadro "
+                      f"({resumo})\033[0m")
+        eventos = [evento for evento in eventos if id(evento) in exibidos]
+    linhas += [formatar_log(evento) for evento in eventos]
+    return "\n".join(linhas) + "\n" if linhas else ""
+
+
+def receber_eventos(fila, intercalador, prazo):
     """
-    print("\033[1m[LOG] Iniciando exibição de logs organizada...\033[0m")
-    time.sleep(1)
-    limpar_terminal()
+    Passa os eventos da fila para o intercalador até o prazo (relógio monotônico).
     
-    # Thread para processar e exibir logs do buffer
-    thread_processor = threading.Thread(target=processar_buffer_logs)
-    thread_processor.daemon = True
-    thread_processor.start()
+    Returns:
+        Boolean indicando se as fontes continuam ativas
+    """
+    while True:
+        try:
+            evento = fila.get(timeout=max(0.0, prazo - time.monotonic()))
+        except queue.Empty:
+            return True
+        if evento is None:
+            return False
+        intercalador.adicionar(evento)
+
+
+def exibir_logs(fila, intercalador):
+    """
+    Exibe os eventos em quadros, na ordem original, até o fim das fontes.
     
-    # Threads para capturar logs
-    threads = []
+    Cada quadro é escrito de uma vez; o intervalo entre quadros se adapta
+    à taxa de eventos (ver ajustar_intervalo).
+    """
+    limite = max(LINHAS_POR_QUADRO, shutil.get_terminal_size().lines - 2)
+    intervalo = INTERVALO_MINIMO_QUADRO
+    ativo = True
+    while ativo or len(intercalador):
+        if ativo:
+            ativo = receber_eventos(fila, intercalador, time.monotonic() + intervalo)
+        eventos = intercalador.prontos(time.time()) if ativo else intercalador.todos()
+        quadro = montar_quadro(eventos, limite)
+        if quadro:
+            sys.stdout.write(quadro)
+            sys.stdout.flush()
+        intervalo = ajustar_intervalo(intervalo, len(eventos), limite)
+
+
+def gravar_logs(fila, intercalador, caminho, formato="json", duracao=None):
+    """
+    Grava o fluxo intercalado em um arquivo, sem omitir eventos.
     
-    # Adiciona o acompanhamento do servidor
-    threads.append(threading.Thread(target=acompanhar_logs, args=("chat_server",)))
+    Args:
+        fila: Fila de eventos das fontes
+        intercalador: Intercalador que ordena os eventos
+        caminho: Arquivo de saída
+        formato: "json" (um evento por linha, com o campo "servico") ou "texto"
+        duracao: Segundos de leitura (padrão: até o fim das fontes)
     
-    # Adiciona o acompanhamento dos clientes
-    for i in range(1, 6):  # 5 clientes conforme docker-compose
-        threads.append(threading.Thread(target=acompanhar_logs, args=(f"chatmulticast-client-{i}",)))
+    Returns:
+        Quantidade de eventos gravados
+    """
+    fim = time.monotonic() + duracao if duracao else None
+    gravados = 0
+    ativo = True
+    with open(caminho, "w", encoding="utf-8") as f:
+        while ativo or len(intercalador):
+            if ativo:
+                ativo = receber_eventos(fila, intercalador, time.monotonic() + INTERVALO_MINIMO_QUADRO)
+            if fim is not None and time.monotonic() >= fim:
+                ativo = False
+            eventos = intercalador.prontos(time.time()) if ativo else intercalador.todos()
+            if formato == "texto":
+                f.writelines(f"[{datetime.fromtimestamp(evento['ts']).isoformat(timespec='milliseconds')}] "
+                             f"{evento['servico']}: {descrever_evento(evento)}\n" for evento in eventos)
+            else:
+                f.writelines(json.dumps(evento, ensure_ascii=False, separators=(",", ":")) + "\n"
+                             for evento in eventos)
+            gravados += len(eventos)
+    return gravados
 
-    for thread in threads:
-        thread.daemon = True
-        thread.start()
 
-    # Exibe status inicial
-    print("\033[1;36m==== Sistema de Chat Multicast - Logs Organizados ====\033[0m")
-    print("\033[37mPressione Ctrl+C para encerrar\033[0m\n")
+def acompanhar_todos_logs(args):
+    """
+    Acompanha os logs do servidor e de todos os clientes em um único fluxo.
+    
+    Organiza a exibição dos logs de forma legível e cronológica (pelos
+    instantes originais dos eventos) ou grava o fluxo em um arquivo.
+    """
+    fila = queue.Queue()
+    parar = threading.Event()
+    # Arquivos já estão completos: os eventos são ordenados todos de uma vez no fim
+    intercalador = Intercalador(float("inf") if args.arquivos else args.janela)
+    if args.arquivos:
+        leitor = threading.Thread(target=ler_arquivos, args=(fila, args.arquivos), daemon=True)
+    else:
+        leitor = threading.Thread(target=ler_compose, args=(fila, parar), daemon=True)
+    leitor.start()
     
     try:
-        while True:
-            time.sleep(1)
+        if args.saida:
+            print(f"[LOG] Gravando o fluxo de logs em {args.saida}...")
+            gravados = gravar_logs(fila, intercalador, args.saida, args.formato, args.duracao)
+            print(f"[LOG] {gravados} eventos gravados ({intercalador.atrasados} fora da janela de ordenação).")
+        else:
+            limpar_terminal()
+            print("\033[1;36m==== Sistema de Chat Multicast - Logs Organizados ====\033[0m")
+            print("\033[37mPressione Ctrl+C para encerrar\033[0m\n")
+            exibir_logs(fila, intercalador)
     except KeyboardInterrupt:
         print("\n\033[1;36m==== Encerrando exibição de logs ====\033[0m")
+    finally:
+        parar.set()
 
 
-if __name__ == "__main__":
-    try:
-        # Passo 1: Derrubar serviços existentes
-        derrubar_servicos()
+def analisar_rastros(args):
+    """
+    Reconstrói as linhas do tempo das mensagens e do token e exibe as latências.
+    
+    As etapas vêm dos logs JSON dos nós (arquivos ou contêineres) e, com
+    --replicas, também das mensagens gravadas nas réplicas. Os contêineres
+    são lidos até --duracao segundos ou até Ctrl+C.
+    """
+    rastros = Rastros()
+    for diretorio in args.replicas or []:
+        for msg in mensagens_da_replica(diretorio):
+            rastros.adicionar_mensagem(msg)
+    
+    if args.arquivos or not args.replicas:
+        fila = queue.Queue()
+        parar = threading.Event()
+        if args.arquivos:
+            leitor = threading.Thread(target=ler_arquivos, args=(fila, args.arquivos), daemon=True)
+        else:
+            print("[LOG] Coletando rastros dos serviços (Ctrl+C encerra a coleta)...")
+            leitor = threading.Thread(target=ler_compose, args=(fila, parar), daemon=True)
+        leitor.start()
+        prazo = time.monotonic() + args.duracao if args.duracao else float("inf")
+        try:
+            while True:
+                try:
+                    evento = fila.get(timeout=max(0.0, min(prazo - time.monotonic(), 1.0)))
+                except queue.Empty:
+                    if time.monotonic() >= prazo:
+                        break
+                    continue
+                if evento is None:
+                    break
+                rastros.adicionar_evento(evento)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            parar.set()
+    
+    print("\n".join(relatorio(rastros, args.lentas)))
 
-        # Passo 2: Iniciar os serviços do Docker Compose
-        iniciar_docker_compose()
 
-        # Passo 3: Aguardar inicialização dos contêineres
-        print("\n\033[33m[LOG] Aguardando inicialização dos serviços...\033[0m")
-        time.sleep(5)
+def ler_argumentos(argv=None):
+    """Interpreta a linha de comando."""
+    parser = argparse.ArgumentParser(
+        description="Sobe o chat no Docker Compose e acompanha os logs de todos os nós.")
+    parser.add_argument("--sem-iniciar", action="store_true",
+                        help="Só acompanha os logs dos serviços que já estão rodando")
+    parser.add_argument("--arquivos", nargs="+", metavar="ARQUIVO",
+                        help="Intercala logs gravados em arquivos em vez dos contêineres")
+    parser.add_argument("--saida", help="Grava o fluxo intercalado neste arquivo (modo não interativo)")
+    parser.add_argument("--formato", choices=("json", "texto"), default="json",
+                        help="Formato do arquivo de saída")
+    parser.add_argument("--duracao", type=float, help="Segundos de leitura no modo não interativo")
+    parser.add_argument("--janela", type=float, default=JANELA_ORDENACAO,
+                        help="Segundos de espera para ordenar eventos de nós diferentes")
+    parser.add_argument("--rastros", action="store_true",
+                        help="Reconstrói os rastros das mensagens e do token e exibe as latências")
+    parser.add_argument("--replicas", nargs="+", metavar="DIRETORIO",
+                        help="Com --rastros, lê também os rastros gravados nestas réplicas")
+    parser.add_argument("--lentas", type=int, default=5,
+                        help="Com --rastros, mensagens e voltas do token mais lentas detalhadas")
+    return parser.parse_args(argv)
 
-        # Passo 4: Acompanhar logs do servidor e dos clientes
-        acompanhar_todos_logs()
 
+if __name__ == "__main__":
+    args = ler_argumentos()
+    try:
+        if not args.arquivos and not args.sem_iniciar and not args.rastros:
+            # Passo 1: Derrubar serviços existentes
+            derrubar_servicos()
+            
+            # Passo 2: Iniciar os serviços do Docker Compose
+            iniciar_docker_compose()
+            
+            # Passo 3: Aguardar inicialização dos contêineres
+            print("\n\033[33m[LOG] Aguardando inicialização dos serviços...\033[0m")
+            time.sleep(5)
+        
+        # Passo 4: Acompanhar logs do servidor e dos clientes (ou analisar os rastros)
+        if args.rastros:
+            analisar_rastros(args)
+        else:
+            acompanhar_todos_logs(args)
+    
     except Exception as e:
-        print(f"\033[31m[ERRO] Ocorreu um erro inesperado: {e}\033[0m")
\ No newline at end of file
+        print(f"\033[31m[ERRO] Ocorreu um erro inesperado: {e}\033[0m")
@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import partial
+
+from registro import log
+
+# Exposição das métricas (vazio = desligada)
+PORTA_METRICAS = os.environ.get("PORTA_METRICAS", "")  # Endpoint HTTP no formato do Prometheus
+HOST_METRICAS = os.environ.get("HOST_METRICAS", "127.0.0.1")
+ARQUIVO_METRICAS = os.environ.get("ARQUIVO_METRICAS", "")  # Arquivo JSON gravado periodicamente
+INTERVALO_METRICAS = float(os.environ.get("INTERVALO_METRICAS", "10"))  # Segundos
+PREFIXO_METRICAS = "chat_"
+# Limites (segundos) dos histogramas de latência: de 10 µs a 10 s
+LIMITES_LATENCIA = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _rotulos(chave):
+    if not chave:
+        return ""
+    return "{" + ",".join(f'{nome}="{valor}"' for nome, valor in chave) + "}"
+
+
+def _formatar(valor):
+    return repr(float(valor)) if valor != float("inf") else "+Inf"
+
+
+class Contador:
+    """Contador monotônico com rótulos (ex.: mensagens recebidas por tipo)."""
+
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor=1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def amostras(self):
+        """Retorna [(sufixo, rótulos, valor)] no formato do Prometheus."""
+        with self._lock:
+            return [("", chave, valor) for chave, valor in sorted(self._valores.items())]
+
+    def instantaneo(self):
+        with self._lock:
+            return {_rotulos(chave) or "total": valor for chave, valor in sorted(self._valores.items())}
+
+
+class Histograma:
+    """
+    Histograma de latências com limites fixos e rótulos.
+
+    Cada observação cai no primeiro limite maior ou igual a ela; a
+    exposição acumula as contagens, como o Prometheus espera.
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, limites=LIMITES_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = tuple(limites)
+        self._series = {}  # rótulos -> [contagens por limite (+ estouro), soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        indice = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    @contextmanager
+    def medir(self, **rotulos):
+        """Mede a duração do bloco `with` e a registra."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def amostras(self):
+        resultado = []
+        with self._lock:
+            series = [(chave, list(contagens), soma, total)
+                      for chave, (contagens, soma, total) in sorted(self._series.items())]
+        for chave, contagens, soma, total in series:
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), contagens):
+                acumulado += contagem
+                resultado.append(("_bucket", chave + (("le", _formatar(limite)),), acumulado))
+            resultado.append(("_sum", chave, soma))
+            resultado.append(("_count", chave, total))
+        return resultado
+
+    def quantil(self, q, **rotulos):
+        """Estimativa de um quantil pelo limite do balde que o contém (None sem amostras)."""
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None or not serie[2]:
+                return None
+            contagens, _, total = serie[0], serie[1], serie[2]
+            alvo = q * total
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), contagens):
+                acumulado += contagem
+                if acumulado >= alvo:
+                    return limite
+        return float("inf")
+
+    def instantaneo(self):
+        with self._lock:
+            chaves = sorted(self._series)
+            totais = {chave: (self._series[chave][1], self._series[chave][2]) for chave in chaves}
+        resumo = {}
+        for chave in chaves:
+            soma, total = totais[chave]
+            rotulos = dict(chave)
+            resumo[_rotulos(chave) or "total"] = {
+                "amostras": total, "media": soma / total if total else None,
+                "p50": self.quantil(0.5, **rotulos), "p99": self.quantil(0.99, **rotulos)}
+        return resumo
+
+
+class Registro:
+    """Conjunto das métricas de um processo."""
+
+    def __init__(self, prefixo=PREFIXO_METRICAS):
+        self.prefixo = prefixo
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _obter(self, classe, nome, ajuda, *args):
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(self.prefixo + nome, ajuda, *args)
+            return metrica
+
+    def contador(self, nome, ajuda):
+        """Retorna (criando se preciso) um contador."""
+        return self._obter(Contador, nome, ajuda)
+
+    def histograma(self, nome, ajuda, limites=LIMITES_LATENCIA):
+        """Retorna (criando se preciso) um histograma."""
+        return self._obter(Histograma, nome, ajuda, limites)
+
+    def texto(self):
+        """Exposição no formato de texto do Prometheus (versão 0.0.4)."""
+        linhas = []
+        with self._lock:
+            metricas = list(self._metricas.values())
+        for metrica in metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            for sufixo, chave, valor in metrica.amostras():
+                linhas.append(f"{metrica.nome}{sufixo}{_rotulos(chave)} {_formatar(valor)}")
+        return "\n".join(linhas) + "\n"
+
+    def instantaneo(self):
+        """Resumo das métricas em um dicionário serializável (arquivo de estatísticas)."""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return {metrica.nome: metrica.instantaneo() for metrica in metricas}
+
+
+REGISTRO = Registro()  # Registro global do processo
+
+# Métricas comuns ao servidor e aos clientes
+MENSAGENS_RECEBIDAS = REGISTRO.contador("mensagens_recebidas_total",
+                                        "Mensagens recebidas (datagramas remontados) por tipo")
+BYTES_RECEBIDOS = REGISTRO.contador("bytes_recebidos_total", "Bytes recebidos por tipo de mensagem")
+MENSAGENS_ENVIADAS = REGISTRO.contador("mensagens_enviadas_total", "Mensagens enviadas por tipo")
+BYTES_ENVIADOS = REGISTRO.contador("bytes_enviados_total", "Bytes enviados por tipo de mensagem")
+ERROS_DECODIFICACAO = REGISTRO.contador("erros_decodificacao_total",
+                                        "Datagramas que não puderam ser decodificados")
+TEMPO_HANDLER = REGISTRO.histograma("handler_segundos",
+                                    "Tempo de processamento das mensagens por tipo")
+ESPERA_LOCK = REGISTRO.histograma("espera_lock_segundos", "Tempo de espera para adquirir cada lock")
+ESCRITA_DISCO = REGISTRO.histograma("escrita_disco_segundos",
+                                    "Latência das escritas em disco por operação")
+POSSE_TOKEN = REGISTRO.histograma("posse_token_segundos", "Tempo de posse do token por canal")
+RECONCILIACOES = REGISTRO.histograma("reconciliacao_segundos",
+                                     "Duração das rodadas de anti-entropia por canal")
+MENSAGENS_GRAVADAS = REGISTRO.contador("mensagens_gravadas_total", "Mensagens gravadas na réplica por canal")
+DUPLICATAS = REGISTRO.contador("duplicatas_total", "Mensagens rejeitadas por já estarem na réplica")
+CHECKPOINTS = REGISTRO.contador("checkpoints_total", "Checkpoints pedidos por canal")
+
+
+class LockMedido:
+    """
+    threading.Lock que registra o tempo de espera de cada aquisição.
+
+    Substitui o lock original nos blocos `with`, acrescentando a espera
+    ao histograma espera_lock_segundos com o rótulo `lock`.
+    """
+
+    def __init__(self, nome):
+        self.nome = nome
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        inicio = time.perf_counter()
+        self._lock.acquire()
+        ESPERA_LOCK.observar(time.perf_counter() - inicio, lock=self.nome)
+        return self
+
+    def __exit__(self, *excecao):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+
+async def iniciar_servidor_metricas(porta, host=HOST_METRICAS, registro=REGISTRO):
+    """
+    Abre o endpoint HTTP das métricas (GET /metrics, formato do Prometheus).
+
+    Args:
+        porta: Porta TCP
+        host: Endereço de escuta (padrão: só a máquina local)
+        registro: Registro exposto
+    """
+    async def tratar_conexao(reader, writer):
+        try:
+            requisicao = await reader.readline()
+            while (await reader.readline()).strip():
+                pass  # Cabeçalhos ignorados
+            partes = requisicao.decode(errors="replace").split()
+            if len(partes) >= 2 and partes[0] == "GET" and partes[1].split("?")[0] == "/metrics":
+                corpo = registro.texto().encode()
+                status = "200 OK"
+                tipo = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                corpo = b"Use GET /metrics\n"
+                status = "404 Not Found"
+                tipo = "text/plain; charset=utf-8"
+            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {tipo}\r\n"
+                         f"Content-Length: {len(corpo)}\r\nConnection: close\r\n\r\n".encode() + corpo)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    await asyncio.start_server(tratar_conexao, host, porta)
+    log.info("metricas_servidor", "Métricas no formato do Prometheus", url=f"http://{host}:{porta}/metrics")
+
+
+def salvar_metricas(caminho, registro=REGISTRO):
+    """Grava (atomicamente) o resumo das métricas em um arquivo JSON."""
+    dados = {"instante": time.time(), "metricas": registro.instantaneo()}
+    with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(dados, f, indent=1)
+    os.replace(caminho + ".tmp", caminho)
+
+
+async def iniciar_metricas(nucleo, porta=PORTA_METRICAS, arquivo=ARQUIVO_METRICAS,
+                           intervalo=INTERVALO_METRICAS):
+    """
+    Liga as saídas de métricas configuradas de um nó.
+
+    Args:
+        nucleo: Núcleo que agenda a gravação periódica (na sua thread de disco)
+        porta: Porta do endpoint HTTP (vazio = desligado)
+        arquivo: Arquivo JSON de estatísticas (vazio = desligado)
+        intervalo: Segundos entre gravações do arquivo
+    """
+    if porta:
+        await iniciar_servidor_metricas(int(porta))
+    if arquivo:
+        nucleo.periodico(intervalo, partial(nucleo.em_disco, salvar_metricas, arquivo))
+        log.info("metricas_arquivo", "Estatísticas gravadas periodicamente", arquivo=arquivo, intervalo=intervalo)
@@ -0,0 +1,228 @@
+import os
+import random
+import threading
+from collections import OrderedDict
+
+# Reparo de perdas por confirmação negativa (NACK)
+NACK_ATRASO = float(os.environ.get("NACK_ATRASO", "0.05"))  # Espera aleatória máxima antes do NACK (s)
+NACK_ESPERA = float(os.environ.get("NACK_ESPERA", "0.3"))  # Espera pelo reparo antes de repetir (s)
+NACK_TENTATIVAS = 3  # NACKs por mensagem antes de deixar o reparo para a anti-entropia
+NACK_MAXIMO = 64  # Lacunas maiores (nó que esteve fora) ficam para a anti-entropia
+BUFFER_RETRANSMISSAO = int(os.environ.get("BUFFER_RETRANSMISSAO", "1024"))  # Mensagens por canal
+INTERVALO_REPARO = 0.1  # Intervalo mínimo entre retransmissões da mesma mensagem (s)
+# Origem fictícia da numeração global do modo sequenciador (gseq)
+ORIGEM_SEQUENCIADOR = "#gseq"
+
+
+def sequencias(msg):
+    """
+    Números de sequência de uma mensagem, por origem.
+
+    Toda mensagem de chat tem a sequência do seu remetente; no modo
+    sequenciador ela tem também o gseq, tratado como a sequência de uma
+    origem à parte (o servidor).
+
+    Returns:
+        list: Pares (origem, seq)
+    """
+    pares = []
+    if isinstance(msg.get("seq"), int) and msg.get("sender") is not None:
+        pares.append((msg["sender"], msg["seq"]))
+    if isinstance(msg.get("gseq"), int):
+        pares.append((ORIGEM_SEQUENCIADOR, msg["gseq"]))
+    return pares
+
+
+class BufferRetransmissao:
+    """
+    Últimas mensagens gravadas de um canal, para responder aos NACKs.
+
+    Guarda até `capacidade` mensagens (as mais antigas saem primeiro),
+    indexadas por (origem, seq); no modo sequenciador uma mesma mensagem
+    é encontrada pelas duas origens, mas ocupa uma posição só. Uma
+    mensagem que já saiu do buffer não é retransmitida: a lacuna é
+    fechada pela anti-entropia. Pode ser usado pela thread de disco
+    (gravação) e pelo laço (NACKs).
+    """
+
+    def __init__(self, capacidade=BUFFER_RETRANSMISSAO):
+        self.capacidade = capacidade
+        self._mensagens = OrderedDict()  # primeira (origem, seq) -> (mensagem, todas as chaves)
+        self._chaves = {}  # (origem, seq) -> primeira (origem, seq) da mensagem
+        self._retransmitidas = {}  # (origem, seq) -> instante da última retransmissão
+        self._lock = threading.Lock()
+
+    def guardar(self, msg):
+        """Guarda uma mensagem gravada (sob todas as suas origens)."""
+        chaves = sequencias(msg)
+        if not chaves:
+            return
+        with self._lock:
+            self._remover(chaves[0])
+            self._mensagens[chaves[0]] = (msg, chaves)
+            for chave in chaves:
+                self._chaves[chave] = chaves[0]
+            while len(self._mensagens) > self.capacidade:
+                self._remover(next(iter(self._mensagens)))
+
+    def _remover(self, principal):
+        """Retira uma mensagem e todas as suas chaves (com o lock já obtido)."""
+        entrada = self._mensagens.pop(principal, None)
+        if entrada is None:
+            return
+        for chave in entrada[1]:
+            if self._chaves.get(chave) == principal:
+                del self._chaves[chave]
+                self._retransmitidas.pop(chave, None)
+
+    def buscar(self, faltantes, agora):
+        """
+        Separa as mensagens pedidas em um NACK que devem ser retransmitidas.
+
+        Mensagens retransmitidas há menos de INTERVALO_REPARO segundos são
+        omitidas: vários receptores que perderam o mesmo datagrama são
+        atendidos por uma única retransmissão multicast.
+
+        Args:
+            faltantes: {origem: [seqs]} pedidos no NACK
+            agora: Instante atual (relógio do laço)
+
+        Returns:
+            tuple: (mensagens a retransmitir, quantidade fora do buffer)
+        """
+        mensagens = []
+        ausentes = 0
+        vistas = set()
+        with self._lock:
+            for origem, seqs in faltantes.items():
+                for seq in seqs:
+                    chave = (origem, seq)
+                    principal = self._chaves.get(chave)
+                    if principal is None:
+                        ausentes += 1
+                        continue
+                    if agora - self._retransmitidas.get(chave, float("-inf")) < INTERVALO_REPARO:
+                        continue
+                    self._retransmitidas[chave] = agora
+                    if principal not in vistas:
+                        vistas.add(principal)
+                        mensagens.append(self._mensagens[principal][0])
+        return mensagens, ausentes
+
+    def __len__(self):
+        return len(self._mensagens)
+
+
+class ReparoNack:
+    """
+    Detecção de lacunas e agendamento dos NACKs de um canal (receptor).
+
+    Cada origem numera as suas mensagens em sequência; uma mensagem com
+    seq acima do próximo esperado revela as anteriores como perdidas. O
+    NACK de cada lacuna só sai depois de uma espera aleatória de até
+    NACK_ATRASO segundos, e é suprimido se nesse meio-tempo outro nó
+    enviar ao grupo um NACK pelas mesmas mensagens: em uma perda em
+    rajada, poucos receptores pedem e todos recebem a retransmissão. Sem
+    reparo em NACK_ESPERA segundos o NACK é repetido, até
+    NACK_TENTATIVAS vezes; depois disso (ou em lacunas maiores que
+    NACK_MAXIMO) a mensagem fica para a anti-entropia.
+
+    Atributos:
+        maiores: Maior seq visto de cada origem
+        pendentes: (origem, seq) -> [prazo do próximo NACK, NACKs enviados]
+    """
+
+    def __init__(self, atraso=NACK_ATRASO, espera=NACK_ESPERA, aleatorio=random.random):
+        """
+        Args:
+            atraso: Espera aleatória máxima antes do primeiro NACK
+            espera: Espera pelo reparo antes de repetir o NACK
+            aleatorio: Função que retorna um número em [0, 1)
+        """
+        self.atraso = atraso
+        self.espera = espera
+        self._aleatorio = aleatorio
+        self.maiores = {}
+        self.pendentes = {}
+
+    def base(self, digest):
+        """
+        Parte das marcas d'água da réplica local, para que a primeira
+        mensagem recebida de cada origem já revele as lacunas.
+        """
+        for origem, marca in digest.items():
+            self.maiores[origem] = max(self.maiores.get(origem, 0), marca)
+
+    def receber(self, origem, seq, agora):
+        """
+        Registra uma mensagem recebida.
+
+        Args:
+            origem: Remetente (ou ORIGEM_SEQUENCIADOR)
+            seq: Sequência da mensagem na origem
+            agora: Instante atual (relógio do laço)
+
+        Returns:
+            int: Quantidade de lacunas novas agendadas para NACK
+        """
+        self.pendentes.pop((origem, seq), None)
+        maior = self.maiores.get(origem, 0)  # As sequências começam em 1
+        if seq <= maior:
+            return 0
+        self.maiores[origem] = seq
+        if seq - maior - 1 > NACK_MAXIMO:
+            # Nó que esteve fora ou entrou depois: lacuna grande demais
+            return 0
+        for faltante in range(maior + 1, seq):
+            self.pendentes[(origem, faltante)] = [agora + self._aleatorio() * self.atraso, 0]
+        return seq - maior - 1
+
+    def descartar(self, origem, seq):
+        """
+        Registra uma mensagem chegada por outro caminho (sincronização),
+        fechando a sua lacuna sem usá-la para detectar outras: as faixas
+        da sincronização não são contíguas na numeração global.
+        """
+        self.pendentes.pop((origem, seq), None)
+
+    def observar_nack(self, faltantes, agora):
+        """
+        Suprime os NACKs próprios cobertos pelo NACK de outro nó.
+
+        O reparo pedido pelo outro nó também chega aqui (a retransmissão
+        é multicast); o NACK próprio só sai se ele não chegar a tempo.
+        """
+        for origem, seqs in faltantes.items():
+            for seq in seqs:
+                pendente = self.pendentes.get((origem, seq))
+                if pendente is not None:
+                    pendente[0] = max(pendente[0], agora + self.espera)
+
+    def vencidos(self, agora):
+        """
+        Retira as lacunas cujo NACK deve ser enviado agora.
+
+        As lacunas retiradas são reagendadas para a próxima tentativa; as
+        que esgotaram as tentativas são abandonadas.
+
+        Returns:
+            dict: {origem: [seqs]} a pedir no NACK
+        """
+        faltantes = {}
+        for chave, pendente in list(self.pendentes.items()):
+            if pendente[0] > agora:
+                continue
+            if pendente[1] >= NACK_TENTATIVAS:
+                del self.pendentes[chave]
+                continue
+            pendente[0] = agora + self.espera
+            pendente[1] += 1
+            origem, seq = chave
+            faltantes.setdefault(origem, []).append(seq)
+        for seqs in faltantes.values():
+            seqs.sort()
+        return faltantes
+
+    def proximo_prazo(self):
+        """Retorna o prazo do próximo NACK pendente (None se não há lacunas)."""
+        return min((pendente[0] for pendente in self.pendentes.values()), default=None)
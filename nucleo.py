@@ -0,0 +1,263 @@
+import sys
+import time
+import socket
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import protocolo
+import transporte
+from emulacao import criar_emulador
+from metricas import (BYTES_ENVIADOS, BYTES_RECEBIDOS, ERROS_DECODIFICACAO, MENSAGENS_ENVIADAS,
+                      MENSAGENS_RECEBIDAS, TEMPO_HANDLER)
+from registro import log
+
+# Opção do Linux que limita a entrega aos grupos em que o próprio socket
+# entrou (sem ela, um socket recebe os grupos de todos os sockets da porta)
+IP_MULTICAST_ALL = getattr(socket, "IP_MULTICAST_ALL", 49)
+
+
+def criar_socket_multicast(grupo, porta, ttl=2):
+    """
+    Cria o socket UDP associado a um grupo multicast.
+
+    Args:
+        grupo: Endereço do grupo multicast
+        porta: Porta UDP
+        ttl: TTL dos datagramas multicast enviados
+
+    Returns:
+        socket.socket: Socket não bloqueante pronto para o laço de eventos
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("", porta))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    sock.setsockopt(socket.IPPROTO_IP,
+                    socket.IP_ADD_MEMBERSHIP,
+                    socket.inet_aton(grupo) + socket.inet_aton("0.0.0.0"))
+    if sys.platform.startswith("linux"):
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, IP_MULTICAST_ALL, 0)
+        except OSError:
+            pass
+    sock.setblocking(False)
+    return sock
+
+
+class NucleoDatagramas(asyncio.DatagramProtocol):
+    """
+    Núcleo de rede assíncrono usado pelo servidor e pelos clientes.
+
+    Recebe datagramas no laço de eventos, remonta fragmentos, decodifica
+    a mensagem (JSON ou binária, ver protocolo.py) e despacha cada mensagem para o handler registrado para o seu
+    tipo. Handlers podem ser funções comuns (executadas direto no laço)
+    ou corrotinas (executadas como tarefas independentes, de modo que uma
+    mensagem lenta não atrasa as seguintes).
+
+    Escritas em disco são enviadas para uma única thread dedicada, o que
+    tira a E/S do laço e preserva a ordem das gravações.
+
+    Latência, perda e reordenação artificiais são aplicadas por um
+    EmuladorRede (ver emulacao.py) na entrada e na saída de datagramas.
+
+    Mensagens e bytes recebidos e enviados, erros de decodificação e o
+    tempo de cada handler são contados por tipo (ver metricas.py).
+
+    O grupo de um canal é derivado de um resumo curto do nome, e dois
+    canais podem cair no mesmo grupo. Por isso o núcleo de um canal leva
+    o nome dele no campo "canal" de cada mensagem enviada ao grupo e
+    descarta as recebidas de outro canal antes de despachá-las.
+    """
+
+    def __init__(self, nome, destino, emulacao=None, disco=None, canal=None):
+        """
+        Args:
+            nome: Identificação do nó nos logs
+            destino: Endereço (grupo, porta) padrão dos envios
+            emulacao: Perfil de emulação de rede (padrão: EMULACAO_REDE)
+            disco: Executor de disco compartilhado com outros núcleos do
+                mesmo nó (padrão: uma thread própria)
+            canal: Nome do canal do grupo (None no canal padrão, cujo
+                grupo é exclusivo, e em grupos que não são de canal)
+        """
+        self.nome = nome
+        self.destino = destino
+        self.canal = canal
+        self.emulacao = emulacao
+        self.emulador = None
+        self.formato = protocolo.FORMATO_JSON  # Formato usado nos envios
+        self.transport = None
+        self.loop = None
+        self._handlers = {}
+        self._tarefas = set()
+        self._remontador = transporte.Remontador()
+        self._disco_proprio = disco is None
+        self._disco = disco or ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"disco-{nome}")
+
+    def registrar(self, tipo, handler, bruto=False):
+        """
+        Associa um handler a um tipo de mensagem.
+
+        Args:
+            tipo: Valor do campo "type" das mensagens
+            handler: Função ou corrotina com assinatura handler(msg, origem)
+            bruto: Se True, o handler recebe também o payload original,
+                handler(msg, origem, payload), para repassá-lo sem recodificar
+        """
+        self._handlers[tipo] = (handler, bruto)
+
+    async def iniciar(self, sock):
+        """
+        Associa o núcleo a um socket já configurado.
+
+        Args:
+            sock: Socket UDP (ver criar_socket_multicast)
+        """
+        self.loop = asyncio.get_running_loop()
+        self.emulador = criar_emulador(self.loop, self.emulacao)
+        await self.loop.create_datagram_endpoint(lambda: self, sock=sock)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self.emulador is None:
+            self._processar(data, addr)
+        else:
+            self.emulador.receber(self._processar, data, addr)
+
+    def _processar(self, data, addr):
+        """Remonta, decodifica e despacha um datagrama recebido."""
+        payload = self._remontador.receber(data, addr)
+        if payload is None:
+            return
+        try:
+            msg = protocolo.decodificar(payload)
+        except (ValueError, UnicodeDecodeError) as e:
+            ERROS_DECODIFICACAO.incrementar()
+            log.aviso("decodificacao", "Erro ao decodificar mensagem", nucleo=self.nome, erro=str(e))
+            return
+        if not isinstance(msg, dict):
+            return
+        if msg.get("canal") != self.canal:
+            log.debug("canal_alheio", "Mensagem de outro canal descartada", nucleo=self.nome,
+                      canal=msg.get("canal"))
+            return
+
+        tipo = msg.get("type", "chat")
+        MENSAGENS_RECEBIDAS.incrementar(tipo=tipo)
+        BYTES_RECEBIDOS.incrementar(len(payload), tipo=tipo)
+        registro = self._handlers.get(tipo)
+        if registro is None:
+            return
+        handler, bruto = registro
+        args = (msg, addr, payload) if bruto else (msg, addr)
+        if asyncio.iscoroutinefunction(handler):
+            self.tarefa(self._executar(tipo, handler, *args))
+        else:
+            inicio = time.perf_counter()
+            try:
+                handler(*args)
+            except Exception as e:
+                log.erro("handler", "Erro ao processar mensagem", nucleo=self.nome, tipo=tipo, erro=str(e))
+            TEMPO_HANDLER.observar(time.perf_counter() - inicio, tipo=tipo)
+
+    def error_received(self, exc):
+        log.erro("socket", "Erro no socket", nucleo=self.nome, erro=str(exc))
+
+    async def _executar(self, tipo, handler, *args):
+        """Executa um handler assíncrono isolando suas exceções."""
+        inicio = time.perf_counter()
+        try:
+            await handler(*args)
+        except Exception as e:
+            log.erro("handler", "Erro ao processar mensagem", nucleo=self.nome, tipo=tipo, erro=str(e))
+        TEMPO_HANDLER.observar(time.perf_counter() - inicio, tipo=tipo)
+
+    def tarefa(self, corrotina):
+        """
+        Agenda uma corrotina mantendo referência até que ela termine.
+
+        Returns:
+            asyncio.Task criada
+        """
+        tarefa = self.loop.create_task(corrotina)
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+        return tarefa
+
+    def enviar(self, msg, destino=None):
+        """
+        Serializa (no formato negociado) e envia uma mensagem.
+
+        Args:
+            msg: Objeto de mensagem
+            destino: Endereço de destino (padrão: grupo multicast do nó)
+        """
+        if self.canal is not None and destino is None and "canal" not in msg:
+            msg = dict(msg, canal=self.canal)
+        self.enviar_bruto(protocolo.codificar(msg, self.formato), destino, msg.get("type", "chat"))
+
+    def enviar_bruto(self, payload, destino=None, tipo="repasse"):
+        """
+        Envia um payload já serializado, fragmentando se necessário.
+
+        Args:
+            payload: bytes de uma mensagem codificada
+            destino: Endereço de destino (padrão: grupo multicast do nó)
+            tipo: Rótulo do envio nas métricas (payloads brutos são repasses)
+        """
+        destino = destino or self.destino
+        MENSAGENS_ENVIADAS.incrementar(tipo=tipo)
+        BYTES_ENVIADOS.incrementar(len(payload), tipo=tipo)
+        for fragmento in transporte.fragmentar(payload):
+            if self.emulador is None:
+                self.transport.sendto(fragmento, destino)
+            else:
+                self.emulador.enviar(self.transport.sendto, fragmento, destino)
+
+    def agendar(self, atraso, funcao, *args):
+        """
+        Executa uma função no laço após um atraso, sem bloquear.
+
+        Returns:
+            asyncio.TimerHandle que pode ser cancelado
+        """
+        return self.loop.call_later(atraso, funcao, *args)
+
+    async def em_disco(self, funcao, *args):
+        """
+        Executa uma função de E/S de disco na thread dedicada.
+
+        Returns:
+            O valor retornado pela função
+        """
+        return await self.loop.run_in_executor(self._disco, funcao, *args)
+
+    def periodico(self, intervalo, funcao):
+        """
+        Executa uma corrotina periodicamente.
+
+        Args:
+            intervalo: Segundos entre execuções
+            funcao: Corrotina sem argumentos
+
+        Returns:
+            asyncio.Task responsável pela repetição
+        """
+        async def repetir():
+            while True:
+                await asyncio.sleep(intervalo)
+                try:
+                    await funcao()
+                except Exception as e:
+                    log.erro("periodico", "Erro em tarefa periódica", nucleo=self.nome, erro=str(e))
+
+        return self.tarefa(repetir())
+
+    def fechar(self):
+        """Encerra o transporte e a thread de disco (se não é compartilhada)."""
+        if self.transport is not None:
+            self.transport.close()
+        if self._disco_proprio:
+            self._disco.shutdown(wait=True)
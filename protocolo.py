@@ -0,0 +1,201 @@
+import json
+import struct
+
+# Formatos de serialização suportados
+FORMATO_JSON = "json"
+FORMATO_BINARIO = "bin3"
+FORMATOS_SUPORTADOS = [FORMATO_BINARIO, FORMATO_JSON]
+
+# Cabeçalho fixo: marcador, versão, tipo, flags, remetente (8 bytes), sequência
+MARCADOR_BINARIO = 0xC7
+VERSAO_BINARIA = 3  # Versão 3: token carrega a época do anel e a geração
+CABECALHO = struct.Struct("!BBBB8sI")
+TAMANHO_EXTRAS = struct.Struct("!H")
+TAMANHO_ID = 8
+
+# Flags do cabeçalho
+FLAG_SEQ = 0x01     # Campo "seq" presente no cabeçalho
+FLAG_EXTRAS = 0x02  # Corpo contém campos adicionais em JSON compacto
+
+# Códigos de tipo e esquema do corpo de cada tipo:
+# (campos fixos [(nome, formato struct)], campo de texto livre no fim do corpo)
+TIPOS = {
+    "join": (1, (), None),
+    "neighbors": (2, (), None),
+    "token": (3, (("next", "8s"), ("epoca", "I"), ("geracao", "I")), None),
+    "chat": (4, (("timestamp", "d"),), "content"),
+    "digest": (5, (), None),
+    "sync_req": (6, (), None),
+    "sync": (7, (), None),
+    "lote": (8, (), None),
+}
+TIPOS_POR_CODIGO = {codigo: nome for nome, (codigo, _, _) in TIPOS.items()}
+_ESTRUTURAS = {nome: struct.Struct("!" + "".join(fmt for _, fmt in campos))
+               for nome, (_, campos, _) in TIPOS.items()}
+_CAMPOS_CABECALHO = ("type", "sender", "seq")
+
+
+def _id_binario(valor):
+    """Converte um ID de nó para o campo de 8 bytes, ou None se não couber."""
+    if not isinstance(valor, str):
+        return None
+    try:
+        dados = valor.encode("ascii")
+    except UnicodeEncodeError:
+        return None
+    if len(dados) > TAMANHO_ID or b"\0" in dados:
+        return None
+    return dados
+
+
+def _codificar_binario(msg):
+    """
+    Codifica uma mensagem no formato binário.
+
+    Returns:
+        bytes, ou None se a mensagem não se encaixa no esquema do seu tipo
+    """
+    tipo = msg.get("type", "chat")
+    if tipo not in TIPOS:
+        return None
+    codigo, campos, campo_texto = TIPOS[tipo]
+
+    remetente = _id_binario(msg.get("sender"))
+    if remetente is None:
+        return None
+    flags = 0
+    seq = msg.get("seq", 0)
+    if "seq" in msg:
+        if not isinstance(seq, int) or not 0 <= seq <= 0xFFFFFFFF:
+            return None
+        flags |= FLAG_SEQ
+
+    valores = []
+    for nome, fmt in campos:
+        valor = msg.get(nome)
+        if fmt == "8s":
+            valor = _id_binario(valor)
+            if valor is None:
+                return None
+        elif fmt == "I":
+            if not isinstance(valor, int) or not 0 <= valor <= 0xFFFFFFFF:
+                return None
+        elif not isinstance(valor, (int, float)):
+            return None
+        valores.append(valor)
+
+    texto = b""
+    if campo_texto is not None:
+        if not isinstance(msg.get(campo_texto), str):
+            return None
+        texto = msg[campo_texto].encode()
+
+    usados = set(_CAMPOS_CABECALHO)
+    usados.update(nome for nome, _ in campos)
+    usados.add(campo_texto)
+    extras = {k: v for k, v in msg.items() if k not in usados}
+    corpo_extras = b""
+    if extras:
+        corpo_extras = json.dumps(extras, separators=(",", ":")).encode()
+        if len(corpo_extras) > 0xFFFF and campo_texto is not None:
+            return None
+        flags |= FLAG_EXTRAS
+        if campo_texto is not None:
+            corpo_extras = TAMANHO_EXTRAS.pack(len(corpo_extras)) + corpo_extras
+
+    return b"".join((
+        CABECALHO.pack(MARCADOR_BINARIO, VERSAO_BINARIA, codigo, flags, remetente, seq),
+        _ESTRUTURAS[tipo].pack(*valores),
+        corpo_extras,
+        texto,
+    ))
+
+
+def codificar(msg, formato=FORMATO_JSON):
+    """
+    Serializa uma mensagem para envio.
+
+    No formato binário, mensagens que não se encaixam no esquema do seu
+    tipo (ex.: IDs longos) são enviadas em JSON, que todo nó decodifica.
+
+    Args:
+        msg: Objeto de mensagem
+        formato: FORMATO_JSON ou FORMATO_BINARIO
+
+    Returns:
+        bytes prontos para o transporte
+    """
+    if formato == FORMATO_BINARIO:
+        dados = _codificar_binario(msg)
+        if dados is not None:
+            return dados
+    return json.dumps(msg).encode()
+
+
+def decodificar(dados):
+    """
+    Decodifica uma mensagem em qualquer formato suportado.
+
+    O formato é detectado pelo primeiro byte: o marcador binário ou o
+    início de um objeto JSON.
+
+    Args:
+        dados: bytes (ou bytearray) recebidos
+
+    Returns:
+        dict com a mensagem
+
+    Raises:
+        ValueError: Se os dados não formam uma mensagem válida
+            (json.JSONDecodeError é subclasse de ValueError)
+    """
+    if not dados or dados[0] != MARCADOR_BINARIO:
+        return json.loads(dados)
+
+    if len(dados) < CABECALHO.size:
+        raise ValueError("Mensagem binária truncada")
+    _, versao, codigo, flags, remetente, seq = CABECALHO.unpack_from(dados)
+    if versao != VERSAO_BINARIA or codigo not in TIPOS_POR_CODIGO:
+        raise ValueError(f"Versão {versao} ou tipo {codigo} desconhecido")
+
+    tipo = TIPOS_POR_CODIGO[codigo]
+    _, campos, campo_texto = TIPOS[tipo]
+    msg = {"type": tipo, "sender": remetente.rstrip(b"\0").decode("ascii")}
+    if flags & FLAG_SEQ:
+        msg["seq"] = seq
+
+    estrutura = _ESTRUTURAS[tipo]
+    offset = CABECALHO.size
+    for (nome, fmt), valor in zip(campos, estrutura.unpack_from(dados, offset)):
+        msg[nome] = valor.rstrip(b"\0").decode("ascii") if fmt == "8s" else valor
+    offset += estrutura.size
+
+    visao = memoryview(dados)
+    if flags & FLAG_EXTRAS:
+        if campo_texto is None:
+            msg.update(json.loads(bytes(visao[offset:])))
+            offset = len(dados)
+        else:
+            (tamanho,) = TAMANHO_EXTRAS.unpack_from(dados, offset)
+            offset += TAMANHO_EXTRAS.size
+            msg.update(json.loads(bytes(visao[offset:offset + tamanho])))
+            offset += tamanho
+    if campo_texto is not None:
+        msg[campo_texto] = bytes(visao[offset:]).decode()
+    return msg
+
+
+def escolher_formato(formatos_membros):
+    """
+    Escolhe o formato comum a todos os membros do anel.
+
+    Args:
+        formatos_membros: Iterável com a lista de formatos anunciada por membro
+
+    Returns:
+        str: FORMATO_BINARIO se todos o suportam, senão FORMATO_JSON
+    """
+    for formatos in formatos_membros:
+        if FORMATO_BINARIO not in formatos:
+            return FORMATO_JSON
+    return FORMATO_BINARIO
@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import uuid
+import random
+from collections import defaultdict
+
+from armazenamento import EXTENSAO_SEGMENTO
+from registro import id_mensagem
+
+# Rastreamento das mensagens e do token (pode ser ajustado pelas variáveis de ambiente)
+RASTREAMENTO = float(os.environ.get("RASTREAMENTO", "1"))  # Fração das mensagens rastreadas (0 = desligado)
+# Os saltos do token são registrados em uma a cada N voltas (0 = token sem rastro)
+RASTREAMENTO_TOKEN = int(os.environ.get("RASTREAMENTO_TOKEN", "100"))
+# Etapas de uma mensagem, na ordem do caminho: entrada na fila do remetente, envio
+# (posse do token), recebimento e repasse pelo servidor e gravação em cada réplica
+ETAPAS = ("fila", "envio", "recebida", "repasse", "gravada")
+# Trechos do relatório: (nome, etapa inicial, etapa final); o nó é o da etapa final
+TRECHOS = (("espera_token", "fila", "envio"), ("ate_servidor", "envio", "recebida"),
+           ("servidor", "recebida", "repasse"), ("entrega", "envio", "gravada"))
+# Ordem dos trechos no relatório; os do token são o trânsito entre nós, a posse em
+# cada nó e a volta completa
+ORDEM_TRECHOS = (tuple(nome for nome, _, _ in TRECHOS)
+                 + ("total", "token_transito", "token_posse", "token_volta"))
+QUANTIS = (0.5, 0.95, 0.99)
+
+
+def _instante(valor=None):
+    return round(time.time() if valor is None else valor, 6)
+
+
+def amostrar(fracao=RASTREAMENTO):
+    """Decide se uma mensagem nova é rastreada."""
+    return fracao >= 1.0 or (fracao > 0.0 and random.random() < fracao)
+
+
+def iniciar_rastro(no, enfileirada, agora=None):
+    """
+    Cria o rastro de uma mensagem no momento do envio.
+
+    Args:
+        no: ID do remetente
+        enfileirada: Instante em que a mensagem entrou na fila de saída
+        agora: Instante do envio (padrão: time.time())
+
+    Returns:
+        list: Etapas [etapa, nó, instante] "fila" e "envio"
+    """
+    return [["fila", no, _instante(enfileirada)], ["envio", no, _instante(agora)]]
+
+
+def carimbar(msg, etapa, no, instante=None):
+    """
+    Acrescenta uma etapa ao rastro de uma mensagem, se ela é rastreada.
+
+    Returns:
+        bool: True se a mensagem tem rastro (e recebeu a etapa)
+    """
+    rastro = msg.get("rastro")
+    if not isinstance(rastro, list):
+        return False
+    rastro.append([etapa, no, _instante(instante)])
+    return True
+
+
+def rastreadas(item):
+    """Mensagens rastreadas de um chat ou de um lote."""
+    mensagens = item.get("mensagens") if item.get("type") == "lote" else [item]
+    return [msg for msg in mensagens or [] if isinstance(msg.get("rastro"), list)]
+
+
+def iniciar_rastro_token(agora=None):
+    """
+    Campos de rastro de um token posto em circulação pelo servidor.
+
+    Returns:
+        dict: trace (ID do rastro), salto, volta e enviado (vazio se o
+        rastreamento do token está desligado)
+    """
+    if RASTREAMENTO_TOKEN <= 0:
+        return {}
+    return {"trace": uuid.uuid4().hex[:8], "salto": 0, "volta": 0, "enviado": _instante(agora)}
+
+
+def continuar_rastro_token(recebido, nova_volta, agora=None):
+    """
+    Campos de rastro do token repassado por quem o recebeu.
+
+    Args:
+        recebido: Token recebido (sem rastro, o repasse também não tem)
+        nova_volta: Se o destino é o primeiro membro do anel (começa uma volta)
+        agora: Instante do envio (padrão: time.time())
+
+    Returns:
+        dict: Campos a acrescentar ao token enviado
+    """
+    if not recebido or "trace" not in recebido:
+        return {}
+    return {"trace": recebido["trace"], "salto": recebido.get("salto", 0) + 1,
+            "volta": recebido.get("volta", 0) + (1 if nova_volta else 0), "enviado": _instante(agora)}
+
+
+def salto_amostrado(recebido, inicio_volta, intervalo=RASTREAMENTO_TOKEN):
+    """
+    Decide se quem recebeu o token registra o salto.
+
+    Todos os nós registram os saltos das mesmas voltas (uma a cada
+    `intervalo`), de modo que as voltas amostradas ficam completas. O
+    primeiro salto da volta seguinte também é registrado: ele fecha a
+    duração da volta e a posse do último nó.
+
+    Args:
+        recebido: Token recebido
+        inicio_volta: Se quem recebeu é o primeiro membro do anel
+        intervalo: Voltas entre duas voltas registradas
+    """
+    if "trace" not in recebido or intervalo <= 0:
+        return False
+    volta = recebido.get("volta", 0)
+    return volta % intervalo == 0 or (inicio_volta and volta % intervalo == 1)
+
+
+def campos_salto(recebido):
+    """Campos do evento "token_salto", registrado por quem recebe o token."""
+    return {"trace": recebido["trace"], "salto": recebido.get("salto", 0),
+            "volta": recebido.get("volta", 0), "origem": recebido.get("sender"),
+            "enviado": recebido.get("enviado")}
+
+
+def mensagens_da_replica(diretorio):
+    """
+    Percorre as mensagens gravadas nos segmentos de uma réplica.
+
+    Os segmentos são só lidos (o nó pode estar gravando): uma linha
+    incompleta no fim do segmento atual é ignorada.
+
+    Yields:
+        Cada mensagem, na ordem de gravação
+    """
+    nomes = sorted(nome for nome in os.listdir(diretorio)
+                   if nome.endswith(EXTENSAO_SEGMENTO) and nome[:-len(EXTENSAO_SEGMENTO)].isdigit())
+    for nome in nomes:
+        with open(os.path.join(diretorio, nome), "rb") as f:
+            for linha in f:
+                try:
+                    yield json.loads(linha)
+                except ValueError:
+                    continue
+
+
+def percentil(ordenados, fracao):
+    """Percentil (vizinho mais próximo) de uma lista já ordenada."""
+    return ordenados[min(len(ordenados) - 1, int(round(fracao * (len(ordenados) - 1))))]
+
+
+class Rastros:
+    """
+    Linhas do tempo das mensagens e do token, reconstruídas dos nós.
+
+    Cada nó conhece só parte do caminho de uma mensagem: o remetente
+    grava as etapas até o envio, o servidor o recebimento e o repasse,
+    cada cliente a própria gravação. As partes são unidas pelo ID da
+    mensagem (remetente:seq), que serve de ID do rastro. Os saltos do
+    token são unidos pelo seu "trace" e ordenados pelo número do salto.
+
+    Os instantes vêm dos relógios de cada nó: entre máquinas
+    diferentes, os trechos incluem a diferença entre os relógios.
+    """
+
+    def __init__(self):
+        self.mensagens = {}  # ID -> {(etapa, nó): instante}
+        self.saltos = defaultdict(dict)  # (canal, trace) -> {salto: dados do salto}
+
+    def adicionar_rastro(self, ident, rastro):
+        """Une as etapas de um rastro às já conhecidas da mesma mensagem."""
+        etapas = self.mensagens.setdefault(ident, {})
+        for item in rastro:
+            if not isinstance(item, list) or len(item) != 3 or not isinstance(item[2], (int, float)):
+                continue
+            etapa, no, instante = item
+            chave = (etapa, no)
+            if chave not in etapas or instante < etapas[chave]:
+                etapas[chave] = instante
+
+    def adicionar_mensagem(self, msg):
+        """Acrescenta o rastro de uma mensagem lida de uma réplica."""
+        if isinstance(msg, dict) and isinstance(msg.get("rastro"), list) and id_mensagem(msg):
+            self.adicionar_rastro(id_mensagem(msg), msg["rastro"])
+
+    def adicionar_evento(self, evento):
+        """
+        Acrescenta as etapas de um evento de log (formato JSON de registro.py).
+
+        Usa os eventos "gravada" (com o rastro da mensagem), "repasse"
+        (IDs repassados pelo servidor) e "token_salto".
+        """
+        nome = evento.get("evento")
+        if nome == "token_salto":
+            chave = (evento.get("canal"), evento.get("trace"))
+            self.saltos[chave][evento.get("salto", 0)] = {
+                "no": evento.get("no"), "origem": evento.get("origem"), "volta": evento.get("volta", 0),
+                "enviado": evento.get("enviado"), "recebido": evento["ts"]}
+        elif nome == "repasse":
+            for ident in evento.get("ids", []):
+                self.adicionar_rastro(ident, [["repasse", evento.get("no"), evento["ts"]]])
+        elif isinstance(evento.get("rastro"), list) and evento.get("id"):
+            self.adicionar_rastro(evento["id"], evento["rastro"])
+
+    def duracao(self, ident):
+        """Tempo da primeira à última etapa conhecida de uma mensagem."""
+        instantes = self.mensagens[ident].values()
+        return max(instantes) - min(instantes) if instantes else 0.0
+
+    def linha_do_tempo(self, ident):
+        """
+        Returns:
+            list: (instante, etapa, nó) de uma mensagem, em ordem cronológica
+        """
+        return sorted((instante, etapa, no) for (etapa, no), instante in self.mensagens[ident].items())
+
+    def latencias(self):
+        """
+        Calcula a duração de cada trecho do caminho das mensagens e do token.
+
+        Returns:
+            dict: {trecho: {nó: [segundos]}}; nos trechos das mensagens o nó
+            é o da etapa final, em "total" o remetente, em "token_volta" o canal
+        """
+        resultado = defaultdict(lambda: defaultdict(list))
+        for etapas in self.mensagens.values():
+            por_etapa = defaultdict(list)
+            for (etapa, no), instante in etapas.items():
+                por_etapa[etapa].append((no, instante))
+            for trecho, inicio, fim in TRECHOS:
+                if not por_etapa[inicio]:
+                    continue
+                partida = min(instante for _, instante in por_etapa[inicio])
+                for no, instante in por_etapa[fim]:
+                    resultado[trecho][no].append(instante - partida)
+            if por_etapa["fila"] and por_etapa["gravada"]:
+                remetente, partida = por_etapa["fila"][0]
+                chegada = max(instante for _, instante in por_etapa["gravada"])
+                resultado["total"][remetente].append(chegada - partida)
+
+        for (canal, _), saltos in self.saltos.items():
+            inicio_volta = {}
+            for salto in sorted(saltos):
+                dados = saltos[salto]
+                if dados["enviado"] is not None:
+                    resultado["token_transito"][dados["no"]].append(dados["recebido"] - dados["enviado"])
+                    inicio_volta.setdefault(dados["volta"], dados["enviado"])
+                seguinte = saltos.get(salto + 1)
+                if seguinte and seguinte["origem"] == dados["no"] and seguinte["enviado"] is not None:
+                    resultado["token_posse"][dados["no"]].append(seguinte["enviado"] - dados["recebido"])
+            voltas = sorted(inicio_volta)
+            for anterior, atual in zip(voltas, voltas[1:]):
+                if atual == anterior + 1:
+                    resultado["token_volta"][canal].append(inicio_volta[atual] - inicio_volta[anterior])
+        return resultado
+
+    def voltas_mais_lentas(self, quantidade):
+        """
+        Returns:
+            list: (duração, canal, trace, volta, saltos ordenados) das voltas
+            completas mais lentas do token
+        """
+        voltas = []
+        for (canal, trace), saltos in self.saltos.items():
+            por_volta = defaultdict(list)
+            for salto in sorted(saltos):
+                por_volta[saltos[salto]["volta"]].append((salto, saltos[salto]))
+            for volta, lista in por_volta.items():
+                seguinte = por_volta.get(volta + 1)
+                if not seguinte or lista[0][1]["enviado"] is None or seguinte[0][1]["enviado"] is None:
+                    continue
+                duracao = seguinte[0][1]["enviado"] - lista[0][1]["enviado"]
+                voltas.append((duracao, canal, trace, volta, lista))
+        return sorted(voltas, key=lambda item: item[0], reverse=True)[:quantidade]
+
+
+def _ms(segundos):
+    return f"{segundos * 1000:9.3f}"
+
+
+def _linha_estatisticas(trecho, no, valores):
+    ordenados = sorted(valores)
+    quantis = " ".join(_ms(percentil(ordenados, q)) for q in QUANTIS)
+    return f"  {trecho:<15} {str(no):<12} {len(ordenados):>7} {quantis} {_ms(ordenados[-1])}"
+
+
+def relatorio(rastros, lentas=5):
+    """
+    Monta o relatório de latências por trecho e por nó.
+
+    Args:
+        rastros: Rastros reunidos dos nós
+        lentas: Quantidade de mensagens e voltas do token mais lentas detalhadas
+
+    Returns:
+        list: Linhas do relatório
+    """
+    saltos = sum(len(s) for s in rastros.saltos.values())
+    linhas = [f"Mensagens rastreadas: {len(rastros.mensagens)}  "
+              f"Saltos do token: {saltos} ({len(rastros.saltos)} rastros)", ""]
+    latencias = rastros.latencias()
+    cabecalho = " ".join(f"{'p' + str(round(q * 100)):>9}" for q in QUANTIS)
+    linhas.append(f"  {'trecho':<15} {'nó':<12} {'amostras':>7} {cabecalho} {'máx':>9}   (ms)")
+    for trecho in ORDEM_TRECHOS:
+        por_no = latencias.get(trecho)
+        if not por_no:
+            continue
+        if len(por_no) > 1:
+            todos = [valor for valores in por_no.values() for valor in valores]
+            linhas.append(_linha_estatisticas(trecho, "(todos)", todos))
+        for no in sorted(por_no, key=str):
+            linhas.append(_linha_estatisticas(trecho, no, por_no[no]))
+
+    if rastros.mensagens and lentas:
+        linhas += ["", "Mensagens mais lentas:"]
+        for ident in sorted(rastros.mensagens, key=rastros.duracao, reverse=True)[:lentas]:
+            etapas = rastros.linha_do_tempo(ident)
+            linhas.append(f"  {ident}  ({_ms(rastros.duracao(ident)).strip()} ms)")
+            inicio = anterior = etapas[0][0]
+            for instante, etapa, no in etapas:
+                linhas.append(f"    +{_ms(instante - inicio)} ms  {etapa:<9} {no:<12} "
+                              f"(+{_ms(instante - anterior).strip()})")
+                anterior = instante
+
+    voltas = rastros.voltas_mais_lentas(lentas)
+    if voltas:
+        linhas += ["", "Voltas do token mais lentas:"]
+        for duracao, canal, trace, volta, lista in voltas:
+            linhas.append(f"  canal {canal} trace {trace} volta {volta}  ({_ms(duracao).strip()} ms)")
+            for salto, dados in lista:
+                transito = ""
+                if dados["enviado"] is not None:
+                    transito = f"trânsito {_ms(dados['recebido'] - dados['enviado']).strip()} ms"
+                linhas.append(f"    salto {salto:>4}  {dados['origem']} -> {dados['no']}  {transito}")
+    return linhas
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import threading
+
+# Configuração dos logs (pode ser ajustada pelas variáveis de ambiente)
+NIVEIS = {"debug": 10, "info": 20, "aviso": 30, "erro": 40}
+NIVEL_LOG = os.environ.get("NIVEL_LOG", "info").lower()  # Nível mínimo registrado
+FORMATO_LOG = os.environ.get("FORMATO_LOG", "json")  # json (uma linha JSON por evento) | texto
+FORMATOS_LOG = ("json", "texto")
+# Amostragem por evento, ex.: "recebida=0.01,token_recebido=0.1" (avisos e erros nunca são amostrados)
+AMOSTRAGEM_LOG = os.environ.get("AMOSTRAGEM_LOG", "")
+CAPACIDADE_LOG = int(os.environ.get("CAPACIDADE_LOG", "10000"))  # Eventos aguardando a escrita
+LOTE_LOG = 512  # Eventos escritos por chamada a write()
+TRECHO_LOG = 80  # Caracteres do conteúdo de uma mensagem incluídos nos eventos
+PREFIXOS_TEXTO = {"debug": "[LOG]", "info": "[LOG]", "aviso": "[AVISO]", "erro": "[ERRO]"}
+_FIM = object()
+
+
+def ler_amostragem(texto):
+    """
+    Interpreta a configuração de amostragem.
+
+    Args:
+        texto: Pares "evento=fração" separados por vírgula
+
+    Returns:
+        dict: {evento: fração em [0, 1]}
+
+    Raises:
+        ValueError: Se um par é inválido
+    """
+    fracoes = {}
+    for par in texto.split(","):
+        if not par.strip():
+            continue
+        evento, _, fracao = par.partition("=")
+        valor = float(fracao)
+        if not evento.strip() or not 0.0 <= valor <= 1.0:
+            raise ValueError(f"Amostragem de log inválida: {par!r}")
+        fracoes[evento.strip()] = valor
+    return fracoes
+
+
+def id_mensagem(msg):
+    """Identificação curta de uma mensagem nos logs (remetente:seq)."""
+    if msg.get("seq") is not None:
+        return f"{msg.get('sender')}:{msg['seq']}"
+    return msg.get("id")
+
+
+def trecho(texto, limite=TRECHO_LOG):
+    """Início do conteúdo de uma mensagem, para os eventos que o identificam."""
+    texto = str(texto or "")
+    return texto if len(texto) <= limite else texto[:limite] + "…"
+
+
+class Registrador:
+    """
+    Logs estruturados, com níveis e escrita em segundo plano.
+
+    Cada evento tem um nome (a sua categoria), uma descrição curta e
+    campos. Quem registra só verifica o nível e a amostragem do evento e
+    coloca uma tupla em uma fila limitada; a formatação e a escrita na
+    saída ficam com uma thread própria, em lotes. Assim o custo do log
+    sai dos handlers. Com a fila cheia (saída lenta) os eventos novos são
+    descartados e contados, em vez de bloquear quem registra.
+
+    No formato "json" cada evento é uma linha com os campos ts, nivel,
+    no, evento e msg mais os campos do evento; no formato "texto" a
+    linha segue o estilo "[LOG] no: descrição campo=valor".
+    """
+
+    def __init__(self, no="", nivel=NIVEL_LOG, formato=FORMATO_LOG, amostragem=AMOSTRAGEM_LOG,
+                 capacidade=CAPACIDADE_LOG, saida=None):
+        """
+        Args:
+            no: Identificação do nó em cada evento
+            nivel: Nível mínimo ("debug", "info", "aviso" ou "erro")
+            formato: "json" ou "texto"
+            amostragem: Configuração "evento=fração,..." (ver ler_amostragem)
+            capacidade: Tamanho máximo da fila de escrita
+            saida: Arquivo de saída (padrão: sys.stdout no momento da escrita)
+
+        Raises:
+            ValueError: Se o nível, o formato ou a amostragem são inválidos
+        """
+        if nivel not in NIVEIS:
+            raise ValueError(f"Nível de log inválido: {nivel!r}")
+        if formato not in FORMATOS_LOG:
+            raise ValueError(f"Formato de log inválido: {formato!r}")
+        self.no = no
+        self.nivel = NIVEIS[nivel]
+        self.formato = formato
+        self.amostragem = ler_amostragem(amostragem)
+        self.saida = saida
+        self.descartados = 0
+        self._fila = queue.Queue(capacidade)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ativo(self, nivel, evento):
+        """Indica se um evento deste nível e categoria será registrado."""
+        numero = NIVEIS[nivel]
+        if numero < self.nivel:
+            return False
+        fracao = self.amostragem.get(evento)
+        return fracao is None or numero >= NIVEIS["aviso"] or random.random() < fracao
+
+    def registrar(self, nivel, evento, mensagem="", **campos):
+        """
+        Registra um evento (não bloqueia).
+
+        Args:
+            nivel: "debug", "info", "aviso" ou "erro"
+            evento: Nome do evento (categoria da amostragem)
+            mensagem: Descrição curta para leitura humana
+            campos: Dados do evento (serializáveis em JSON ou convertidos com str)
+        """
+        if not self.ativo(nivel, evento):
+            return
+        if self._thread is None:
+            self._iniciar()
+        try:
+            self._fila.put_nowait((time.time(), nivel, evento, mensagem, campos))
+        except queue.Full:
+            self.descartados += 1
+
+    def debug(self, evento, mensagem="", **campos):
+        self.registrar("debug", evento, mensagem, **campos)
+
+    def info(self, evento, mensagem="", **campos):
+        self.registrar("info", evento, mensagem, **campos)
+
+    def aviso(self, evento, mensagem="", **campos):
+        self.registrar("aviso", evento, mensagem, **campos)
+
+    def erro(self, evento, mensagem="", **campos):
+        self.registrar("erro", evento, mensagem, **campos)
+
+    def formatar(self, instante, nivel, evento, mensagem, campos):
+        """Converte um evento na sua linha de saída (sem a quebra de linha)."""
+        if self.formato == "texto":
+            detalhes = "".join(f" {chave}={valor}" for chave, valor in campos.items())
+            return f"{PREFIXOS_TEXTO[nivel]} {self.no}: {mensagem or evento}{detalhes}"
+        registro = {"ts": round(instante, 6), "nivel": nivel, "no": self.no, "evento": evento,
+                    "msg": mensagem}
+        registro.update(campos)
+        return json.dumps(registro, ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._executar, daemon=True, name="registro")
+            self._thread.start()
+            atexit.register(self.fechar)
+
+    def _executar(self):
+        """Laço da thread de escrita: retira os eventos em lotes e os escreve."""
+        while True:
+            eventos = [self._fila.get()]
+            while len(eventos) < LOTE_LOG:
+                try:
+                    eventos.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            fim = any(evento is _FIM for evento in eventos)
+            linhas = [self.formatar(*evento) for evento in eventos if evento is not _FIM]
+            if self.descartados:
+                descartados, self.descartados = self.descartados, 0
+                linhas.append(self.formatar(time.time(), "aviso", "log_descartado",
+                                            "Eventos de log descartados (fila cheia)",
+                                            {"quantidade": descartados}))
+            saida = self.saida or sys.stdout
+            try:
+                saida.write("\n".join(linhas) + "\n" if linhas else "")
+                saida.flush()
+            except (OSError, ValueError):
+                pass  # Saída fechada: os eventos são perdidos
+            if fim:
+                return
+
+    def fechar(self, tempo=2.0):
+        """Escreve os eventos pendentes e encerra a thread de escrita."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._fila.put(_FIM, timeout=tempo)
+        except queue.Full:
+            return
+        self._thread.join(tempo)
+
+
+log = Registrador()  # Registrador do processo (o nó define log.no ao iniciar)
@@ -0,0 +1,100 @@
+import os
+
+# Modos de ordenação das mensagens de chat
+MODO_TOKEN = "token"  # Envio só com o token (Token Ring)
+MODO_SEQUENCIADOR = "sequenciador"  # Envio a qualquer momento, ordem definida pelo servidor
+MODOS_ORDENACAO = (MODO_TOKEN, MODO_SEQUENCIADOR)
+MODO_ORDENACAO = os.environ.get("MODO_ORDENACAO", MODO_TOKEN)  # Escolhido no servidor
+
+# Tempo máximo esperando uma mensagem faltante antes de entregar as seguintes
+ESPERA_LACUNA = float(os.environ.get("ESPERA_LACUNA", "1.0"))  # Segundos
+
+
+class Sequenciador:
+    """
+    Atribui o número de sequência global (gseq) das mensagens no servidor.
+
+    Usado no modo sequenciador: os clientes enviam quando quiserem e o
+    servidor, que já retransmite todas as mensagens ao grupo, define a
+    ordem total carimbando cada mensagem nova com o próximo gseq.
+    """
+
+    def __init__(self, ultimo=0):
+        """
+        Args:
+            ultimo: Último gseq atribuído (recuperado da réplica)
+        """
+        self.ultimo = ultimo
+
+    def atribuir(self):
+        """Retorna o próximo número de sequência global."""
+        self.ultimo += 1
+        return self.ultimo
+
+
+class EntregaOrdenada:
+    """
+    Entrega as mensagens sequenciadas na ordem do gseq.
+
+    Mensagens que chegam adiantadas ficam em um buffer até que as
+    anteriores cheguem. Se uma lacuna persiste (datagrama perdido), o
+    chamador pode liberá-la com liberar_lacuna(); a mensagem faltante,
+    se chegar depois (ou pela anti-entropia), é entregue como atrasada.
+
+    Atributos:
+        proxima: Próximo gseq esperado (None até a primeira mensagem)
+        atrasadas: Mensagens entregues depois de uma lacuna liberada
+        lacunas: Lacunas liberadas sem a mensagem faltante
+    """
+
+    def __init__(self):
+        self.proxima = None
+        self.atrasadas = 0
+        self.lacunas = 0
+        self._buffer = {}
+
+    def receber(self, gseq, item):
+        """
+        Registra uma mensagem recebida.
+
+        Args:
+            gseq: Número de sequência global da mensagem
+            item: Mensagem
+
+        Returns:
+            list: Mensagens prontas para entrega, em ordem
+        """
+        if self.proxima is None:
+            self.proxima = gseq
+        if gseq < self.proxima:
+            # Duplicata ou mensagem cuja lacuna já foi liberada
+            self.atrasadas += 1
+            return [item]
+        self._buffer.setdefault(gseq, item)
+        return self._liberar()
+
+    def liberar_lacuna(self):
+        """
+        Desiste das mensagens faltantes antes da menor mensagem em buffer.
+
+        Returns:
+            list: Mensagens que passam a ser entregáveis, em ordem
+        """
+        if not self._buffer:
+            return []
+        menor = min(self._buffer)
+        self.lacunas += menor - self.proxima
+        self.proxima = menor
+        return self._liberar()
+
+    def _liberar(self):
+        prontas = []
+        while self.proxima in self._buffer:
+            prontas.append(self._buffer.pop(self.proxima))
+            self.proxima += 1
+        return prontas
+
+    @property
+    def pendentes(self):
+        """Quantidade de mensagens aguardando uma lacuna."""
+        return len(self._buffer)
@@ -1,296 +1,1176 @@
 import os
 import json
-import threading
-import socket
 import time
-import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from antientropia import coletar_delta
+from armazenamento import (ARQUIVO_INDICE_IDENTIDADES, FiltroBloom, IndiceIdentidades,
+                           LogSegmentado, converter_replica_json, identidade_mensagem)
+from canais import (CANAL_PADRAO, Canal, caminho_checkpoint, canal_da_mensagem, ler_canais,
+                    rotulo_canal)
+from checkpoint import GravadorCheckpoint
+from consulta import PORTA_CONSULTA, IndiceHistorico, iniciar_servidor_consulta
+from hlc import RelogioHibrido, carimbo_valido
+from metricas import (CHECKPOINTS, DUPLICATAS, ESCRITA_DISCO, MENSAGENS_GRAVADAS, RECONCILIACOES,
+                      LockMedido, iniciar_metricas)
+from cluster import (GRUPO_CLUSTER, INTERVALO_BATIMENTO, MAXIMO_ENTRADAS_ENVIO, SERVIDORES,
+                     Cluster, RecepcaoLog)
+from nucleo import NucleoDatagramas, criar_socket_multicast
+from protocolo import escolher_formato
+from rastreamento import (campos_salto, carimbar, continuar_rastro_token, iniciar_rastro_token,
+                          rastreadas, salto_amostrado)
+from registro import id_mensagem, log
+from sequenciador import MODO_ORDENACAO, MODO_SEQUENCIADOR, MODO_TOKEN
+from snapshot import (PORTA_BOOTSTRAP, SNAPSHOT_INTERVALO, SNAPSHOT_MINIMO, GerenciadorSnapshots,
+                      carregar_compactacao, iniciar_servidor_bootstrap, salvar_compactacao)
 
 # Configurações de rede
 PORT = 50007
-MULTICAST_GROUP = "224.1.1.1"
-SERVER_ID = "server"
+SERVER_ID = os.environ.get("SERVIDOR_ID", "server")  # Único por instância no modo cluster
+# Execução atual do servidor (cresce a cada reinício): redefine as épocas do anel nos clientes
+ENCARNACAO = int(time.time() * 1000)
+INTERVALO_ANUNCIO_REINICIO = 1.0  # Segundos até repetir o anúncio do anel vazio após o início
+# Segundos entre envios do resumo da réplica; as perdas recentes já são
+# reparadas por NACK, e a anti-entropia fica como rede de segurança
+INTERVALO_RECONCILIACAO = float(os.environ.get("INTERVALO_RECONCILIACAO", "60"))
+CANAIS_CONFIGURADOS = ler_canais()  # Canais abertos na inicialização e seus modos
 
 # Caminhos para arquivos de persistência
-REPLICA_SERVER_FILE = os.path.join(os.getcwd(), "replica_server.json")
+REPLICA_SERVER_DIR = os.path.join(os.getcwd(), "replica_server")
+REPLICA_SERVER_FILE = os.path.join(os.getcwd(), "replica_server.json")  # Formato antigo
 CHECKPOINT_SERVER_FILE = os.path.join(os.getcwd(), "checkpoint_server.json")
+SNAPSHOT_SERVER_DIR = os.path.join(os.getcwd(), "snapshots_server")
 
 # Controle de estado e concorrência
-NEIGHBORS = set()  # Conjunto de UUIDs dos clientes conectados
-LOCK = threading.Lock()
-token_holder = SERVER_ID  # Inicialmente, o servidor detém o token
+canais = {}  # Canais conhecidos (nome -> Canal); cada um com anel, token e núcleo próprios
+aberturas = {}  # Tarefas de abertura de canal, para abrir cada grupo uma só vez
+LOCK = LockMedido("replica")  # Protege a réplica, acessada pela thread de disco (espera medida)
+replica = None  # Log segmentado com as mensagens do servidor (todos os canais)
+historico = None  # Índices de consulta ao histórico (por tempo, remetente, posição e ordem causal)
+relogio = RelogioHibrido()  # Carimbos HLC (mensagens de clientes que não os enviam)
+snapshots = None  # Snapshots compactados usados no bootstrap de novos nós
+bases = {}  # Marcas d'água das mensagens removidas pela compactação (canal -> {remetente: marca})
+gravadas_desde_snapshot = 0  # Mensagens gravadas depois do último snapshot
+indice = None  # Índice persistente de identidades para rejeitar duplicatas
+disco = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disco-server")  # Comum aos canais
+cluster = None  # Eleição do líder entre as instâncias do servidor (criado no main)
+recepcao = RecepcaoLog()  # Numeração das entradas recebidas do líder (seguidores)
+nucleo_cluster = None  # Núcleo do grupo do cluster (batimentos e envio do log)
+a_replicar = []  # Entradas gravadas pelo líder aguardando envio aos seguidores
+indice_envio = 0  # Número da próxima entrada enviada pelo líder no mandato atual
+reparo_pedido_em = None  # Instante do último pedido de reconciliação ao líder
+
+
+def obter_canal(nome):
+    """
+    Retorna o estado de um canal, criando-o se ainda não existe.
+    
+    O servidor inicia com o token de cada canal. Canais fora de CANAIS
+    usam o modo de ordenação padrão (MODO_ORDENACAO).
+    
+    Args:
+        nome: Nome do canal
+    
+    Returns:
+        Canal
+    """
+    canal = canais.get(nome)
+    if canal is None:
+        canal = Canal(nome, SERVER_ID, token=True,
+                      modo=CANAIS_CONFIGURADOS.get(nome, MODO_ORDENACAO))
+        canais[nome] = canal
+    return canal
 
 
 def inicializar_arquivos():
     """
-    Cria os arquivos de réplica e checkpoint do servidor se não existirem.
+    Cria os arquivos de réplica do servidor se não existirem.
     
     Garante a persistência dos dados e possibilita a recuperação em caso de falhas.
+    Uma réplica no formato antigo (array JSON) é convertida para o log segmentado.
+    """
+    global replica, indice, historico, snapshots, bases
+    replica = LogSegmentado(REPLICA_SERVER_DIR)
+    historico = IndiceHistorico(replica)
+    indice = IndiceIdentidades(os.path.join(REPLICA_SERVER_DIR, ARQUIVO_INDICE_IDENTIDADES), FiltroBloom())
+    converter_replica_json(REPLICA_SERVER_FILE, replica)
+    for posicao, msg in replica.registros_com_posicao():
+        canal = obter_canal(canal_da_mensagem(msg))
+        canal.resumo.registrar(msg.get("sender"), msg.get("seq"), posicao)
+        # Completa o índice caso o processo tenha caído entre o log e o índice
+        identidade = identidade_mensagem(msg)
+        if identidade is not None:
+            indice.adicionar(identidade)
+        canal.sequenciador.ultimo = max(canal.sequenciador.ultimo, msg.get("gseq", 0))
+    # Mensagens removidas pela compactação continuam contando como recebidas
+    bases = carregar_compactacao(REPLICA_SERVER_DIR)
+    for nome, marcas in bases.items():
+        obter_canal(nome).resumo.registrar_base(marcas)
+    snapshots = GerenciadorSnapshots(SNAPSHOT_SERVER_DIR)
+    log.info("replica", "Réplica do servidor aberta", diretorio=REPLICA_SERVER_DIR)
+
+
+def inicializar_checkpoint(canal):
+    """
+    Abre o checkpoint de um canal e recupera o último estado.
+    
+    Garante que o servidor reinicia com o token do canal e com uma
+    nova encarnação, época e geração; os clientes voltam ao anel pelo join,
+    pedido pelo anúncio feito ao abrir o canal (anunciar_reinicio).
     """
-    if not os.path.exists(REPLICA_SERVER_FILE):
-        with open(REPLICA_SERVER_FILE, "w") as f:
-            json.dump([], f, indent=4)
-        print("[LOG] Arquivo de réplica do servidor criado em:", REPLICA_SERVER_FILE)
+    caminho = caminho_checkpoint(CHECKPOINT_SERVER_FILE, canal.nome)
+    canal.estado.gravador = GravadorCheckpoint(caminho)
+    if not os.path.exists(caminho):
+        # Checkpoint inicial: servidor possui o token
+        salvar_checkpoint(canal, "")
+        canal.estado.gravador.descarregar()
+        log.info("checkpoint_criado", "Arquivo de checkpoint do servidor criado", caminho=caminho)
     
-    if not os.path.exists(CHECKPOINT_SERVER_FILE):
-        with open(CHECKPOINT_SERVER_FILE, "w") as f:
-            # Checkpoint inicial: servidor possui o token
-            json.dump({
-                "last_message": "", 
-                "token": True, 
-                "neighbors": []
-            }, f, indent=4)
-        print("[LOG] Arquivo de checkpoint do servidor criado em:", CHECKPOINT_SERVER_FILE)
+    carregar_checkpoint(canal)
+    estado = canal.estado
+    estado.atualizar_anel((), estado.anel.epoca + 1, max(ENCARNACAO, estado.anel.encarnacao))
+    estado.geracao += 1  # Tokens anteriores à queda deixam de valer
+    if not estado.token:
+        estado.token = True
+        estado.detentor_token = SERVER_ID
+        salvar_checkpoint(canal, "Reinicialização")
 
 
-def salvar_checkpoint(last_msg, token, neighbors):
+def salvar_checkpoint(canal, last_msg):
     """
-    Salva o estado atual no checkpoint do servidor.
+    Salva um snapshot do estado em memória no checkpoint do canal.
     
     Implementa tolerância a falhas permitindo a recuperação em caso de queda.
+    O estado autoritativo é o objeto `canal.estado`; o arquivo é só uma
+    cópia, gravada em segundo plano (agrupada e atômica) pelo GravadorCheckpoint.
     
     Args:
+        canal: Canal cujo estado é salvo
         last_msg: String com a última mensagem processada
-        token: Boolean indicando se o servidor possui o token
-        neighbors: Lista/conjunto de IDs dos clientes conectados
     """
-    with LOCK:
-        estado = {"last_message": last_msg, "token": token, "neighbors": sorted(list(neighbors))}
-        with open(CHECKPOINT_SERVER_FILE, "w") as f:
-            json.dump(estado, f, indent=4)
-        print(f"[LOG] Checkpoint do servidor: token={token}, neighbors={len(neighbors)}")
+    canal.estado.persistir(last_msg)
+    CHECKPOINTS.incrementar(canal=canal.nome)
+    log.debug("checkpoint", "Checkpoint do servidor", canal=canal.nome, token=canal.estado.token,
+              vizinhos=len(canal.estado.vizinhos))
 
 
-def carregar_checkpoint():
+def carregar_checkpoint(canal):
     """
-    Carrega o estado salvo no checkpoint do servidor.
+    Restaura o estado em memória de um canal a partir do checkpoint.
     
     Parte da estratégia de tolerância a falhas, permite recuperar
-    o último estado conhecido do servidor.
-    
-    Returns:
-        dict: Estado do servidor (token, vizinhos, última mensagem)
+    o último estado conhecido do servidor. Usado apenas na abertura do canal.
     """
     try:
-        with open(CHECKPOINT_SERVER_FILE, "r") as f:
-            return json.load(f)
+        canal.estado.restaurar(canal.estado.gravador.carregar())
     except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"[LOG] Erro ao carregar checkpoint: {e}")
+        log.aviso("checkpoint_invalido", "Erro ao carregar checkpoint", canal=canal.nome, erro=str(e))
         # Cria um checkpoint padrão caso não exista ou esteja corrompido
-        default = {"last_message": "", "token": True, "neighbors": []}
-        salvar_checkpoint("", True, [])
-        return default
+        salvar_checkpoint(canal, "")
+
 
+def marcar_canal(canal, msg_obj):
+    """Registra na mensagem o canal em que ela foi recebida (exceto o padrão)."""
+    if canal.nome != CANAL_PADRAO:
+        msg_obj["canal"] = canal.nome
 
-def gravar_mensagem(msg_obj):
+
+def gravar_mensagem(canal, msg_obj):
     """
     Grava uma mensagem na réplica do servidor.
     
     Implementa o mecanismo de replicação, mantendo cópia local
-    de todas as mensagens do chat.
+    de todas as mensagens do chat. Mensagens já gravadas (mesmo remetente
+    e sequência) são rejeitadas pelo índice de identidades.
     
     Args:
+        canal: Canal em que a mensagem foi recebida
         msg_obj: Objeto de mensagem a ser armazenado
+    
+    Returns:
+        bool: True se a mensagem era nova e foi gravada
     """
+    global gravadas_desde_snapshot
+    marcar_canal(canal, msg_obj)
+    if carimbo_valido(msg_obj.get("hlc")):
+        relogio.receber(msg_obj["hlc"])
+    identidade = identidade_mensagem(msg_obj)
     with LOCK:
-        try:
-            with open(REPLICA_SERVER_FILE, "r") as f:
-                historico = json.load(f)
-        except Exception as e:
-            print(f"[LOG] Erro ao ler histórico de mensagens: {e}")
-            historico = []
-        
-        historico.append(msg_obj)
-        with open(REPLICA_SERVER_FILE, "w") as f:
-            json.dump(historico, f, indent=4)
-        print("[LOG] Mensagem gravada na réplica do servidor:", msg_obj)
+        if identidade is not None and identidade in indice:
+            DUPLICATAS.incrementar()
+            return False
+        with ESCRITA_DISCO.medir(operacao="mensagem"):
+            posicao = replica.anexar(msg_obj)
+        # O índice só é gravado depois do log: uma queda entre os dois deixa
+        # a mensagem sem identidade, e a abertura da réplica completa o índice
+        if identidade is not None:
+            indice.adicionar(identidade)
+        MENSAGENS_GRAVADAS.incrementar(canal=canal.nome)
+        canal.resumo.registrar(msg_obj.get("sender"), msg_obj.get("seq"), posicao)
+        canal.retransmissao.guardar(msg_obj)
+        gravadas_desde_snapshot += 1
+        if cluster.ativo and cluster.lidero:
+            # Envia a entrada aos seguidores (o primeiro item agenda o envio)
+            a_replicar.append(msg_obj)
+            if len(a_replicar) == 1:
+                nucleo_cluster.loop.call_soon_threadsafe(enviar_replicacao)
+    rastro = {"rastro": list(msg_obj["rastro"])} if isinstance(msg_obj.get("rastro"), list) else {}
+    log.info("gravada", "Mensagem gravada na réplica do servidor", id=id_mensagem(msg_obj),
+             canal=canal.nome, posicao=posicao, **rastro)
+    return True
 
 
-def enviar_token(sock, target=None):
+def enviar_token(canal, target=None, recebido=None):
     """
-    Passa o token para o próximo nó no anel lógico.
+    Passa o token de um canal para o próximo nó do seu anel lógico.
     
     Controla o início e a continuidade do algoritmo Token Ring,
-    implementando a exclusão mútua distribuída.
+    implementando a exclusão mútua distribuída. Executa no laço de
+    eventos; o checkpoint é gravado em segundo plano.
     
     Args:
-        sock: Socket para envio da mensagem
+        canal: Canal cujo token é passado
         target: ID específico do cliente para enviar o token (opcional)
-        
+        recebido: Token devolvido por um cliente, cujo rastro continua
+            (sem ele, o token começa um rastro novo)
+    
     Returns:
         bool: Indica se o token foi passado com sucesso
     """
-    global token_holder
-    with LOCK:
-        if not NEIGHBORS:
-            # Se não há clientes conectados, o servidor mantém o token
-            token_holder = SERVER_ID
-            salvar_checkpoint("Sem clientes", True, NEIGHBORS)
-            print(f"[LOG] {SERVER_ID}: Sem clientes conectados. Token permanece.")
-            return False
-        
-        # Determina o próximo detentor do token
-        if target and target in NEIGHBORS:
-            next_node = target
+    estado = canal.estado
+    if not estado.anel:
+        # Se não há clientes conectados, o servidor mantém o token
+        estado.token = True
+        estado.detentor_token = SERVER_ID
+        salvar_checkpoint(canal, "Sem clientes")
+        log.debug("token_mantido", "Sem clientes; o token permanece", canal=canal.nome)
+        return False
+    
+    # Determina o próximo detentor do token (tabela pré-calculada do anel)
+    if target and target in estado.anel:
+        next_node = target
+    else:
+        next_node = estado.anel.primeiro
+    
+    # Envia o token com a época do anel e a geração, e inicia a concessão
+    estado.token = False
+    estado.detentor_token = next_node
+    token_msg = {"type": "token", "next": next_node, "sender": SERVER_ID,
+                 "epoca": estado.anel.epoca, "encarnacao": estado.anel.encarnacao,
+                 "geracao": estado.geracao}
+    if recebido is not None:
+        token_msg.update(continuar_rastro_token(recebido, next_node == estado.anel.primeiro))
+    else:
+        token_msg.update(iniciar_rastro_token())
+    canal.nucleo.enviar(token_msg)
+    canal.vigia.salto(estado.geracao, next_node, canal.nucleo.loop.time())
+    salvar_checkpoint(canal, f"Token enviado para {next_node}")
+    log.debug("token_enviado", "Token enviado", canal=canal.nome, destino=next_node,
+              geracao=estado.geracao)
+    return True
+
+
+def anunciar_vizinhos(canal):
+    """
+    Envia ao grupo do canal a composição do anel, sua época, o formato
+    de serialização comum a todos os membros e o modo de ordenação.
+    """
+    estado = canal.estado
+    formato = escolher_formato(estado.formatos.get(membro, []) for membro in estado.anel.membros)
+    neighbors_msg = {"type": "neighbors", "sender": SERVER_ID,
+                     "neighbors": list(estado.anel.membros), "epoca": estado.anel.epoca,
+                     "encarnacao": estado.anel.encarnacao, "formato": formato, "modo": canal.modo}
+    if PORTA_BOOTSTRAP:
+        # Porta do canal lateral de bootstrap para os nós que acabaram de entrar
+        neighbors_msg["bootstrap"] = int(PORTA_BOOTSTRAP)
+    canal.nucleo.enviar(neighbors_msg)
+    canal.nucleo.formato = formato
+
+
+def entrar_no_canal(canal, sender, formatos):
+    """Inclui um cliente no anel de um canal."""
+    estado = canal.estado
+    if sender in estado.anel:
+        # Membro com visão desatualizada do anel pedindo a lista atual
+        log.info("anel_reenviado", "Atualização do anel pedida", canal=canal.nome, origem=sender,
+                 epoca=estado.anel.epoca)
+        anunciar_vizinhos(canal)
+        return
+    estado.formatos[sender] = formatos
+    estado.atualizar_anel(estado.vizinhos | {sender}, estado.anel.epoca + 1)
+    log.info("join", "Novo nó entrou no canal", canal=canal.nome, origem=sender,
+             vizinhos=len(estado.vizinhos), epoca=estado.anel.epoca)
+    
+    # Notifica todos sobre a atualização da topologia do anel
+    anunciar_vizinhos(canal)
+    salvar_checkpoint(canal, f"Join de {sender}")
+    
+    # Se o servidor possui o token e este é o primeiro cliente, inicia o ciclo
+    if canal.modo == MODO_TOKEN and estado.token and len(estado.vizinhos) == 1:
+        log.info("token_iniciado", "Primeiro cliente no canal, iniciando o Token Ring", canal=canal.nome)
+        enviar_token(canal, sender)
+
+
+async def tratar_join(msg, addr):
+    """
+    Processamento de novo cliente ingressando no sistema.
+    
+    O join chega pelo grupo de controle e lista os canais assinados; o
+    servidor abre o grupo de cada canal novo e inclui o cliente em cada anel.
+    Os seguidores do cluster apenas abrem os canais e guardam os formatos;
+    o anel lhes chega pelos neighbors anunciados pelo líder.
+    """
+    sender = msg.get("sender")
+    for nome in msg.get("canais", [CANAL_PADRAO]):
+        canal = await abrir_canal(nome)
+        if cluster.lidero:
+            entrar_no_canal(canal, sender, msg.get("formatos", []))
         else:
-            next_node = sorted(list(NEIGHBORS))[0]
-        
-        # Envia o token e atualiza o estado
-        token_holder = next_node
-        token_msg = {"type": "token", "next": next_node, "sender": SERVER_ID}
-        sock.sendto(json.dumps(token_msg).encode(), (MULTICAST_GROUP, PORT))
-        salvar_checkpoint(f"Token enviado para {next_node}", False, NEIGHBORS)
-        print(f"[LOG] {SERVER_ID}: Token enviado para {next_node}.")
-        return True
+            canal.estado.formatos[sender] = msg.get("formatos", [])
+
+
+def sequenciar(canal, mensagens):
+    """
+    Carimba as mensagens novas com o próximo gseq do canal e as grava
+    (thread de disco).
+    
+    As duplicatas são descartadas antes da numeração para não deixar
+    lacunas na sequência global. Como só a thread de disco grava, a
+    verificação e a gravação não concorrem com outras escritas.
+    
+    Args:
+        canal: Canal em que as mensagens foram recebidas
+        mensagens: Lista de mensagens de chat recebidas dos clientes
+    
+    Returns:
+        list: Mensagens novas, já com o campo "gseq"
+    """
+    novas = []
+    for msg in mensagens:
+        if "timestamp" not in msg:
+            msg["timestamp"] = time.time()
+        if "hlc" not in msg:
+            msg["hlc"] = relogio.agora()
+        marcar_canal(canal, msg)
+        identidade = identidade_mensagem(msg)
+        with LOCK:
+            if identidade is not None and identidade in indice:
+                continue
+        msg["gseq"] = canal.sequenciador.atribuir()
+        if gravar_mensagem(canal, msg):
+            novas.append(msg)
+    return novas
+
+
+async def tratar_chat(canal, msg, addr, payload):
+    """
+    Processamento de mensagens de chat: grava e retransmite ao grupo do canal.
+    
+    A retransmissão reaproveita o payload recebido, sem recodificar a
+    mensagem, a menos que o servidor precise completá-la (inclusive com
+    as etapas do rastro, se a mensagem é rastreada). No modo
+    sequenciador a mensagem é retransmitida com o seu gseq.
+    """
+    sender = msg.get("sender")
+    content = msg.get("content", "")
+    nucleo = canal.nucleo
+    if not cluster.lidero:
+        # Seguidores recebem as mensagens pelo log enviado pelo líder
+        return
+    
+    if canal.modo == MODO_SEQUENCIADOR:
+        if "gseq" in msg:
+            # Retransmissão já sequenciada (a própria, vinda do grupo)
+            return
+        carimbar(msg, "recebida", SERVER_ID)
+        if await nucleo.em_disco(sequenciar, canal, [msg]):
+            log.debug("sequenciada", "Mensagem sequenciada", canal=canal.nome, id=id_mensagem(msg),
+                      gseq=msg["gseq"])
+            repassar(canal, sender, msg)
+        return
+    
+    # Adiciona timestamp e carimbo HLC se não existirem (para ordenação)
+    if "timestamp" not in msg:
+        msg["timestamp"] = time.time()
+        payload = None
+    if "hlc" not in msg:
+        msg["hlc"] = relogio.agora()
+        payload = None
+    if carimbar(msg, "recebida", SERVER_ID):
+        payload = None
+    
+    if not await nucleo.em_disco(gravar_mensagem, canal, msg):
+        # Duplicata (inclusive a própria retransmissão do servidor)
+        return
+    log.debug("chat", "Mensagem de chat", canal=canal.nome, id=id_mensagem(msg))
+    
+    # Retransmite para todos (implementação do multicast)
+    repassar(canal, sender, msg if payload is None else payload)
+    salvar_checkpoint(canal, f"Chat: {content}")
 
 
-def processar_mensagens():
+def repassar(canal, sender, item):
     """
-    Processa continuamente as mensagens recebidas dos clientes.
+    Coloca uma mensagem nova na fila de repasse do canal (controle de fluxo).
     
-    Esta função implementa o loop principal de processamento de mensagens,
-    tratando diferentes tipos (join, chat, token).
+    Um remetente acima da sua taxa recebe um pedido de contenção; no
+    modo token o seu repasse é descartado (os receptores costumam ter
+    recebido o original, e os demais o recuperam por NACK), enquanto no
+    modo sequenciador, em que o repasse é a única cópia entregue, ele
+    só espera na fila. Com a fila cheia, a POLITICA_DESCARTE escolhe o
+    repasse descartado.
+    
+    Args:
+        canal: Canal da mensagem
+        sender: Remetente da mensagem
+        item: Payload recebido (bytes) ou mensagem a codificar (dict)
+    """
+    fluxo = canal.fluxo
+    agora = canal.nucleo.loop.time()
+    tamanho = len(item) if isinstance(item, (bytes, bytearray)) else len(json.dumps(item))
+    admitido = fluxo.admitir(sender, tamanho, agora)
+    if not admitido or fluxo.ocupacao >= 0.5:
+        conter_remetente(canal, sender, tamanho, agora)
+    if not admitido and canal.modo == MODO_TOKEN:
+        return
+    if not fluxo.enfileirar(item, tamanho):
+        log.aviso("repasse_descartado", "Fila de repasse cheia; repasse descartado", canal=canal.nome,
+                  politica=fluxo.politica, **fluxo.resumo())
+    if not canal.repassando:
+        canal.repassando = True
+        canal.nucleo.tarefa(drenar_repasse(canal))
+
+
+def conter_remetente(canal, sender, tamanho, agora):
+    """Pede a um remetente que pause os envios no canal (contrapressão)."""
+    espera = canal.fluxo.contencao(sender, tamanho, agora)
+    if espera is None:
+        return
+    canal.nucleo.enviar({"type": "contencao", "sender": SERVER_ID, "destino": sender,
+                         "espera": round(espera, 3)})
+    log.info("contencao", "Remetente contido", canal=canal.nome, destino=sender,
+             espera=round(espera, 3), **canal.fluxo.resumo())
+
+
+async def drenar_repasse(canal):
+    """
+    Esvazia a fila de repasse do canal no ritmo do balde global.
+    
+    Se repasses foram descartados, um resumo da réplica é anunciado
+    assim que a fila esvazia: as lacunas longas demais para NACK (ou no
+    fim da rajada, que nenhum receptor detecta) são reparadas em uma
+    única rodada de anti-entropia, sem esperar o intervalo periódico.
+    """
+    fluxo = canal.fluxo
+    nucleo = canal.nucleo
+    try:
+        while len(fluxo):
+            item, espera = fluxo.proximo(nucleo.loop.time())
+            if item is None:
+                await asyncio.sleep(max(espera, 0.001))
+            elif isinstance(item, (bytes, bytearray)):
+                nucleo.enviar_bruto(item)
+            else:
+                carimbar_repasse(canal, item)
+                nucleo.enviar(item)
+    finally:
+        canal.repassando = False
+    if fluxo.reparar:
+        fluxo.reparar = False
+        await reconciliar_replicas(canal)
+
+
+def carimbar_repasse(canal, item):
+    """Acrescenta a etapa de repasse às mensagens rastreadas de um item da fila de repasse."""
+    mensagens = rastreadas(item)
+    if not mensagens:
+        return
+    agora = time.time()
+    for msg in mensagens:
+        carimbar(msg, "repasse", SERVER_ID, agora)
+    log.info("repasse", "Mensagens repassadas", canal=canal.nome,
+             ids=[id_mensagem(msg) for msg in mensagens])
+
+
+async def tratar_congestionamento(canal, msg, addr):
+    """Sinal de congestionamento de um receptor: reduz a vazão do repasse do canal."""
+    if not cluster.lidero:
+        return
+    if not canal.fluxo.sinalizar_congestionamento(canal.nucleo.loop.time()):
+        return
+    log.aviso("congestionamento", "Congestionamento sinalizado", canal=canal.nome,
+              origem=msg.get("sender"), perdas=msg.get("perdas"), **canal.fluxo.resumo())
+
+
+async def tratar_lote(canal, msg, addr, payload):
+    """
+    Lote de mensagens de chat enviado por um cliente enquanto detinha o
+    token: grava as novas e retransmite o lote inteiro ao grupo do canal
+    (recodificado se há mensagens rastreadas, com as etapas do servidor).
+    """
+    sender = msg.get("sender")
+    mensagens = msg.get("mensagens", [])
+    nucleo = canal.nucleo
+    if not cluster.lidero:
+        return
+    
+    if canal.modo == MODO_SEQUENCIADOR:
+        if any("gseq" in item for item in mensagens):
+            return
+        agora = time.time()
+        for item in mensagens:
+            carimbar(item, "recebida", SERVER_ID, agora)
+        novas = await nucleo.em_disco(sequenciar, canal, mensagens)
+        if novas:
+            log.debug("lote", "Lote sequenciado", canal=canal.nome, origem=sender,
+                      gseq_inicio=novas[0]["gseq"], gseq_fim=novas[-1]["gseq"])
+            repassar(canal, sender, {"type": "lote", "sender": sender, "mensagens": novas})
+        return
+    
+    agora = time.time()
+    carimbadas = [item for item in mensagens if carimbar(item, "recebida", SERVER_ID, agora)]
+    if carimbadas:
+        # Recodificado no repasse, com as etapas do servidor
+        payload = msg
+    novas = await nucleo.em_disco(gravar_historico, canal, mensagens)
+    if not novas:
+        # Duplicata (inclusive a própria retransmissão do servidor)
+        return
+    log.debug("lote", "Lote recebido", canal=canal.nome, origem=sender, novas=novas,
+              mensagens=len(mensagens))
+    repassar(canal, sender, payload)
+    salvar_checkpoint(canal, f"Lote de {sender} ({len(mensagens)} mensagens)")
+
+
+async def tratar_token(canal, msg, addr):
+    """
+    Processamento do token (algoritmo Token Ring).
+    
+    O servidor recebe também as passagens entre clientes; cada uma
+    renova a concessão do token no VigiaToken do canal. Os seguidores do
+    cluster também acompanham as passagens, para assumir o token se o
+    líder cair, mas só o líder o recebe de volta.
+    """
+    estado = canal.estado
+    sender = msg.get("sender")
+    geracao = msg.get("geracao", 0)
+    if sender == SERVER_ID:
+        return
+    if geracao < estado.geracao:
+        log.debug("token_obsoleto", "Token obsoleto descartado", canal=canal.nome, origem=sender,
+                  geracao=geracao, atual=estado.geracao)
+        return
+    estado.geracao = geracao
+    estado.detentor_token = msg.get("next")
+    tempo = canal.vigia.salto(geracao, msg.get("next"), canal.nucleo.loop.time(), confirmado=True)
+    if tempo is not None:
+        log.info("token_recuperado", "Token recuperado", canal=canal.nome, segundos=round(tempo, 3),
+                 geracao=geracao, vigia=canal.vigia.resumo())
+    
+    if msg.get("next") not in [SERVER_ID, "server"] or not cluster.lidero:
+        return
+    log.debug("token_retornou", "Token retornou de um cliente", canal=canal.nome,
+              origem=msg.get("sender"))
+    if salto_amostrado(msg, False):
+        log.info("token_salto", "Salto do token", canal=canal.nome, **campos_salto(msg))
+    # Atualiza o estado: servidor possui o token
+    estado.token = True
+    estado.detentor_token = SERVER_ID
+    salvar_checkpoint(canal, "Token retornou")
+    
+    # Aguarda um pouco (timer) e repassa o token para continuar o ciclo
+    canal.nucleo.agendar(0.5, enviar_token, canal, None, msg)
+
+
+async def verificar_token(canal):
     """
+    Detecta a perda do token de um canal e o regenera (executada periodicamente).
+    
+    Se a concessão do detentor vence sem nova passagem, o servidor envia
+    um token de geração maior ao mesmo detentor. Se a concessão vence de
+    novo com o mesmo detentor, ele é considerado fora do ar: sai do anel
+    (nova época) e o token vai para o seu sucessor.
+    """
+    estado = canal.estado
+    vigia = canal.vigia
+    if canal.modo != MODO_TOKEN or estado.token or not estado.anel or not cluster.lidero:
+        return
+    agora = canal.nucleo.loop.time()
+    if not vigia.expirado(agora):
+        return
+    
+    detentor = estado.detentor_token
+    alvo = detentor
+    if vigia.falhas and detentor in estado.anel:
+        alvo = estado.anel.proximo(detentor)
+        estado.formatos.pop(detentor, None)
+        estado.atualizar_anel(estado.vizinhos - {detentor}, estado.anel.epoca + 1)
+        log.aviso("no_removido", "Nó não respondeu e foi removido do anel", canal=canal.nome,
+                  no_removido=detentor, epoca=estado.anel.epoca)
+        anunciar_vizinhos(canal)
+    
+    estado.geracao += 1
+    vigia.regenerar(estado.geracao, agora)
+    log.aviso("token_perdido", "Token perdido; regenerando", canal=canal.nome, detentor=detentor,
+              geracao=estado.geracao)
+    enviar_token(canal, alvo)
+
+
+async def tratar_nack(canal, msg, addr):
+    """
+    Confirmação negativa de um cliente: retransmite ao grupo do canal as
+    mensagens pedidas que ainda estão no buffer de retransmissão.
+    
+    A retransmissão é multicast, de modo que todos os receptores que
+    perderam as mesmas mensagens são reparados de uma vez; as que já
+    saíram do buffer ficam para a anti-entropia.
+    """
+    if not cluster.lidero:
+        return
+    faltantes = msg.get("faltantes", {})
+    mensagens, ausentes = canal.retransmissao.buscar(faltantes, canal.nucleo.loop.time())
+    if mensagens:
+        canal.nucleo.enviar({"type": "reparo", "sender": SERVER_ID, "mensagens": mensagens})
+        log.info("nack", "Mensagens retransmitidas por NACK", canal=canal.nome,
+                 origem=msg.get("sender"), mensagens=len(mensagens))
+    if ausentes:
+        log.info("nack_ausentes", "Mensagens fora do buffer (ficam para a anti-entropia)",
+                 canal=canal.nome, origem=msg.get("sender"), mensagens=ausentes)
+
+
+def coletar_sync(canal, desde):
+    """Lê da réplica as faixas pedidas em um sync_req (thread de disco)."""
+    with LOCK:
+        return coletar_delta(replica, canal.resumo, desde)
+
+
+async def tratar_sync_req(canal, msg, addr):
+    """
+    Pedido de sincronização: envia apenas as faixas solicitadas.
+    
+    No modo cluster cada pedido é atendido por um único servidor vivo,
+    escolhido pelo ID do solicitante, o que reparte as sincronizações
+    entre o líder e os seguidores.
+    """
+    sender = msg.get("sender")
+    if cluster.responsavel(sender, canal.nucleo.loop.time()) != SERVER_ID:
+        return
+    history = await canal.nucleo.em_disco(coletar_sync, canal, msg.get("desde", {}))
+    if history:
+        sync_msg = {"type": "sync", "sender": SERVER_ID, "destino": sender, "history": history}
+        canal.nucleo.enviar(sync_msg)
+        log.info("sync_enviado", "Mensagens enviadas para sincronizar um nó", canal=canal.nome,
+                 destino=sender, mensagens=len(history))
+
+
+def gravar_historico(canal, history):
+    """Grava as mensagens novas de um lote de sincronização (thread de disco)."""
+    return sum(1 for item in history if gravar_mensagem(canal, item))
+
+
+async def tratar_sync(canal, msg, addr):
+    """Mensagens que um cliente possui e o servidor não."""
+    sender = msg.get("sender")
+    if sender == SERVER_ID or not cluster.lidero:
+        return
+    novas = await canal.nucleo.em_disco(gravar_historico, canal, msg.get("history", []))
+    log.info("sync_recebido", "Sincronização recebida", canal=canal.nome, origem=sender, novas=novas)
+
+
+def com_log(handler):
+    """Envolve um handler registrando no log cada mensagem recebida."""
+    async def tratar(msg, addr, *args):
+        log.debug("recebida", "Mensagem recebida", tipo=msg.get("type", "chat"), id=id_mensagem(msg),
+                  endereco=addr[0])
+        await handler(msg, addr, *args)
+    return tratar
+
+
+async def processar_mensagens(canal):
+    """
+    Inicia o processamento assíncrono das mensagens recebidas no grupo de um canal.
+    
+    Cada tipo de mensagem (chat, lote, token, sync_req, nack,
+    congestionamento, sync) é despachado para o seu handler pelo núcleo
+    de datagramas do canal. O núcleo do canal padrão recebe também os
+    joins (grupo de controle).
+    
+    Returns:
+        NucleoDatagramas: Núcleo de rede do canal
+    """
+    nucleo = NucleoDatagramas(f"{SERVER_ID}/{canal.nome}", (canal.grupo, PORT),
+                              disco=disco, canal=rotulo_canal(canal))
+    canal.nucleo = nucleo
+    if canal.nome == CANAL_PADRAO:
+        nucleo.registrar("join", com_log(tratar_join))
+    nucleo.registrar("chat", com_log(partial(tratar_chat, canal)), bruto=True)
+    nucleo.registrar("lote", com_log(partial(tratar_lote, canal)), bruto=True)
+    nucleo.registrar("token", com_log(partial(tratar_token, canal)))
+    nucleo.registrar("neighbors", com_log(partial(tratar_neighbors, canal)))
+    nucleo.registrar("sync_req", com_log(partial(tratar_sync_req, canal)))
+    nucleo.registrar("nack", com_log(partial(tratar_nack, canal)))
+    nucleo.registrar("congestionamento", com_log(partial(tratar_congestionamento, canal)))
+    nucleo.registrar("sync", com_log(partial(tratar_sync, canal)))
+    
     # Configuração do socket para comunicação multicast
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind(("", PORT))
-    sock.setsockopt(socket.IPPROTO_IP,
-                    socket.IP_MULTICAST_TTL, 2)
-    sock.setsockopt(socket.IPPROTO_IP,
-                    socket.IP_ADD_MEMBERSHIP,
-                    socket.inet_aton(MULTICAST_GROUP) + socket.inet_aton("0.0.0.0"))
-    
-    global token_holder
-    
-    while True:
-        try:
-            data, addr = sock.recvfrom(4096)
-            msg = json.loads(data.decode())
-            
-            # Delay artificial para simular latência de rede
-            time.sleep(random.uniform(0.05, 0.2))
-            print(f"[LOG] Servidor recebeu de {addr}: {msg}")
-            
-            msg_type = msg.get("type")
-            sender = msg.get("sender")
-
-            if msg_type == "join":
-                # Processamento de novo cliente ingressando no sistema
-                is_new = False
-                with LOCK:
-                    if sender not in NEIGHBORS:
-                        NEIGHBORS.add(sender)
-                        is_new = True
-                
-                if is_new:
-                    print(f"[LOG] Novo nó {sender} entrou. Total de neighbors: {len(NEIGHBORS)}")
-                    checkpoint = carregar_checkpoint()
-                    has_token = token_holder == SERVER_ID
-                    salvar_checkpoint(f"Join de {sender}", has_token, NEIGHBORS)
-                    
-                    # Notifica todos sobre a atualização da topologia do anel
-                    neighbors_msg = {"type": "neighbors", "neighbors": sorted(list(NEIGHBORS))}
-                    sock.sendto(json.dumps(neighbors_msg).encode(), (MULTICAST_GROUP, PORT))
-                    
-                    # Se o servidor possui o token e este é o primeiro cliente, inicia o ciclo
-                    if has_token and len(NEIGHBORS) == 1:
-                        print(f"[LOG] {SERVER_ID}: Primeiro cliente conectado, iniciando Token Ring.")
-                        enviar_token(sock, sender)
-
-            elif msg_type == "chat":
-                # Processamento de mensagens de chat
-                content = msg.get("content", "")
-                
-                # Adiciona timestamp se não existir (para ordenação)
-                if "timestamp" not in msg:
-                    msg["timestamp"] = time.time()
-                    
-                gravar_mensagem(msg)
-                salvar_checkpoint(f"Chat: {content}", token_holder == SERVER_ID, NEIGHBORS)
-                print(f"[LOG] Mensagem de {sender}: {content}")
-                
-                # Retransmite para todos (implementação do multicast)
-                # Delay para simular latência variável
-                time.sleep(random.uniform(0.1, 1.0))  
-                sock.sendto(json.dumps(msg).encode(), (MULTICAST_GROUP, PORT))
-
-            elif msg_type == "token":
-                # Processamento do token (algoritmo Token Ring)
-                if msg.get("next") in [SERVER_ID, "server"]:
-                    print(f"[LOG] {SERVER_ID}: Token retornou do cliente {sender}.")
-                    # Atualiza o estado: servidor possui o token
-                    token_holder = SERVER_ID
-                    salvar_checkpoint("Token retornou", True, NEIGHBORS)
-                    
-                    # Aguarda um pouco e repassa o token para continuar o ciclo
-                    time.sleep(0.5)
-                    enviar_token(sock)
-                
-        except json.JSONDecodeError as e:
-            print(f"[ERRO] Falha ao decodificar mensagem: {e}")
-        except Exception as e:
-            print(f"[ERRO] Erro ao processar mensagem: {e}")
-
-
-def reconciliar_replicas():
-    """
-    Periodicamente sincroniza a réplica do servidor com os clientes.
-    
-    Implementação do mecanismo de consistência eventual, garantindo
-    que todos os nós tenham eventualmente o mesmo conjunto de mensagens.
-    """
-    while True:
-        try:
-            # Intervalo entre sincronizações
-            time.sleep(15)
-            
-            with LOCK:
-                try:
-                    # Lê o histórico atual
-                    with open(REPLICA_SERVER_FILE, "r") as f:
-                        historico = json.load(f)
-                    
-                    # Ordena as mensagens por timestamp (se disponível)
-                    if historico and isinstance(historico[0], dict) and "timestamp" in historico[0]:
-                        historico = sorted(historico, key=lambda x: x.get("timestamp", 0))
-                        with open(REPLICA_SERVER_FILE, "w") as f:
-                            json.dump(historico, f, indent=4)
-                    
-                except Exception as e:
-                    print(f"[ERRO] Falha ao carregar réplica para sincronização: {e}")
-                    historico = []
-            
-            # Envia o histórico completo para todos os clientes
-            sync_msg = {"type": "sync", "history": historico}
-            temp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            temp_sock.sendto(json.dumps(sync_msg).encode(), (MULTICAST_GROUP, PORT))
-            print(f"[LOG] Réplicas sincronizadas. Total de mensagens: {len(historico)}")
-            
-        except Exception as e:
-            print(f"[ERRO] Falha na sincronização de réplicas: {e}")
+    await nucleo.iniciar(criar_socket_multicast(canal.grupo, PORT))
+    return nucleo
 
 
-if __name__ == "__main__":
+async def abrir_canal(nome):
+    """
+    Abre o grupo multicast de um canal (uma única vez por canal).
+    
+    Returns:
+        Canal já associado ao seu núcleo de rede
+    """
+    if nome not in aberturas:
+        aberturas[nome] = asyncio.get_running_loop().create_task(_abrir_canal(nome))
+    return await aberturas[nome]
+
+
+async def _abrir_canal(nome):
+    canal = obter_canal(nome)
+    inicializar_checkpoint(canal)
+    nucleo = await processar_mensagens(canal)
+    
+    # O anel recomeça vazio a cada início: o anúncio da nova encarnação faz
+    # os clientes que já estavam no canal (servidor reiniciado) pedirem o
+    # ingresso; é repetido uma vez caso o datagrama se perca
+    anunciar_reinicio(canal)
+    nucleo.agendar(INTERVALO_ANUNCIO_REINICIO, anunciar_reinicio, canal)
+    
+    # Sincronização periódica (consistência eventual)
+    nucleo.periodico(INTERVALO_RECONCILIACAO, partial(reconciliar_replicas, canal))
+    
+    # Detecção de perda do token
+    nucleo.periodico(canal.vigia.lease / 2, partial(verificar_token, canal))
+    log.info("canal_aberto", "Canal aberto", canal=canal.nome, grupo=canal.grupo, porta=PORT,
+             modo=canal.modo)
+    return canal
+
+
+def anunciar_reinicio(canal):
+    """Anuncia o anel vazio da nova encarnação enquanto ninguém reingressou."""
+    if cluster.lidero and len(canal.estado.anel) == 0:
+        anunciar_vizinhos(canal)
+        log.info("reinicio_anunciado", "Anel da nova encarnação anunciado", canal=canal.nome,
+                 encarnacao=canal.estado.anel.encarnacao)
+
+
+def ler_digest(canal):
+    """
+    Copia o resumo da réplica de um canal (thread de disco).
+    
+    Returns:
+        tuple: (marcas d'água atuais, marcas d'água da última compactação)
+    """
+    with LOCK:
+        return canal.resumo.digest(), dict(bases.get(canal.nome, {}))
+
+
+async def reconciliar_replicas(canal):
+    """
+    Anuncia o resumo da réplica de um canal aos clientes que o assinam.
+    
+    Implementação do mecanismo de consistência eventual por anti-entropia:
+    o servidor envia apenas as marcas d'água por remetente e cada cliente
+    pede as faixas que lhe faltam (sync_req) ou envia as que o servidor
+    não possui (sync), garantindo que todos os nós tenham eventualmente
+    o mesmo conjunto de mensagens. Executada periodicamente pelo núcleo
+    (só no líder do cluster).
+    
+    O resumo leva também a base da compactação: as mensagens até ela
+    foram removidas do log e não podem mais ser enviadas, então o cliente
+    as considera cobertas em vez de pedi-las a cada rodada.
+    """
+    if not cluster.lidero:
+        return
+    with RECONCILIACOES.medir(canal=canal.nome):
+        digest, base = await canal.nucleo.em_disco(ler_digest, canal)
+        digest_msg = {"type": "digest", "sender": SERVER_ID, "resumo": digest}
+        if base:
+            digest_msg["base"] = base
+        canal.nucleo.enviar(digest_msg)
+    log.info("digest", "Resumo da réplica enviado", canal=canal.nome, remetentes=len(digest))
+
+
+def compactar_replica():
+    """
+    Cria um snapshot e aplica a retenção ao log (thread de disco).
+    
+    Um snapshot novo só é gravado depois de SNAPSHOT_MINIMO mensagens
+    novas. Os segmentos fechados inteiramente fora da retenção são
+    removidos do log; as marcas d'água até onde as mensagens removidas
+    são contíguas são persistidas para que elas continuem contando como
+    recebidas (nem pedidas nem reenviadas pela anti-entropia).
+    """
+    global gravadas_desde_snapshot, bases
+    if gravadas_desde_snapshot >= SNAPSHOT_MINIMO:
+        gravadas_desde_snapshot = 0
+        cabecalho = snapshots.criar(replica)
+        log.info("snapshot", "Snapshot criado", snapshot=cabecalho["snapshot"],
+                 mensagens=cabecalho["mensagens"])
+    
+    politica = snapshots.politica
+    if not politica.ativa:
+        return
+    expirados = politica.segmentos_expirados(historico.resumo_segmentos(), time.time())
+    if not expirados:
+        return
+    with LOCK:
+        # Só os segmentos fechados são removidos; a base cobre apenas as
+        # mensagens deles, contíguas às já removidas antes
+        fechados = set(replica.segmentos()[:-1])
+        expirados = [numero for numero in expirados if numero in fechados]
+        if not expirados:
+            return
+        marcas = {nome: canal.resumo.base_segmentos(expirados, bases.get(nome))
+                  for nome, canal in list(canais.items())}
+        salvar_compactacao(REPLICA_SERVER_DIR, marcas)
+        bases = marcas
+        removidos = replica.remover_segmentos(expirados)
+        for canal in list(canais.values()):
+            canal.resumo.descartar_segmentos(removidos)
+    log.info("compactacao", "Segmentos removidos pela retenção", segmentos=len(removidos))
+
+
+def gerar_bootstrap(pedido):
+    """
+    Mensagens de bootstrap para um nó: último snapshot e cauda do log.
+    
+    São enviadas só as mensagens dos canais pedidos acima das marcas
+    d'água que o nó já possui. Antes delas vai, para cada canal pedido já
+    compactado, um registro "base" com as marcas d'água da compactação:
+    o nó as aplica ao seu resumo, pois essas mensagens não virão nem pelo
+    bootstrap nem pela anti-entropia.
+    
+    Args:
+        pedido: {"sender": id, "canais": {canal: {remetente: marca}}}
+    
+    Yields:
+        Cada mensagem a enviar
+    """
+    marcas = pedido.get("canais", {CANAL_PADRAO: {}})
+    with LOCK:
+        compactados = {nome: dict(base) for nome, base in bases.items() if nome in marcas}
+    for nome, base in compactados.items():
+        yield {"type": "base", "canal": nome, "base": base}
+    for msg in snapshots.bootstrap(replica):
+        marcas_canal = marcas.get(canal_da_mensagem(msg))
+        if marcas_canal is None:
+            continue
+        seq = msg.get("seq")
+        if not isinstance(seq, int) or seq > marcas_canal.get(msg.get("sender"), 0):
+            yield msg
+
+
+async def tratar_neighbors(canal, msg, addr):
+    """
+    Anel anunciado pelo líder: os seguidores guardam uma cópia para o failover.
+    
+    A cópia de uma encarnação diferente da atual é aceita mesmo com época
+    menor (o líder pode ter iniciado antes deste seguidor); dentro da
+    mesma encarnação, só visões mais novas substituem a cópia.
+    """
+    if msg.get("sender") == SERVER_ID or cluster.lidero:
+        return
+    encarnacao = msg.get("encarnacao", 0)
+    canal.estado.atualizar_anel(msg.get("neighbors", []), msg.get("epoca", 0), encarnacao,
+                                redefinir=encarnacao != canal.estado.anel.encarnacao)
+
+
+def tamanho_replica():
+    """Quantidade de mensagens distintas na réplica (critério da eleição)."""
+    with LOCK:
+        return len(indice)
+
+
+def enviar_replicacao():
+    """
+    Envia aos seguidores as entradas gravadas desde o último envio.
+    
+    Agendada no laço de eventos pela primeira entrada pendente, de modo
+    que as gravações próximas seguem juntas. Cada bloco leva o número da
+    sua primeira entrada, para que os seguidores detectem lacunas.
+    """
+    global indice_envio
+    with LOCK:
+        entradas = a_replicar[:]
+        del a_replicar[:]
+    for inicio in range(0, len(entradas), MAXIMO_ENTRADAS_ENVIO):
+        bloco = entradas[inicio:inicio + MAXIMO_ENTRADAS_ENVIO]
+        replicar_msg = {"type": "replicar", "sender": SERVER_ID, "mandato": cluster.mandato,
+                        "inicio": indice_envio, "mensagens": bloco}
+        nucleo_cluster.enviar(replicar_msg)
+        indice_envio += len(bloco)
+
+
+def aplicar_entradas(mensagens):
+    """Grava as entradas recebidas de outro servidor do cluster (thread de disco)."""
+    novas = 0
+    for msg in mensagens:
+        canal = obter_canal(canal_da_mensagem(msg))
+        if gravar_mensagem(canal, msg):
+            novas += 1
+        canal.sequenciador.ultimo = max(canal.sequenciador.ultimo, msg.get("gseq", 0))
+    return novas
+
+
+def ler_resumos():
+    """Copia o resumo de todos os canais da réplica (thread de disco)."""
+    with LOCK:
+        return {nome: canal.resumo.digest() for nome, canal in list(canais.items())}
+
+
+def coletar_reparo(resumos_remotos):
+    """
+    Lê as mensagens que faltam a um seguidor, canal a canal (thread de disco).
+    
+    Returns:
+        tuple: (mensagens a enviar, resumos atuais do líder)
+    """
+    with LOCK:
+        mensagens = []
+        for nome, canal in list(canais.items()):
+            faixas = canal.resumo.faltantes(resumos_remotos.get(nome, {}))
+            mensagens.extend(coletar_delta(replica, canal.resumo, faixas))
+        return mensagens, {nome: canal.resumo.digest() for nome, canal in list(canais.items())}
+
+
+def comparar_resumos(resumos_lider):
+    """
+    Compara a réplica do seguidor com os resumos do líder (thread de disco).
+    
+    Returns:
+        tuple: (mensagens que o líder não possui, se ainda falta algo ao seguidor)
+    """
+    with LOCK:
+        envios = []
+        atrasado = False
+        for nome in set(canais) | set(resumos_lider):
+            canal = obter_canal(nome)
+            digest = resumos_lider.get(nome, {})
+            envios.extend(coletar_delta(replica, canal.resumo, canal.resumo.faltantes(digest)))
+            atrasado = atrasado or bool(canal.resumo.requisicao(digest))
+        return envios, atrasado
+
+
+async def pedir_reparo(forcar=False):
+    """
+    Pede ao líder a reconciliação da réplica deste seguidor.
+    
+    Usada ao reconhecer um novo líder e ao detectar uma lacuna nas
+    entradas recebidas; fora desses casos os pedidos são espaçados em
+    pelo menos um prazo do cluster.
+    """
+    global reparo_pedido_em
+    agora = nucleo_cluster.loop.time()
+    if not forcar and reparo_pedido_em is not None and agora - reparo_pedido_em < cluster.prazo:
+        return
+    reparo_pedido_em = agora
+    resumos = await nucleo_cluster.em_disco(ler_resumos)
+    req_msg = {"type": "replicar_req", "sender": SERVER_ID, "destino": cluster.lider,
+               "resumo": resumos}
+    nucleo_cluster.enviar(req_msg)
+    log.info("reparo_pedido", "Reconciliação pedida ao líder", lider=cluster.lider)
+
+
+async def assumir_lideranca():
+    """
+    Assume o papel de líder do cluster.
+    
+    Cada canal aberto recebe uma nova época (anunciada aos clientes) e,
+    no modo token, um token de geração maior, entregue ao último detentor
+    observado; tokens do líder anterior passam a ser descartados. A
+    numeração das entradas enviadas aos seguidores recomeça no novo mandato.
+    """
+    global indice_envio
+    indice_envio = 0
+    log.info("lideranca", "Assumindo a liderança do cluster", mandato=cluster.mandato)
+    for nome in list(aberturas):
+        canal = await abrir_canal(nome)
+        estado = canal.estado
+        estado.atualizar_anel(estado.vizinhos, estado.anel.epoca + 1,
+                              max(ENCARNACAO, estado.anel.encarnacao))
+        estado.geracao += 1
+        anunciar_vizinhos(canal)
+        if canal.modo == MODO_TOKEN:
+            canal.vigia.regenerar(estado.geracao, canal.nucleo.loop.time())
+            enviar_token(canal, estado.detentor_token)
+        salvar_checkpoint(canal, f"Liderança assumida (mandato {cluster.mandato})")
+
+
+async def trocar_lider(era_lider):
+    """Reage ao reconhecimento de um novo líder por este servidor."""
+    log.info("lider", "Novo líder do cluster", lider=cluster.lider, mandato=cluster.mandato)
+    if era_lider:
+        # Outro servidor venceu com um mandato maior (ou o mesmo e menor ID)
+        with LOCK:
+            del a_replicar[:]
+        for canal in list(canais.values()):
+            canal.estado.token = False
+    recepcao.reiniciar()
+    await pedir_reparo(forcar=True)
+
+
+async def enviar_batimento():
+    """Envia o batimento deste servidor e verifica a liderança (executada periodicamente)."""
+    agora = nucleo_cluster.loop.time()
+    tamanho = await nucleo_cluster.em_disco(tamanho_replica)
+    if cluster.eleger(agora, tamanho):
+        await assumir_lideranca()
+    batimento_msg = {"type": "batimento", "sender": SERVER_ID, "mandato": cluster.mandato,
+                     "lider": cluster.lider, "tamanho": tamanho, "canais": list(aberturas)}
+    nucleo_cluster.enviar(batimento_msg)
+    if not cluster.lidero and cluster.lider is not None and recepcao.esperado is None:
+        # Ainda não sincronizado com o líder (pedido ou resposta perdidos)
+        await pedir_reparo()
+
+
+async def tratar_batimento(msg, addr):
+    """
+    Batimento de outro servidor do cluster.
+    
+    Os canais abertos pelo líder também são abertos nos seguidores, que
+    assim acompanham o anel e o token de todos os canais em uso.
+    """
+    sender = msg.get("sender")
+    if sender == SERVER_ID:
+        return
+    era_lider = cluster.lidero
+    if cluster.observar(sender, msg.get("mandato", 0), msg.get("lider"),
+                        msg.get("tamanho"), nucleo_cluster.loop.time()):
+        await trocar_lider(era_lider)
+    if sender == cluster.lider:
+        for nome in msg.get("canais", []):
+            await abrir_canal(nome)
+
+
+async def tratar_replicar(msg, addr):
+    """
+    Entradas do log enviadas pelo líder.
+    
+    Sem destino, são as gravações recentes do líder, numeradas; uma
+    lacuna na numeração leva a um pedido de reconciliação. Com destino,
+    são a resposta a esse pedido: trazem também os resumos do líder,
+    e o seguidor devolve as mensagens que só ele possui.
+    """
+    sender = msg.get("sender")
+    destino = msg.get("destino")
+    mandato = msg.get("mandato", 0)
+    if sender == SERVER_ID or destino not in (None, SERVER_ID) or mandato < cluster.mandato:
+        return
+    era_lider = cluster.lidero
+    if cluster.observar(sender, mandato, sender, None, nucleo_cluster.loop.time()):
+        await trocar_lider(era_lider)
+    if cluster.lider != sender:
+        return
+    mensagens = msg.get("mensagens", [])
+    novas = await nucleo_cluster.em_disco(aplicar_entradas, mensagens)
+    
+    if destino is None:
+        if recepcao.receber(msg.get("inicio", 0), len(mensagens)):
+            log.aviso("lacuna_replicacao", "Lacuna nas entradas do líder", inicio=msg.get("inicio"))
+            await pedir_reparo()
+        return
+    
+    log.info("reparo_recebido", "Reconciliação com o líder", lider=sender, novas=novas)
+    lacuna = recepcao.sincronizado(msg.get("indice", 0))
+    envios, atrasado = await nucleo_cluster.em_disco(comparar_resumos, msg.get("resumo", {}))
+    if envios:
+        sync_msg = {"type": "replicar_sync", "sender": SERVER_ID, "destino": sender,
+                    "mensagens": envios}
+        nucleo_cluster.enviar(sync_msg)
+        log.info("reparo_enviado", "Mensagens enviadas ao líder", lider=sender, mensagens=len(envios))
+    if lacuna or atrasado:
+        # Resposta incompleta: o próximo batimento pede o restante
+        recepcao.reiniciar()
+
+
+async def tratar_replicar_req(msg, addr):
+    """Pedido de reconciliação de um seguidor (atendido pelo líder)."""
+    if not cluster.lidero or msg.get("destino") != SERVER_ID:
+        return
+    # A numeração é lida antes do delta: o que for gravado depois segue pelo envio normal
+    inicio = indice_envio
+    mensagens, resumos = await nucleo_cluster.em_disco(coletar_reparo, msg.get("resumo", {}))
+    replicar_msg = {"type": "replicar", "sender": SERVER_ID, "destino": msg.get("sender"),
+                    "mandato": cluster.mandato, "indice": inicio, "resumo": resumos,
+                    "mensagens": mensagens}
+    nucleo_cluster.enviar(replicar_msg)
+    log.info("reparo_atendido", "Reconciliação atendida", destino=msg.get("sender"),
+             mensagens=len(mensagens))
+
+
+async def tratar_replicar_sync(msg, addr):
+    """Mensagens que um seguidor possui e o líder não (por exemplo, um líder anterior)."""
+    if not cluster.lidero or msg.get("destino") != SERVER_ID:
+        return
+    novas = await nucleo_cluster.em_disco(aplicar_entradas, msg.get("mensagens", []))
+    log.info("replicacao", "Mensagens novas recebidas do cluster", origem=msg.get("sender"), novas=novas)
+
+
+async def iniciar_cluster():
+    """
+    Abre o grupo do cluster e inicia os batimentos.
+    
+    O servidor começa como seguidor e só disputa a liderança depois de
+    escutar os batimentos por um prazo (ver cluster.py).
+    """
+    global nucleo_cluster
+    nucleo_cluster = NucleoDatagramas(f"{SERVER_ID}/cluster", (GRUPO_CLUSTER, PORT), disco=disco)
+    nucleo_cluster.registrar("batimento", tratar_batimento)
+    nucleo_cluster.registrar("replicar", tratar_replicar)
+    nucleo_cluster.registrar("replicar_req", tratar_replicar_req)
+    nucleo_cluster.registrar("replicar_sync", tratar_replicar_sync)
+    await nucleo_cluster.iniciar(criar_socket_multicast(GRUPO_CLUSTER, PORT))
+    nucleo_cluster.periodico(INTERVALO_BATIMENTO, enviar_batimento)
+    log.info("cluster", "Cluster iniciado", membros=list(cluster.membros), grupo=GRUPO_CLUSTER,
+             porta=PORT)
+
+
+async def main():
+    """Inicializa o servidor e mantém o laço de eventos em execução."""
+    global cluster
+    log.no = SERVER_ID
+    log.info("canais", "Canais configurados", canais=CANAIS_CONFIGURADOS)
+    
     # Inicializa o ambiente
+    cluster = Cluster(SERVER_ID, SERVIDORES, agora=asyncio.get_running_loop().time())
     inicializar_arquivos()
+    if cluster.ativo:
+        await iniciar_cluster()
+    else:
+        cluster.eleger(0.0, 0)  # Servidor único: líder desde o início
     
-    # Garante que o servidor inicia com o token
-    checkpoint = carregar_checkpoint()
-    if not checkpoint.get("token", True):
-        salvar_checkpoint("Reinicialização", True, checkpoint.get("neighbors", []))
+    # O canal padrão é sempre aberto: seu grupo é também o de controle
+    await abrir_canal(CANAL_PADRAO)
+    for nome in CANAIS_CONFIGURADOS:
+        await abrir_canal(nome)
     
-    # Thread para processamento de mensagens
-    mensagens_thread = threading.Thread(target=processar_mensagens, daemon=True)
-    mensagens_thread.start()
+    # Snapshots e retenção do log
+    canais[CANAL_PADRAO].nucleo.periodico(
+        SNAPSHOT_INTERVALO, lambda: canais[CANAL_PADRAO].nucleo.em_disco(compactar_replica))
+    if PORTA_BOOTSTRAP:
+        await iniciar_servidor_bootstrap(gerar_bootstrap, int(PORTA_BOOTSTRAP))
     
-    # Thread para sincronização periódica (consistência eventual)
-    sync_thread = threading.Thread(target=reconciliar_replicas, daemon=True)
-    sync_thread.start()
+    # Consultas locais ao histórico (ferramentas e clientes que chegam depois)
+    if PORTA_CONSULTA:
+        await iniciar_servidor_consulta(historico, canais[CANAL_PADRAO].nucleo.em_disco,
+                                        int(PORTA_CONSULTA))
     
-    print("[LOG] Servidor iniciado. Aguardando mensagens...")
+    # Métricas (endpoint do Prometheus e arquivo de estatísticas)
+    await iniciar_metricas(canais[CANAL_PADRAO].nucleo)
     
-    # Main thread mantém o servidor em execução
+    log.info("iniciado", "Servidor iniciado. Aguardando mensagens...")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
     try:
-        while True:
-            time.sleep(1)
+        asyncio.run(main())
     except KeyboardInterrupt:
-        print("[LOG] Encerrando servidor...")
+        log.info("encerrado", "Encerrando servidor...")
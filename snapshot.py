@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import asyncio
+from itertools import islice
+
+from registro import log
+
+# Snapshots compactados da réplica (servidor)
+SNAPSHOT_INTERVALO = float(os.environ.get("SNAPSHOT_INTERVALO", "60"))  # Segundos entre verificações
+SNAPSHOT_MINIMO = int(os.environ.get("SNAPSHOT_MINIMO", "1000"))  # Mensagens novas por snapshot
+SNAPSHOT_MANTER = int(os.environ.get("SNAPSHOT_MANTER", "2"))  # Snapshots mantidos em disco
+PREFIXO_SNAPSHOT = "snapshot_"
+EXTENSAO_SNAPSHOT = ".ndjson"
+ARQUIVO_COMPACTACAO = "compactacao.json"  # Marcas d'água das mensagens removidas do log
+
+# Retenção das mensagens (0 = sem limite)
+RETENCAO_MENSAGENS = int(os.environ.get("RETENCAO_MENSAGENS", "0"))
+RETENCAO_IDADE = float(os.environ.get("RETENCAO_IDADE", "0"))  # Segundos
+RETENCAO_BYTES = int(os.environ.get("RETENCAO_BYTES", "0"))
+
+# Canal lateral TCP de bootstrap (vazio = desligado)
+PORTA_BOOTSTRAP = os.environ.get("PORTA_BOOTSTRAP", "")
+HOST_BOOTSTRAP = os.environ.get("HOST_BOOTSTRAP", "0.0.0.0")
+LOTE_BOOTSTRAP = 500  # Mensagens por leitura/gravação durante o bootstrap
+
+
+def _linha(registro):
+    return json.dumps(registro, separators=(",", ":"), ensure_ascii=False).encode() + b"\n"
+
+
+class PoliticaRetencao:
+    """
+    Define quais mensagens são mantidas pelo nó.
+
+    Uma mensagem deixa de ser retida se exceder qualquer um dos limites:
+    quantidade (as N mais recentes), idade (timestamp) ou tamanho total
+    em bytes. Os limites valem por mensagem nos snapshots e por segmento
+    inteiro na compactação do log, que só remove segmentos fechados.
+    """
+
+    def __init__(self, mensagens=RETENCAO_MENSAGENS, idade=RETENCAO_IDADE, tamanho=RETENCAO_BYTES):
+        """
+        Args:
+            mensagens: Máximo de mensagens retidas (0 = sem limite)
+            idade: Idade máxima em segundos (0 = sem limite)
+            tamanho: Máximo de bytes retidos (0 = sem limite)
+        """
+        self.mensagens = mensagens
+        self.idade = idade
+        self.tamanho = tamanho
+
+    @property
+    def ativa(self):
+        """Indica se algum limite está configurado."""
+        return bool(self.mensagens or self.idade or self.tamanho)
+
+    def filtrar(self, mensagens, agora):
+        """
+        Aplica os limites a uma lista de mensagens em ordem de gravação.
+
+        Returns:
+            list: As mensagens retidas, na mesma ordem
+        """
+        if self.idade:
+            limite = agora - self.idade
+            mensagens = [msg for msg in mensagens if msg.get("timestamp", 0) >= limite]
+        if self.mensagens:
+            mensagens = mensagens[-self.mensagens:]
+        if self.tamanho:
+            total = 0
+            inicio = len(mensagens)
+            while inicio > 0:
+                total += len(_linha(mensagens[inicio - 1]))
+                if total > self.tamanho:
+                    break
+                inicio -= 1
+            mensagens = mensagens[inicio:]
+        return mensagens
+
+    def segmentos_expirados(self, segmentos, agora):
+        """
+        Escolhe os segmentos do log inteiramente fora da retenção.
+
+        Args:
+            segmentos: (número, registros, bytes, maior timestamp) de cada
+                segmento, do mais antigo ao mais novo (o último, aberto
+                para escrita, nunca é removido)
+            agora: Instante atual (segundos desde a época Unix)
+
+        Returns:
+            list: Números dos segmentos a remover
+        """
+        if not segmentos:
+            return []
+        expirados = []
+        _, mensagens, tamanho, _ = segmentos[-1]  # O segmento aberto conta como retido
+        for numero, contagem, bytes_segmento, ts_maximo in reversed(segmentos[:-1]):
+            mensagens += contagem
+            tamanho += bytes_segmento
+            if ((self.mensagens and mensagens - contagem >= self.mensagens)
+                    or (self.tamanho and tamanho - bytes_segmento >= self.tamanho)
+                    or (self.idade and ts_maximo is not None and ts_maximo < agora - self.idade)):
+                expirados.append(numero)
+        return sorted(expirados)
+
+
+class GerenciadorSnapshots:
+    """
+    Snapshots compactados da réplica, usados no bootstrap de novos nós.
+
+    Cada snapshot é um arquivo NDJSON: a primeira linha é um cabeçalho
+    com o número do snapshot, o horário, a quantidade de mensagens e a
+    marca (posição no log da última mensagem incluída); as seguintes
+    são as mensagens retidas. Um snapshot novo é montado a partir do
+    anterior mais a cauda do log depois da sua marca, de modo que o log
+    só é percorrido a partir do último snapshot.
+    """
+
+    def __init__(self, diretorio, politica=None, manter=SNAPSHOT_MANTER):
+        """
+        Args:
+            diretorio: Diretório onde os snapshots são gravados
+            politica: PoliticaRetencao aplicada às mensagens (padrão: variáveis de ambiente)
+            manter: Quantidade de snapshots mantidos em disco
+        """
+        self.diretorio = diretorio
+        self.politica = politica or PoliticaRetencao()
+        self.manter = manter
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _listar(self):
+        numeros = []
+        for nome in os.listdir(self.diretorio):
+            base, ext = os.path.splitext(nome)
+            if ext == EXTENSAO_SNAPSHOT and base.startswith(PREFIXO_SNAPSHOT):
+                numero = base[len(PREFIXO_SNAPSHOT):]
+                if numero.isdigit():
+                    numeros.append(int(numero))
+        return sorted(numeros)
+
+    def caminho(self, numero):
+        """Retorna o caminho do arquivo de um snapshot."""
+        return os.path.join(self.diretorio, f"{PREFIXO_SNAPSHOT}{numero:08d}{EXTENSAO_SNAPSHOT}")
+
+    def ultimo(self):
+        """
+        Returns:
+            dict: Cabeçalho do snapshot mais recente, ou None se não há nenhum
+        """
+        numeros = self._listar()
+        if not numeros:
+            return None
+        with open(self.caminho(numeros[-1]), "rb") as f:
+            return json.loads(f.readline())
+
+    def mensagens(self, cabecalho):
+        """
+        Percorre as mensagens de um snapshot.
+
+        Yields:
+            Cada mensagem, na ordem do snapshot
+        """
+        with open(self.caminho(cabecalho["snapshot"]), "rb") as f:
+            f.readline()
+            for linha in f:
+                yield json.loads(linha)
+
+    def cauda(self, log, cabecalho):
+        """
+        Percorre o log a partir da marca de um snapshot (ou desde o início).
+
+        Yields:
+            tuple: (posição, mensagem) gravadas depois do snapshot
+        """
+        marca = tuple(cabecalho["marca"]) if cabecalho and cabecalho["marca"] else None
+        for posicao, registro in log.registros_com_posicao(inicio=marca):
+            if posicao != marca:
+                yield posicao, registro
+
+    def criar(self, log, agora=None):
+        """
+        Grava um novo snapshot: o anterior mais a cauda do log, com a retenção aplicada.
+
+        Args:
+            log: LogSegmentado da réplica
+            agora: Instante usado na retenção por idade (padrão: time.time())
+
+        Returns:
+            dict: Cabeçalho do snapshot criado
+        """
+        agora = time.time() if agora is None else agora
+        anterior = self.ultimo()
+        mensagens = list(self.mensagens(anterior)) if anterior else []
+        marca = anterior["marca"] if anterior else None
+        for posicao, registro in self.cauda(log, anterior):
+            mensagens.append(registro)
+            marca = list(posicao)
+        mensagens = self.politica.filtrar(mensagens, agora)
+
+        numero = anterior["snapshot"] + 1 if anterior else 1
+        cabecalho = {"snapshot": numero, "criado": agora, "mensagens": len(mensagens), "marca": marca}
+        caminho = self.caminho(numero)
+        with open(caminho + ".tmp", "wb") as f:
+            f.write(_linha(cabecalho))
+            for msg in mensagens:
+                f.write(_linha(msg))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(caminho + ".tmp", caminho)
+
+        for antigo in self._listar()[:-self.manter]:
+            os.remove(self.caminho(antigo))
+        return cabecalho
+
+    def bootstrap(self, log):
+        """
+        Percorre as mensagens de bootstrap: o último snapshot e depois a cauda do log.
+
+        Yields:
+            Cada mensagem
+        """
+        cabecalho = self.ultimo()
+        if cabecalho:
+            yield from self.mensagens(cabecalho)
+        for _, registro in self.cauda(log, cabecalho):
+            yield registro
+
+
+def carregar_compactacao(diretorio):
+    """
+    Lê as marcas d'água das mensagens removidas pela compactação do log.
+
+    Returns:
+        dict: {canal: {remetente: marca}} (vazio se o log nunca foi compactado)
+    """
+    try:
+        with open(os.path.join(diretorio, ARQUIVO_COMPACTACAO), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def salvar_compactacao(diretorio, marcas):
+    """Grava (atomicamente) as marcas d'água das mensagens removidas do log."""
+    caminho = os.path.join(diretorio, ARQUIVO_COMPACTACAO)
+    with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(marcas, f)
+    os.replace(caminho + ".tmp", caminho)
+
+
+async def iniciar_servidor_bootstrap(gerar, porta, host=HOST_BOOTSTRAP):
+    """
+    Abre o canal lateral TCP de bootstrap.
+
+    O nó que chega envia uma linha JSON com o seu pedido e recebe as
+    mensagens, uma por linha, até o servidor fechar a conexão. A leitura
+    do disco roda fora do laço de eventos, em lotes de LOTE_BOOTSTRAP.
+
+    Args:
+        gerar: Função que recebe o pedido e retorna um iterador de mensagens
+        porta: Porta TCP
+        host: Endereço de escuta
+    """
+    loop = asyncio.get_running_loop()
+
+    async def tratar_conexao(reader, writer):
+        enviadas = 0
+        try:
+            pedido = json.loads(await reader.readline())
+            mensagens = gerar(pedido)
+            while True:
+                lote = await loop.run_in_executor(None, lambda: list(islice(mensagens, LOTE_BOOTSTRAP)))
+                if not lote:
+                    break
+                writer.write(b"".join(_linha(msg) for msg in lote))
+                await writer.drain()
+                enviadas += len(lote)
+            log.info("bootstrap_enviado", "Bootstrap atendido", destino=pedido.get("sender"), mensagens=enviadas)
+        except (ValueError, ConnectionError) as e:
+            log.aviso("bootstrap_interrompido", "Bootstrap interrompido", erro=str(e))
+        finally:
+            writer.close()
+
+    await asyncio.start_server(tratar_conexao, host, porta)
+    log.info("bootstrap_servidor", "Bootstrap de novos nós", host=host, porta=porta)
+
+
+async def baixar_bootstrap(host, porta, pedido, gravar):
+    """
+    Baixa as mensagens de bootstrap de um servidor.
+
+    Args:
+        host, porta: Endereço do canal lateral do servidor
+        pedido: Dicionário enviado ao servidor
+        gravar: Corrotina que recebe cada lote de mensagens
+
+    Returns:
+        int: Quantidade de mensagens recebidas
+    """
+    reader, writer = await asyncio.open_connection(host, porta)
+    recebidas = 0
+    try:
+        writer.write(json.dumps(pedido).encode() + b"\n")
+        await writer.drain()
+        lote = []
+        while True:
+            linha = await reader.readline()
+            if linha:
+                lote.append(json.loads(linha))
+            if lote and (len(lote) >= LOTE_BOOTSTRAP or not linha):
+                await gravar(lote)
+                recebidas += len(lote)
+                lote = []
+            if not linha:
+                break
+    finally:
+        writer.close()
+    return recebidas
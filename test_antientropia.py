@@ -0,0 +1,127 @@
+import unittest
+
+from antientropia import ResumoReplica, coletar_delta
+
+
+class LogFalso:
+    """Log em memória: a posição de cada mensagem é (segmento, índice)."""
+
+    def __init__(self):
+        self.mensagens = {}
+
+    def anexar(self, msg, segmento=0):
+        posicao = (segmento, len(self.mensagens))
+        self.mensagens[posicao] = msg
+        return posicao
+
+    def ler(self, posicao):
+        return self.mensagens[posicao]
+
+
+class TestResumoReplica(unittest.TestCase):
+    def test_marca_contigua_em_ordem(self):
+        resumo = ResumoReplica()
+        for seq in (1, 2, 3):
+            self.assertTrue(resumo.registrar("a", seq))
+        self.assertEqual(resumo.digest(), {"a": 3})
+
+    def test_fora_de_ordem_fecha_a_lacuna(self):
+        resumo = ResumoReplica()
+        for seq in (3, 1, 4):
+            resumo.registrar("a", seq)
+        self.assertEqual(resumo.digest(), {"a": 1})
+        resumo.registrar("a", 2)
+        self.assertEqual(resumo.digest(), {"a": 4})
+
+    def test_duplicata_e_seq_invalido(self):
+        resumo = ResumoReplica()
+        self.assertTrue(resumo.registrar("a", 1))
+        self.assertFalse(resumo.registrar("a", 1))
+        self.assertFalse(resumo.registrar("a", 0))
+        self.assertFalse(resumo.registrar("a", "2"))
+        self.assertFalse(resumo.registrar(None, 2))
+        self.assertEqual(resumo.digest(), {"a": 1})
+
+    def test_lacuna_aparece_na_requisicao(self):
+        resumo = ResumoReplica()
+        for seq in (1, 2, 5):
+            resumo.registrar("a", seq)
+        resumo.registrar("b", 1)
+        # Pede a partir da marca contígua, mesmo já tendo o 5
+        self.assertEqual(resumo.requisicao({"a": 5, "b": 1, "c": 2}), {"a": 2, "c": 0})
+        self.assertEqual(resumo.requisicao({"a": 2}), {})
+
+    def test_faltantes_no_outro_no(self):
+        resumo = ResumoReplica()
+        for seq in (1, 2, 3):
+            resumo.registrar("a", seq)
+        resumo.registrar("b", 1)
+        self.assertEqual(resumo.faltantes({"a": 1, "b": 1}), {"a": 1})
+        self.assertEqual(resumo.faltantes({}), {"a": 0, "b": 0})
+
+    def test_registrar_base_cobre_a_lacuna(self):
+        resumo = ResumoReplica()
+        for seq in (8, 9, 10):
+            resumo.registrar("a", seq)
+        self.assertEqual(resumo.requisicao({"a": 10}), {"a": 0})
+        resumo.registrar_base({"a": 7})
+        self.assertEqual(resumo.digest(), {"a": 10})
+        self.assertEqual(resumo.requisicao({"a": 10}), {})
+
+    def test_registrar_base_menor_nao_recua(self):
+        resumo = ResumoReplica()
+        for seq in (1, 2, 3):
+            resumo.registrar("a", seq)
+        resumo.registrar_base({"a": 2, "b": 4})
+        self.assertEqual(resumo.digest(), {"a": 3, "b": 4})
+        # Mensagens abaixo da base não voltam a mover a marca
+        resumo.registrar("b", 2)
+        resumo.registrar("b", 5)
+        self.assertEqual(resumo.digest(), {"a": 3, "b": 5})
+
+    def test_posicoes_apos_e_segmentos_removidos(self):
+        resumo = ResumoReplica()
+        resumo.registrar("a", 1, (0, 0))
+        resumo.registrar("a", 3, (1, 0))
+        resumo.registrar("a", 2, (0, 1))
+        self.assertEqual(resumo.posicoes_apos("a", 1), [(0, 1), (1, 0)])
+        resumo.descartar_segmentos([0])
+        self.assertEqual(resumo.posicoes_apos("a", 0), [(1, 0)])
+        self.assertTrue(resumo.contem("a", 1))
+        self.assertEqual(resumo.posicoes_apos("b", 0), [])
+
+    def test_base_segmentos_so_cobre_o_removido(self):
+        resumo = ResumoReplica()
+        # Segmento 0: seqs 1, 2 e 4; o 3 chegou atrasado e está no segmento 1
+        for seq, posicao in ((1, (0, 0)), (2, (0, 1)), (4, (0, 2)), (3, (1, 0)), (5, (1, 1))):
+            resumo.registrar("a", seq, posicao)
+        resumo.registrar("b", 1, (1, 2))
+        self.assertEqual(resumo.base_segmentos([0]), {"a": 2})
+        # A base anterior continua valendo para os segmentos já removidos
+        resumo.descartar_segmentos([0])
+        self.assertEqual(resumo.base_segmentos([1], {"a": 2}), {"a": 5, "b": 1})
+        self.assertEqual(resumo.base_segmentos([], {"a": 2}), {"a": 2})
+
+
+class TestColetarDelta(unittest.TestCase):
+    def setUp(self):
+        self.log = LogFalso()
+        self.resumo = ResumoReplica()
+        for seq in range(1, 6):
+            msg = {"sender": "a", "seq": seq, "content": "x" * 100}
+            self.resumo.registrar("a", seq, self.log.anexar(msg))
+
+    def test_envia_so_a_faixa_pedida(self):
+        mensagens = coletar_delta(self.log, self.resumo, {"a": 3})
+        self.assertEqual([msg["seq"] for msg in mensagens], [4, 5])
+
+    def test_respeita_o_limite_de_bytes(self):
+        mensagens = coletar_delta(self.log, self.resumo, {"a": 0}, limite=300)
+        self.assertEqual([msg["seq"] for msg in mensagens], [1, 2])
+        # Ao menos uma mensagem sai, mesmo maior que o limite
+        mensagens = coletar_delta(self.log, self.resumo, {"a": 0}, limite=1)
+        self.assertEqual([msg["seq"] for msg in mensagens], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+
+from cluster import Cluster, RecepcaoLog
+
+
+def cluster_de_tres(no_id, agora=0.0):
+    return Cluster(no_id, ["s1", "s2", "s3"], prazo=1.5, agora=agora)
+
+
+class TestCluster(unittest.TestCase):
+    def test_servidor_unico_lidera_de_imediato(self):
+        cluster = Cluster("s1")
+        self.assertFalse(cluster.ativo)
+        self.assertTrue(cluster.eleger(0.0, 0))
+        self.assertTrue(cluster.lidero)
+        self.assertFalse(cluster.eleger(1.0, 0))
+        self.assertEqual(cluster.mandato, 1)
+
+    def test_escuta_durante_o_primeiro_prazo(self):
+        cluster = cluster_de_tres("s1")
+        self.assertFalse(cluster.eleger(1.0, 10))
+        self.assertIsNone(cluster.lider)
+        self.assertTrue(cluster.eleger(1.5, 10))
+
+    def test_reconhece_lider_estabelecido(self):
+        cluster = cluster_de_tres("s1")
+        self.assertTrue(cluster.observar("s2", 4, "s2", 10, 0.5))
+        self.assertEqual((cluster.mandato, cluster.lider), (4, "s2"))
+        cluster.observar("s2", 4, "s2", 10, 1.6)
+        self.assertFalse(cluster.eleger(2.0, 100))
+
+    def test_failover_para_a_replica_mais_completa(self):
+        s1 = cluster_de_tres("s1")
+        s3 = cluster_de_tres("s3")
+        for cluster in (s1, s3):
+            cluster.observar("s2", 1, "s2", 50, 0.0)
+        s1.observar("s3", 1, "s2", 40, 1.0)
+        s3.observar("s1", 1, "s2", 30, 1.0)
+        # O líder para de enviar batimentos; dentro do prazo nada muda
+        self.assertFalse(s1.eleger(1.5, 30))
+        self.assertFalse(s3.eleger(1.5, 40))
+        # Passado o prazo, só o vivo com a maior réplica assume
+        self.assertFalse(s1.eleger(2.0, 30))
+        self.assertTrue(s3.eleger(2.0, 40))
+        self.assertEqual((s3.mandato, s3.lider), (2, "s3"))
+        self.assertTrue(s1.observar("s3", 2, "s3", 40, 2.1))
+        self.assertEqual(s1.lider, "s3")
+
+    def test_empate_decidido_pelo_menor_id(self):
+        s2 = cluster_de_tres("s2")
+        s3 = cluster_de_tres("s3")
+        s2.observar("s3", 0, None, 10, 1.0)
+        s3.observar("s2", 0, None, 10, 1.0)
+        self.assertTrue(s2.eleger(2.0, 10))
+        self.assertFalse(s3.eleger(2.0, 10))
+
+    def test_mandato_anterior_ignorado(self):
+        cluster = cluster_de_tres("s1")
+        cluster.observar("s2", 3, "s2", 10, 0.0)
+        self.assertFalse(cluster.observar("s3", 2, "s3", 10, 0.1))
+        self.assertEqual(cluster.lider, "s2")
+
+    def test_dois_lideres_no_mesmo_mandato(self):
+        cluster = cluster_de_tres("s1")
+        cluster.observar("s3", 2, "s3", 10, 0.0)
+        self.assertTrue(cluster.observar("s2", 2, "s2", 10, 0.1))
+        self.assertFalse(cluster.observar("s3", 2, "s3", 10, 0.2))
+        self.assertEqual(cluster.lider, "s2")
+
+    def test_batimento_sem_tamanho_mantem_o_anterior(self):
+        cluster = cluster_de_tres("s2")
+        cluster.observar("s1", 0, None, 5, 1.0)
+        cluster.observar("s1", 0, None, None, 1.2)
+        # s2 tem a réplica maior que os 5 de s1
+        self.assertTrue(cluster.eleger(2.0, 6))
+
+    def test_responsavel_entre_os_vivos(self):
+        cluster = cluster_de_tres("s1")
+        cluster.observar("s2", 1, "s2", 0, 0.0)
+        self.assertEqual(cluster.vivos(1.0), ["s1", "s2"])
+        self.assertEqual(cluster.vivos(2.0), ["s1"])
+        self.assertIn(cluster.responsavel("cliente", 1.0), ("s1", "s2"))
+        self.assertEqual(cluster.responsavel("cliente", 1.0), cluster.responsavel("cliente", 1.0))
+        self.assertEqual(cluster.responsavel("cliente", 2.0), "s1")
+
+
+class TestRecepcaoLog(unittest.TestCase):
+    def test_blocos_em_sequencia(self):
+        recepcao = RecepcaoLog()
+        recepcao.sincronizado(0)
+        self.assertFalse(recepcao.receber(0, 3))
+        self.assertFalse(recepcao.receber(3, 2))
+        self.assertEqual(recepcao.esperado, 5)
+
+    def test_bloco_repetido_ou_sobreposto(self):
+        recepcao = RecepcaoLog()
+        recepcao.sincronizado(0)
+        recepcao.receber(0, 5)
+        self.assertFalse(recepcao.receber(2, 2))
+        self.assertEqual(recepcao.esperado, 5)
+        self.assertFalse(recepcao.receber(3, 4))
+        self.assertEqual(recepcao.esperado, 7)
+
+    def test_lacuna_pede_reconciliacao(self):
+        recepcao = RecepcaoLog()
+        recepcao.sincronizado(0)
+        recepcao.receber(0, 3)
+        self.assertTrue(recepcao.receber(5, 2))
+        self.assertIsNone(recepcao.esperado)
+        # Fora de sincronia, os blocos são só anotados
+        self.assertFalse(recepcao.receber(7, 1))
+        # A reconciliação cobriu até a entrada 5: a numeração é retomada
+        self.assertFalse(recepcao.sincronizado(5))
+        self.assertEqual(recepcao.esperado, 8)
+
+    def test_lacuna_apos_a_reconciliacao(self):
+        recepcao = RecepcaoLog()
+        recepcao.receber(10, 2)
+        self.assertTrue(recepcao.sincronizado(8))
+        self.assertIsNone(recepcao.esperado)
+
+    def test_mandato_novo_reinicia(self):
+        recepcao = RecepcaoLog()
+        recepcao.sincronizado(0)
+        recepcao.receber(0, 3)
+        recepcao.reiniciar()
+        self.assertIsNone(recepcao.esperado)
+        self.assertFalse(recepcao.receber(0, 1))
+        self.assertFalse(recepcao.sincronizado(0))
+        self.assertEqual(recepcao.esperado, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
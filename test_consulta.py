@@ -0,0 +1,41 @@
+import tempfile
+import unittest
+
+import consulta
+from armazenamento import LogSegmentado
+from consulta import IndiceHistorico
+
+
+class TestConsultar(unittest.TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        log = LogSegmentado(diretorio.name)
+        self.addCleanup(log.fechar)
+        for seq in range(1, 4):
+            log.anexar({"sender": "a", "seq": seq, "timestamp": float(seq)})
+        self.historico = IndiceHistorico(log)
+
+    def test_limite_invalido(self):
+        for limite in (0, -1, 2.5, "2", True, None):
+            for op in ("desde", "ordem"):
+                with self.assertRaises(ValueError):
+                    self.historico.consultar({"op": op, "timestamp": 0, "limite": limite})
+        with self.assertRaises(ValueError):
+            self.historico.consultar({"op": "ultimas", "quantidade": 0})
+
+    def test_paginas(self):
+        resposta = self.historico.consultar({"op": "desde", "timestamp": 0, "limite": 2})
+        self.assertEqual([msg["seq"] for msg in resposta["mensagens"]], [1, 2])
+        resposta = self.historico.consultar({"op": "desde", "timestamp": 0, "limite": 2,
+                                             "cursor": resposta["cursor"]})
+        self.assertEqual([msg["seq"] for msg in resposta["mensagens"]], [3])
+        self.assertIsNone(resposta["cursor"])
+
+    def test_limite_acima_do_maximo_aceito(self):
+        resposta = self.historico.consultar({"op": "ordem", "limite": consulta.LIMITE_PAGINA + 1})
+        self.assertEqual(len(resposta["mensagens"]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import unittest
+
+import fluxo
+from fluxo import (DESCARTE_ANTIGAS, DESCARTE_NOVAS, BaldeTokens, ControleFluxo,
+                   DetectorCongestionamento)
+
+
+class TestBaldeTokens(unittest.TestCase):
+    def test_rajada_passa_sem_espera(self):
+        balde = BaldeTokens(taxa=100, rajada=300, agora=0.0)
+        for _ in range(3):
+            self.assertTrue(balde.consumir(100, 0.0))
+        self.assertFalse(balde.consumir(100, 0.0))
+        self.assertAlmostEqual(balde.espera(100, 0.0), 1.0)
+
+    def test_reposicao_pela_taxa(self):
+        balde = BaldeTokens(taxa=100, rajada=300, agora=0.0)
+        self.assertTrue(balde.consumir(300, 0.0))
+        self.assertFalse(balde.consumir(50, 0.49))
+        self.assertTrue(balde.consumir(50, 0.5))
+        self.assertAlmostEqual(balde.fichas, 0.0)
+
+    def test_reposicao_limitada_a_rajada(self):
+        balde = BaldeTokens(taxa=100, rajada=300, agora=0.0)
+        balde.consumir(300, 0.0)
+        balde.consumir(0, 100.0)
+        self.assertEqual(balde.fichas, 300)
+
+    def test_relogio_que_recua_nao_repoe(self):
+        balde = BaldeTokens(taxa=100, rajada=300, agora=10.0)
+        balde.consumir(300, 10.0)
+        self.assertFalse(balde.consumir(1, 5.0))
+        self.assertTrue(balde.consumir(100, 11.0))
+
+    def test_envio_maior_que_a_rajada(self):
+        balde = BaldeTokens(taxa=100, rajada=300, agora=0.0)
+        self.assertTrue(balde.consumir(1000, 0.0))
+        self.assertFalse(balde.consumir(1000, 2.9))
+        self.assertAlmostEqual(balde.espera(1000, 2.9), 0.1)
+        self.assertTrue(balde.consumir(1000, 3.0))
+
+    def test_sem_limite(self):
+        balde = BaldeTokens(taxa=0, rajada=0)
+        for _ in range(10):
+            self.assertTrue(balde.consumir(10 ** 6, 0.0))
+        self.assertEqual(balde.espera(10 ** 6, 0.0), 0.0)
+
+
+class TestControleFluxo(unittest.TestCase):
+    def controle(self, **opcoes):
+        parametros = {"taxa_remetente": 100, "rajada_remetente": 200, "taxa_global": 1000,
+                      "rajada_global": 1000, "capacidade": 4, "politica": DESCARTE_ANTIGAS}
+        parametros.update(opcoes)
+        return ControleFluxo(**parametros)
+
+    def test_politica_invalida(self):
+        with self.assertRaises(ValueError):
+            self.controle(politica="todas")
+
+    def test_remetentes_tem_baldes_proprios(self):
+        controle = self.controle()
+        self.assertTrue(controle.admitir("a", 200, 0.0))
+        self.assertFalse(controle.admitir("a", 100, 0.0))
+        # Outro remetente não é afetado pela rajada de "a"
+        self.assertTrue(controle.admitir("b", 200, 0.0))
+        self.assertEqual(controle.contidas, 1)
+        self.assertTrue(controle.admitir("a", 100, 1.0))
+
+    def test_contencao_pedida_uma_vez_por_pausa(self):
+        controle = self.controle()
+        controle.admitir("a", 200, 0.0)
+        self.assertAlmostEqual(controle.contencao("a", 100, 0.0), 1.0)
+        self.assertIsNone(controle.contencao("a", 100, 0.5))
+        self.assertAlmostEqual(controle.contencao("a", 150, 1.0), 0.5)
+        # Remetente em dia não recebe pedido
+        self.assertIsNone(controle.contencao("b", 100, 0.0))
+
+    def test_contencao_limitada(self):
+        controle = self.controle(taxa_remetente=1, rajada_remetente=100)
+        controle.admitir("a", 100, 0.0)
+        self.assertEqual(controle.contencao("a", 100, 0.0), fluxo.CONTENCAO_MAXIMA)
+
+    def test_contencao_com_a_fila_meio_cheia(self):
+        controle = self.controle(taxa_global=100, rajada_global=100)
+        controle.enfileirar("x", 100)
+        controle.enfileirar("y", 100)
+        controle.proximo(0.0)  # Esvazia o balde global
+        controle.enfileirar("z", 100)
+        self.assertGreaterEqual(controle.ocupacao, 0.5)
+        self.assertAlmostEqual(controle.contencao("b", 10, 0.0), 1.0)
+
+    def test_fila_no_ritmo_do_balde_global(self):
+        controle = self.controle(taxa_global=100, rajada_global=100)
+        for item in ("x", "y", "z"):
+            self.assertTrue(controle.enfileirar(item, 100))
+        self.assertEqual(controle.proximo(0.0), ("x", 0.0))
+        item, espera = controle.proximo(0.0)
+        self.assertIsNone(item)
+        self.assertAlmostEqual(espera, 1.0)
+        self.assertEqual(controle.proximo(1.0), ("y", 0.0))
+        self.assertEqual(controle.proximo(2.0), ("z", 0.0))
+        self.assertEqual(controle.proximo(3.0), (None, 0.0))
+        self.assertEqual(controle.repassadas, 3)
+
+    def test_descarte_das_antigas(self):
+        controle = self.controle(capacidade=2)
+        controle.enfileirar("x", 1)
+        controle.enfileirar("y", 1)
+        self.assertFalse(controle.enfileirar("z", 1))
+        self.assertTrue(controle.reparar)
+        self.assertEqual([controle.proximo(0.0)[0] for _ in range(2)], ["y", "z"])
+
+    def test_descarte_das_novas(self):
+        controle = self.controle(capacidade=2, politica=DESCARTE_NOVAS)
+        controle.enfileirar("x", 1)
+        controle.enfileirar("y", 1)
+        self.assertFalse(controle.enfileirar("z", 1))
+        self.assertEqual(controle.descartadas, 1)
+        self.assertEqual([controle.proximo(0.0)[0] for _ in range(2)], ["x", "y"])
+
+    def test_congestionamento_reduz_e_recupera(self):
+        controle = self.controle()
+        self.assertTrue(controle.sinalizar_congestionamento(0.0))
+        self.assertEqual(controle.fator, 0.5)
+        # Vários receptores sinalizando a mesma perda reduzem uma vez só
+        self.assertFalse(controle.sinalizar_congestionamento(0.5))
+        # O que foi recuperado durante a janela também é reduzido à metade
+        self.assertTrue(controle.sinalizar_congestionamento(fluxo.JANELA_CONGESTIONAMENTO))
+        fator = (0.5 + fluxo.JANELA_CONGESTIONAMENTO * fluxo.RECUPERACAO_FATOR) / 2
+        self.assertAlmostEqual(controle.fator, fator)
+        self.assertAlmostEqual(controle.global_.taxa, 1000 * fator)
+        # Sem sinais, a vazão volta aos poucos ao ser usada
+        controle.enfileirar("x", 1)
+        controle.proximo(fluxo.JANELA_CONGESTIONAMENTO + 1.0)
+        self.assertAlmostEqual(controle.fator, fator + fluxo.RECUPERACAO_FATOR)
+        controle.enfileirar("y", 1)
+        controle.proximo(100.0)
+        self.assertEqual(controle.fator, 1.0)
+
+    def test_fator_minimo(self):
+        controle = self.controle()
+        controle.fator = fluxo.FATOR_MINIMO * 1.5
+        self.assertTrue(controle.sinalizar_congestionamento(0.0))
+        self.assertEqual(controle.fator, fluxo.FATOR_MINIMO)
+        self.assertEqual(controle.global_.taxa, 1000 * fluxo.FATOR_MINIMO)
+
+
+class TestDetectorCongestionamento(unittest.TestCase):
+    def test_sinaliza_uma_vez_por_janela(self):
+        detector = DetectorCongestionamento(limiar=4, janela=1.0)
+        self.assertFalse(detector.registrar(3, 0.0))
+        self.assertTrue(detector.registrar(1, 0.5))
+        self.assertFalse(detector.registrar(10, 0.9))
+        # A janela seguinte recomeça a contagem
+        self.assertFalse(detector.registrar(1, 1.0))
+        self.assertTrue(detector.registrar(3, 1.2))
+
+    def test_limiar_zero_desliga(self):
+        detector = DetectorCongestionamento(limiar=0)
+        self.assertFalse(detector.registrar(1000, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import random
+import unittest
+
+import hlc
+from hlc import OrdemCausal, RelogioHibrido, carimbo_valido, chave_causal
+
+
+class RelogioFixo:
+    """Relógio de parede controlado pelo teste (segundos)."""
+
+    def __init__(self, agora=1000.0):
+        self.agora = agora
+
+    def __call__(self):
+        return self.agora
+
+
+class TestRelogioHibrido(unittest.TestCase):
+    def setUp(self):
+        self.parede = RelogioFixo()
+        self.relogio = RelogioHibrido(self.parede)
+
+    def test_eventos_no_mesmo_milissegundo(self):
+        self.assertEqual(self.relogio.agora(), [1000000, 0])
+        self.assertEqual(self.relogio.agora(), [1000000, 1])
+        self.parede.agora = 1000.001
+        self.assertEqual(self.relogio.agora(), [1000001, 0])
+
+    def test_relogio_de_parede_que_recua(self):
+        self.relogio.agora()
+        self.parede.agora = 999.0
+        self.assertEqual(self.relogio.agora(), [1000000, 1])
+
+    def test_resposta_depois_da_causa(self):
+        # Remetente com o relógio adiantado (dentro da deriva aceita)
+        carimbo = [1000500, 3]
+        self.assertTrue(self.relogio.receber(carimbo))
+        resposta = self.relogio.agora()
+        self.assertGreater(resposta, carimbo)
+        self.assertEqual(resposta, [1000500, 5])
+
+    def test_receber_carimbo_antigo(self):
+        self.relogio.agora()
+        self.relogio.receber([5, 9])
+        self.assertEqual([self.relogio.fisico, self.relogio.logico], [1000000, 1])
+
+    def test_deriva_maxima(self):
+        adiantado = [1000000 + hlc.DERIVA_MAXIMA + 1, 0]
+        self.assertFalse(self.relogio.receber(adiantado))
+        self.assertEqual(self.relogio.agora(), [1000000, 0])
+
+    def test_carimbo_valido(self):
+        self.assertTrue(carimbo_valido([1, 2]))
+        self.assertTrue(carimbo_valido((1, 2)))
+        self.assertFalse(carimbo_valido([1]))
+        self.assertFalse(carimbo_valido([1, "2"]))
+        self.assertFalse(carimbo_valido(None))
+
+
+class TestChaveCausal(unittest.TestCase):
+    def test_carimbo_e_mensagem_antiga(self):
+        self.assertEqual(chave_causal({"sender": "a", "hlc": [5, 1]}), (5, 1, "a"))
+        self.assertEqual(chave_causal({"sender": "a", "timestamp": 1.5}), (1500, 0, "a"))
+        self.assertEqual(chave_causal({"timestamp": "x"}), (0, 0, ""))
+
+    def test_remetente_desempata(self):
+        self.assertLess(chave_causal({"sender": "a", "hlc": [5, 1]}),
+                        chave_causal({"sender": "b", "hlc": [5, 1]}))
+
+
+class TestOrdemCausal(unittest.TestCase):
+    def test_em_ordem(self):
+        ordem = OrdemCausal()
+        for i in range(5):
+            ordem.inserir((i, 0, "a"), i)
+        self.assertEqual(ordem.fatia(0, 5), [0, 1, 2, 3, 4])
+        self.assertEqual(ordem.fatia(3, 10), [3, 4])
+
+    def test_fora_de_ordem_fundida_na_leitura(self):
+        ordem = OrdemCausal()
+        for fisico, posicao in ((1, 0), (4, 1), (2, 2), (3, 3), (5, 4)):
+            ordem.inserir((fisico, 0, "a"), posicao)
+        self.assertEqual(len(ordem), 5)
+        self.assertEqual(ordem.fatia(0, 5), [0, 2, 3, 1, 4])
+
+    def test_fusao_ao_encher_a_run(self):
+        ordem = OrdemCausal()
+        ordem.inserir((10 ** 6, 0, "a"), "ultima")
+        chaves = list(range(hlc.TAMANHO_RUN))
+        random.Random(7).shuffle(chaves)
+        for chave in chaves:
+            ordem.inserir((chave, 0, "a"), chave)
+        self.assertEqual(ordem.fatia(0, hlc.TAMANHO_RUN + 1),
+                         list(range(hlc.TAMANHO_RUN)) + ["ultima"])
+
+    def test_mesma_chave_mantem_as_duas_posicoes(self):
+        ordem = OrdemCausal()
+        ordem.inserir((1, 0, "a"), 0)
+        ordem.inserir((1, 0, "a"), 1)
+        self.assertEqual(ordem.fatia(0, 2), [0, 1])
+
+    def test_carregar_funde_runs_de_segmentos(self):
+        ordem = OrdemCausal()
+        ordem.carregar([[((1, 0, "a"), 0), ((4, 0, "a"), 1)],
+                        [((2, 0, "b"), 2), ((3, 0, "b"), 3)]])
+        ordem.inserir((0, 0, "c"), 4)
+        self.assertEqual(ordem.fatia(0, 5), [4, 0, 2, 3, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
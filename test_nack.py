@@ -0,0 +1,134 @@
+import unittest
+
+import nack
+from nack import ORIGEM_SEQUENCIADOR, BufferRetransmissao, ReparoNack, sequencias
+
+
+def reparo_sem_sorteio():
+    """ReparoNack com atraso fixo (o sorteio sempre retorna o máximo)."""
+    return ReparoNack(atraso=0.05, espera=0.3, aleatorio=lambda: 1.0)
+
+
+class TestSequencias(unittest.TestCase):
+    def test_chat_e_modo_sequenciador(self):
+        self.assertEqual(sequencias({"sender": "a", "seq": 3}), [("a", 3)])
+        self.assertEqual(sequencias({"sender": "a", "seq": 3, "gseq": 9}),
+                         [("a", 3), (ORIGEM_SEQUENCIADOR, 9)])
+        self.assertEqual(sequencias({"sender": "a"}), [])
+
+
+class TestReparoNack(unittest.TestCase):
+    def test_em_ordem_nao_agenda(self):
+        reparo = reparo_sem_sorteio()
+        for seq in (1, 2, 3):
+            self.assertEqual(reparo.receber("a", seq, 0.0), 0)
+        self.assertEqual(reparo.pendentes, {})
+        self.assertIsNone(reparo.proximo_prazo())
+
+    def test_lacuna_agendada_apos_o_atraso(self):
+        reparo = reparo_sem_sorteio()
+        reparo.receber("a", 1, 0.0)
+        self.assertEqual(reparo.receber("a", 4, 1.0), 2)
+        self.assertAlmostEqual(reparo.proximo_prazo(), 1.05)
+        self.assertEqual(reparo.vencidos(1.04), {})
+        self.assertEqual(reparo.vencidos(1.05), {"a": [2, 3]})
+
+    def test_fora_de_ordem_fecha_a_lacuna(self):
+        reparo = reparo_sem_sorteio()
+        reparo.receber("a", 1, 0.0)
+        reparo.receber("a", 4, 0.0)
+        # A mensagem atrasada chega antes do NACK e não é pedida
+        self.assertEqual(reparo.receber("a", 3, 0.01), 0)
+        self.assertEqual(reparo.vencidos(1.0), {"a": [2]})
+        self.assertEqual(reparo.maiores["a"], 4)
+
+    def test_repete_e_desiste_apos_as_tentativas(self):
+        reparo = reparo_sem_sorteio()
+        reparo.receber("a", 2, 0.0)
+        agora = 0.05
+        for _ in range(nack.NACK_TENTATIVAS):
+            self.assertEqual(reparo.vencidos(agora), {"a": [1]})
+            # Antes da espera o NACK não é repetido
+            self.assertEqual(reparo.vencidos(agora + 0.29), {})
+            agora += 0.3
+        self.assertEqual(reparo.vencidos(agora), {})
+        self.assertEqual(reparo.pendentes, {})
+
+    def test_lacuna_grande_fica_para_a_anti_entropia(self):
+        reparo = reparo_sem_sorteio()
+        reparo.receber("a", 1, 0.0)
+        self.assertEqual(reparo.receber("a", nack.NACK_MAXIMO + 3, 0.0), 0)
+        self.assertEqual(reparo.pendentes, {})
+        self.assertEqual(reparo.maiores["a"], nack.NACK_MAXIMO + 3)
+
+    def test_base_parte_da_replica_local(self):
+        reparo = reparo_sem_sorteio()
+        reparo.base({"a": 5})
+        self.assertEqual(reparo.receber("a", 3, 0.0), 0)
+        self.assertEqual(reparo.receber("a", 7, 0.0), 1)
+        self.assertEqual(reparo.vencidos(1.0), {"a": [6]})
+        # Uma base menor não recua
+        reparo.base({"a": 2})
+        self.assertEqual(reparo.maiores["a"], 7)
+
+    def test_descartar_fecha_sem_detectar(self):
+        reparo = reparo_sem_sorteio()
+        reparo.receber("a", 3, 0.0)
+        reparo.descartar("a", 1)
+        reparo.descartar("a", 10)
+        self.assertEqual(reparo.vencidos(1.0), {"a": [2]})
+        self.assertEqual(reparo.maiores["a"], 3)
+
+    def test_nack_de_outro_no_suprime_o_proprio(self):
+        reparo = reparo_sem_sorteio()
+        reparo.receber("a", 3, 0.0)
+        reparo.observar_nack({"a": [1], "b": [1]}, 0.02)
+        # Só a lacuna coberta pelo outro NACK espera a retransmissão
+        self.assertEqual(reparo.vencidos(0.05), {"a": [2]})
+        self.assertEqual(reparo.vencidos(0.31), {})
+        self.assertEqual(reparo.vencidos(0.32), {"a": [1]})
+
+    def test_supressao_nao_adianta_o_prazo(self):
+        reparo = reparo_sem_sorteio()
+        reparo.receber("a", 2, 0.0)
+        reparo.vencidos(0.05)  # Próxima tentativa em 0.35
+        reparo.observar_nack({"a": [1]}, 0.0)
+        self.assertAlmostEqual(reparo.proximo_prazo(), 0.35)
+
+
+class TestBufferRetransmissao(unittest.TestCase):
+    def test_busca_e_mensagens_fora_do_buffer(self):
+        buffer = BufferRetransmissao(capacidade=2)
+        for seq in (1, 2, 3):
+            buffer.guardar({"sender": "a", "seq": seq})
+        self.assertEqual(len(buffer), 2)
+        mensagens, ausentes = buffer.buscar({"a": [1, 2, 3]}, 0.0)
+        self.assertEqual([msg["seq"] for msg in mensagens], [2, 3])
+        self.assertEqual(ausentes, 1)
+
+    def test_janela_entre_retransmissoes(self):
+        buffer = BufferRetransmissao()
+        buffer.guardar({"sender": "a", "seq": 1})
+        self.assertEqual(len(buffer.buscar({"a": [1]}, 0.0)[0]), 1)
+        # NACKs de outros receptores pela mesma perda são atendidos uma vez
+        self.assertEqual(buffer.buscar({"a": [1]}, nack.INTERVALO_REPARO / 2), ([], 0))
+        self.assertEqual(len(buffer.buscar({"a": [1]}, nack.INTERVALO_REPARO)[0]), 1)
+
+    def test_mensagem_sequenciada_enviada_uma_vez(self):
+        buffer = BufferRetransmissao()
+        buffer.guardar({"sender": "a", "seq": 1, "gseq": 5})
+        mensagens, _ = buffer.buscar({"a": [1], ORIGEM_SEQUENCIADOR: [5]}, 0.0)
+        self.assertEqual(len(mensagens), 1)
+
+    def test_capacidade_conta_mensagens_sequenciadas(self):
+        buffer = BufferRetransmissao(capacidade=2)
+        for seq in (1, 2, 3):
+            buffer.guardar({"sender": "a", "seq": seq, "gseq": seq + 10})
+        self.assertEqual(len(buffer), 2)
+        mensagens, ausentes = buffer.buscar({"a": [1, 2], ORIGEM_SEQUENCIADOR: [11, 13]}, 0.0)
+        self.assertEqual([msg["seq"] for msg in mensagens], [2, 3])
+        self.assertEqual(ausentes, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
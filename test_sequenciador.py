@@ -0,0 +1,69 @@
+import unittest
+
+from sequenciador import EntregaOrdenada, Sequenciador
+
+
+class TestSequenciador(unittest.TestCase):
+    def test_continua_do_ultimo_recuperado(self):
+        sequenciador = Sequenciador(ultimo=7)
+        self.assertEqual([sequenciador.atribuir() for _ in range(3)], [8, 9, 10])
+
+
+class TestEntregaOrdenada(unittest.TestCase):
+    def test_em_ordem(self):
+        entrega = EntregaOrdenada()
+        self.assertEqual(entrega.receber(1, "a"), ["a"])
+        self.assertEqual(entrega.receber(2, "b"), ["b"])
+        self.assertEqual(entrega.proxima, 3)
+
+    def test_comeca_na_primeira_recebida(self):
+        entrega = EntregaOrdenada()
+        self.assertEqual(entrega.receber(40, "a"), ["a"])
+        self.assertEqual(entrega.receber(41, "b"), ["b"])
+
+    def test_reordenacao(self):
+        entrega = EntregaOrdenada()
+        entrega.receber(1, "a")
+        self.assertEqual(entrega.receber(4, "d"), [])
+        self.assertEqual(entrega.receber(3, "c"), [])
+        self.assertEqual(entrega.pendentes, 2)
+        self.assertEqual(entrega.receber(2, "b"), ["b", "c", "d"])
+        self.assertEqual(entrega.pendentes, 0)
+
+    def test_duplicata_em_buffer_fica_com_a_primeira(self):
+        entrega = EntregaOrdenada()
+        entrega.receber(1, "a")
+        entrega.receber(3, "c")
+        entrega.receber(3, "c'")
+        self.assertEqual(entrega.receber(2, "b"), ["b", "c"])
+
+    def test_duplicata_ja_entregue(self):
+        entrega = EntregaOrdenada()
+        entrega.receber(1, "a")
+        entrega.receber(2, "b")
+        # O chamador descarta duplicatas pela identidade; aqui conta como atrasada
+        self.assertEqual(entrega.receber(1, "a"), ["a"])
+        self.assertEqual(entrega.atrasadas, 1)
+
+    def test_liberar_lacuna(self):
+        entrega = EntregaOrdenada()
+        entrega.receber(1, "a")
+        entrega.receber(4, "d")
+        entrega.receber(5, "e")
+        self.assertEqual(entrega.liberar_lacuna(), ["d", "e"])
+        self.assertEqual(entrega.lacunas, 2)
+        self.assertEqual(entrega.proxima, 6)
+        # A mensagem faltante chega depois e é entregue como atrasada
+        self.assertEqual(entrega.receber(2, "b"), ["b"])
+        self.assertEqual(entrega.atrasadas, 1)
+
+    def test_liberar_sem_lacuna(self):
+        entrega = EntregaOrdenada()
+        self.assertEqual(entrega.liberar_lacuna(), [])
+        entrega.receber(1, "a")
+        self.assertEqual(entrega.liberar_lacuna(), [])
+        self.assertEqual(entrega.lacunas, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
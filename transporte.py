@@ -0,0 +1,150 @@
+import os
+import time
+import struct
+import itertools
+
+from registro import log
+
+# Limites do transporte
+TAMANHO_MAXIMO_DATAGRAMA = 1400  # Acima disso o payload é fragmentado (evita fragmentação IP)
+LIMITE_PAYLOAD = 1024 * 1024  # Maior payload aceito após a remontagem
+EXPIRACAO_FRAGMENTOS = 5.0  # Segundos até descartar um conjunto incompleto
+LIMITE_REMONTAGENS = 64  # Conjuntos incompletos mantidos simultaneamente
+
+# Cabeçalho dos fragmentos: marcador, versão, id da mensagem, índice, total, tamanho total
+MARCADOR_FRAGMENTO = 0xCF
+VERSAO_FRAGMENTO = 1
+CABECALHO_FRAGMENTO = struct.Struct("!BBQHHI")
+TAMANHO_DADOS_FRAGMENTO = TAMANHO_MAXIMO_DATAGRAMA - CABECALHO_FRAGMENTO.size
+
+_ids_mensagem = itertools.count(int.from_bytes(os.urandom(6), "big") << 16)
+
+
+class PayloadMuitoGrande(ValueError):
+    """Payload maior do que o transporte consegue fragmentar e remontar."""
+
+
+def fragmentar(payload):
+    """
+    Divide um payload em datagramas numerados.
+
+    Payloads que cabem em um datagrama são enviados sem cabeçalho, mantendo
+    compatibilidade com nós que só entendem mensagens simples.
+
+    Args:
+        payload: Bytes a enviar
+
+    Returns:
+        list: Datagramas prontos para envio
+
+    Raises:
+        PayloadMuitoGrande: Se o payload ultrapassa LIMITE_PAYLOAD
+    """
+    tamanho = len(payload)
+    if tamanho <= TAMANHO_MAXIMO_DATAGRAMA:
+        return [payload]
+    if tamanho > LIMITE_PAYLOAD:
+        raise PayloadMuitoGrande(f"Payload de {tamanho} bytes excede o limite de {LIMITE_PAYLOAD} bytes")
+
+    visao = memoryview(payload)
+    total = -(-tamanho // TAMANHO_DADOS_FRAGMENTO)
+    id_mensagem = next(_ids_mensagem) & 0xFFFFFFFFFFFFFFFF
+    fragmentos = []
+    for indice in range(total):
+        inicio = indice * TAMANHO_DADOS_FRAGMENTO
+        cabecalho = CABECALHO_FRAGMENTO.pack(
+            MARCADOR_FRAGMENTO, VERSAO_FRAGMENTO, id_mensagem, indice, total, tamanho)
+        fragmentos.append(cabecalho + visao[inicio:inicio + TAMANHO_DADOS_FRAGMENTO])
+    return fragmentos
+
+
+class _Remontagem:
+    """Estado de um conjunto de fragmentos em remontagem."""
+
+    __slots__ = ("buffer", "visao", "total", "recebidos", "criado")
+
+    def __init__(self, tamanho, total):
+        self.buffer = bytearray(tamanho)
+        self.visao = memoryview(self.buffer)
+        self.total = total
+        self.recebidos = set()
+        self.criado = time.monotonic()
+
+
+class Remontador:
+    """
+    Remonta payloads fragmentados por fragmentar().
+
+    Cada conjunto recebe um único buffer do tamanho final, preenchido por
+    fatias de memoryview à medida que os fragmentos chegam. Conjuntos
+    incompletos expiram após EXPIRACAO_FRAGMENTOS segundos.
+    """
+
+    def __init__(self, expiracao=EXPIRACAO_FRAGMENTOS, limite=LIMITE_REMONTAGENS):
+        self.expiracao = expiracao
+        self.limite = limite
+        self._pendentes = {}
+        self._ultima_limpeza = time.monotonic()
+        self.expirados = 0
+
+    def receber(self, datagrama, origem):
+        """
+        Processa um datagrama recebido.
+
+        Args:
+            datagrama: Bytes ou memoryview com o conteúdo do datagrama
+            origem: Endereço de quem enviou
+
+        Returns:
+            bytes (ou o bytearray da remontagem) com o payload completo,
+            ou None se ainda faltam fragmentos
+        """
+        self._expirar()
+        if len(datagrama) < CABECALHO_FRAGMENTO.size or datagrama[0] != MARCADOR_FRAGMENTO:
+            return bytes(datagrama)
+
+        _, versao, id_mensagem, indice, total, tamanho = CABECALHO_FRAGMENTO.unpack_from(datagrama)
+        if versao != VERSAO_FRAGMENTO or indice >= total or tamanho > LIMITE_PAYLOAD:
+            log.aviso("fragmento_invalido", "Fragmento inválido descartado", origem=origem)
+            return None
+
+        chave = (origem, id_mensagem)
+        remontagem = self._pendentes.get(chave)
+        if remontagem is not None and (remontagem.total != total or len(remontagem.buffer) != tamanho):
+            log.aviso("fragmento_invalido", "Fragmento inconsistente com o conjunto descartado",
+                      origem=origem, total=total, tamanho=tamanho)
+            return None
+        dados = memoryview(datagrama)[CABECALHO_FRAGMENTO.size:]
+        inicio = indice * TAMANHO_DADOS_FRAGMENTO
+        if inicio + len(dados) > tamanho:
+            log.aviso("fragmento_invalido", "Fragmento além do tamanho do payload descartado",
+                      origem=origem, indice=indice, tamanho=tamanho)
+            return None
+
+        if remontagem is None:
+            if len(self._pendentes) >= self.limite:
+                mais_antigo = min(self._pendentes, key=lambda c: self._pendentes[c].criado)
+                del self._pendentes[mais_antigo]
+                self.expirados += 1
+            remontagem = self._pendentes[chave] = _Remontagem(tamanho, total)
+
+        if indice not in remontagem.recebidos:
+            remontagem.visao[inicio:inicio + len(dados)] = dados
+            remontagem.recebidos.add(indice)
+
+        if len(remontagem.recebidos) < remontagem.total:
+            return None
+        del self._pendentes[chave]
+        return remontagem.buffer
+
+    def _expirar(self):
+        """Descarta conjuntos incompletos antigos (no máximo uma vez por segundo)."""
+        agora = time.monotonic()
+        if agora - self._ultima_limpeza < 1.0:
+            return
+        self._ultima_limpeza = agora
+        for chave in [c for c, r in self._pendentes.items() if agora - r.criado > self.expiracao]:
+            del self._pendentes[chave]
+            self.expirados += 1
+            log.aviso("fragmentos_expirados", "Conjunto de fragmentos incompleto expirou", chave=chave)
+
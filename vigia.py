@@ -0,0 +1,100 @@
+import os
+
+# Tempo máximo sem ver o token circular antes de considerá-lo perdido (segundos)
+TOKEN_LEASE = float(os.environ.get("TOKEN_LEASE", "3.0"))
+
+
+class VigiaToken:
+    """
+    Detecta a perda do token pelo servidor, que recebe todas as passagens.
+
+    Cada passagem observada renova uma concessão (lease) de TOKEN_LEASE
+    segundos para o nó que recebeu o token. Se a concessão vence sem que
+    uma nova passagem seja vista, o token (ou o nó que o detinha) se
+    perdeu e o servidor o regenera com uma geração maior; tokens de
+    gerações anteriores passam a ser descartados por todos os nós.
+
+    O tempo de recuperação é medido da última passagem vista antes da
+    perda até a primeira passagem da geração regenerada feita por um
+    cliente (ou seja, até o anel voltar a girar).
+
+    Atributos:
+        lease: Duração da concessão em segundos
+        detentor: Nó que recebeu o token na última passagem observada
+        falhas: Concessões vencidas seguidas com o mesmo detentor
+        regeneracoes: Total de tokens regenerados
+        tempos_recuperacao: Tempos de recuperação medidos, em segundos
+    """
+
+    def __init__(self, lease=TOKEN_LEASE):
+        """
+        Args:
+            lease: Duração da concessão em segundos
+        """
+        self.lease = lease
+        self.detentor = None
+        self.falhas = 0
+        self.regeneracoes = 0
+        self.tempos_recuperacao = []
+        self._ultimo_salto = None
+        self._inicio_perda = None
+        self._geracao_regenerada = None
+
+    def salto(self, geracao, detentor, agora, confirmado=False):
+        """
+        Registra uma passagem do token e renova a concessão.
+
+        Args:
+            geracao: Geração do token
+            detentor: Nó que recebe o token
+            agora: Instante da observação (relógio do laço)
+            confirmado: True se a passagem foi feita por um cliente, o que
+                prova que o token regenerado chegou ao destino
+
+        Returns:
+            float: Tempo de recuperação, se esta passagem encerra uma perda
+        """
+        self._ultimo_salto = agora
+        if detentor != self.detentor:
+            self.detentor = detentor
+            self.falhas = 0
+        if (confirmado and self._inicio_perda is not None
+                and geracao >= self._geracao_regenerada):
+            tempo = agora - self._inicio_perda
+            self.tempos_recuperacao.append(tempo)
+            self._inicio_perda = None
+            self.falhas = 0
+            return tempo
+        return None
+
+    def expirado(self, agora):
+        """Indica se a concessão do detentor atual venceu."""
+        return self._ultimo_salto is not None and agora - self._ultimo_salto > self.lease
+
+    def regenerar(self, geracao, agora):
+        """
+        Registra a regeneração do token com uma nova geração.
+
+        Args:
+            geracao: Geração do token regenerado
+            agora: Instante da regeneração
+        """
+        if self._inicio_perda is None:
+            self._inicio_perda = self._ultimo_salto
+        self._geracao_regenerada = geracao
+        self._ultimo_salto = agora
+        self.falhas += 1
+        self.regeneracoes += 1
+
+    def resumo(self):
+        """
+        Returns:
+            dict com as métricas de recuperação
+        """
+        tempos = self.tempos_recuperacao
+        return {
+            "regeneracoes": self.regeneracoes,
+            "recuperacoes": len(tempos),
+            "recuperacao_media": sum(tempos) / len(tempos) if tempos else 0.0,
+            "recuperacao_maxima": max(tempos, default=0.0),
+        }